@@ -0,0 +1 @@
+"""Reproducible benchmarks of simplewc. Run with `python -m bench`"""
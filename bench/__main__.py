@@ -0,0 +1,84 @@
+"""Call from CLI"""
+
+import argparse
+import json
+import os
+import sys
+
+from bench.suite import CORPUS, QUICK_CORPUS, compare, run
+
+parser = argparse.ArgumentParser(prog="bench")
+parser.add_argument(
+    "--quick", action="store_true", help="Smaller corpus and fewer requests"
+)
+parser.add_argument(
+    "--output",
+    help="Where JSON report is written. Defaults to "
+    "`bench/results/<commit>.json`",
+)
+parser.add_argument(
+    "--compare", metavar="BASELINE", help="Compare with this JSON report"
+)
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=0.1,
+    help="Slowdown ratio regarded as a regression. Defaults to 0.1",
+)
+parser.add_argument("--requests", type=int, help="Calls of each path")
+parser.add_argument("--concurrency", type=int, default=4)
+parser.add_argument(
+    "--rtt",
+    type=float,
+    default=0.0005,
+    help="Seconds of simulated Redis and MongoDB round trip",
+)
+args = parser.parse_args()
+
+report = run(
+    QUICK_CORPUS if args.quick else CORPUS,
+    args.requests or (10 if args.quick else 50),
+    args.concurrency,
+    repeat=3 if args.quick else 5,
+    rtt=args.rtt,
+)
+
+output = args.output or os.path.join(
+    "bench", "results", "%s.json" % report["commit"][:12]
+)
+os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+with open(output, "w") as f:
+    json.dump(report, f, indent=2)
+
+for result in report["results"]:
+    if result["kind"] == "e2e":
+        print(
+            "%-40s %8.1f req/s  p50 %8.2f ms  p99 %8.2f ms"
+            % (
+                result["name"],
+                result["throughput_rps"],
+                result["p50_ms"],
+                result["p99_ms"],
+            )
+        )
+    else:
+        print("%-40s median %8.3f ms" % (result["name"], result["median_ms"]))
+print("Wrote %s" % output)
+
+if args.compare:
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    rows = compare(baseline, report, args.threshold)
+    for name, old, new, regressed in rows:
+        print(
+            "%-40s %10.3f -> %10.3f  %+6.1f%%%s"
+            % (
+                name,
+                old,
+                new,
+                (new / old - 1) * 100 if old else 0.0,
+                "  REGRESSION" if regressed else "",
+            )
+        )
+    if any(regressed for *_, regressed in rows):
+        sys.exit(1)
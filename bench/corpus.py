@@ -0,0 +1,99 @@
+"""Synthetic HTML corpus, served by a local HTTP server"""
+
+import random
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+# Each paragraph has this many words
+_PARAGRAPH_WORDS = 60
+
+
+def vocabulary(size: int, seed: int = 0) -> List[str]:
+    """
+    Make distinct lower case words
+    :param size: Number of words
+    :param seed: Same seed makes the same words
+    :return: Words, such as "qakesu"
+    """
+    rng = random.Random(seed)
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(
+            rng.choice("bcdfghjklmnprstvz") + rng.choice("aeiou")
+            for _ in range(rng.randint(1, 4))
+        )
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+@lru_cache(maxsize=64)
+def make_html(size: int, vocabulary_size: int, seed: int = 0) -> bytes:
+    """
+    Make HTML document of about `size` bytes. Words follow Zipf's law over
+    vocabulary, like natural language
+    :param size: Bytes of document, roughly
+    :param vocabulary_size: Number of distinct words
+    :param seed: Same arguments make the same document
+    :return: HTML document
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, seed)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+
+    parts, written = [b"<html><head><title>bench</title></head><body>"], 0
+    while written < size:
+        paragraph = " ".join(rng.choices(words, weights, k=_PARAGRAPH_WORDS))
+        if rng.random() < 0.3:
+            paragraph = paragraph.capitalize() + "."
+        piece = ("<div><p>%s</p></div>\n" % paragraph).encode("utf-8")
+        parts.append(piece)
+        written += len(piece)
+    parts.append(b"</body></html>")
+    return b"".join(parts)
+
+
+def parse_path(path: str) -> Tuple[int, int]:
+    """
+    Parse corpus path, `/<size>/<vocabulary size>[/anything][?anything]`
+    :return: (size, vocabulary size)
+    """
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    return int(parts[0]), int(parts[1])
+
+
+class _CorpusHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        try:
+            size, vocabulary_size = parse_path(self.path)
+        except (ValueError, IndexError):
+            self.send_error(404)
+            return
+        body = make_html(size, vocabulary_size)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_corpus() -> ThreadingHTTPServer:
+    """
+    Serve corpus at `http://127.0.0.1:<port>/<size>/<vocabulary size>` on a
+    background thread. Paths below it, and query strings, serve the same
+    document, so each of them is a distinct URI of the same content
+    :return: Started HTTP server with `url` attribute
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CorpusHandler)
+    server.daemon_threads = True
+    server.url = "http://127.0.0.1:%d" % server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,155 @@
+"""
+In-process stand-ins of Redis and MongoDB.
+
+Unlike `MockQueryCache` and `MockDocumentStorage`, they keep data the way the
+real servers do, so encoding, projection and decoding cost is measured.
+Network round trip is simulated by sleeping `rtt` seconds
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, Tuple
+
+from simplewc.exceptions import NotInDocumentStorage, NotInResultCacheQuery
+from simplewc.storage import DocumentStorage, MongoDocumentStorage, QueryCache
+
+
+class RedisStandIn(QueryCache):
+    """Hashes of byte strings, as `RedisQueryCache` keeps in Redis"""
+
+    def __init__(self, rtt: float = 0.0):
+        """
+        :param rtt: Seconds of simulated round trip
+        """
+        super(RedisStandIn, self).__init__("redis-stand-in")
+        self.rtt = rtt
+        self.hashes: Dict[str, Dict[bytes, bytes]] = dict()
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def get(self, uri: str, word: str) -> int:
+        found = self.get_many(uri, [word])
+        if word in found:
+            return found[word]
+
+        raise NotInResultCacheQuery
+
+    def store(self, uri: str, word: str, count: int):
+        self.store_many(uri, {word: count})
+
+    def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        """`HMGET` in a round trip"""
+        self._round_trip()
+        with self._lock:
+            fields = self.hashes.get(uri, dict())
+            caches = [(w, fields.get(w.encode("utf-8"))) for w in words]
+        return {w: int(cache) for w, cache in caches if cache is not None}
+
+    def store_many(self, uri: str, counts: Dict[str, int]):
+        """`HSET` in a round trip"""
+        self._round_trip()
+        encoded = {
+            w.encode("utf-8"): str(c).encode("ascii") for w, c in counts.items()
+        }
+        with self._lock:
+            self.hashes.setdefault(uri, dict()).update(encoded)
+
+    def clear(self):
+        with self._lock:
+            self.hashes.clear()
+
+
+class MongoStandIn(DocumentStorage):
+    """
+    Documents built by `MongoDocumentStorage.to_document`, read with the same
+    projections as `MongoDocumentStorage`
+    """
+
+    def __init__(self, ttl: float = 3600, rtt: float = 0.0):
+        """
+        :param ttl: Seconds documents are fresh
+        :param rtt: Seconds of simulated round trip
+        """
+        super(MongoStandIn, self).__init__("mongo-stand-in")
+        self.ttl = ttl
+        self.rtt = rtt
+        self.documents: Dict[str, Tuple[float, dict]] = dict()
+        self._lock = threading.Lock()
+
+    def _find_one(self, uri: str, fresh: bool = True) -> dict:
+        """Find document in a round trip"""
+        if self.rtt:
+            time.sleep(self.rtt)
+        with self._lock:
+            added, doc = self.documents.get(uri, (None, None))
+        if doc is None or fresh and time.monotonic() - added >= self.ttl:
+            raise NotInDocumentStorage
+        return doc
+
+    @staticmethod
+    def _project(doc: dict, projection: dict) -> dict:
+        """Apply MongoDB projection of `field` and `field.key` paths"""
+        projected = dict()
+        for path in projection:
+            field, _, key = path.partition(".")
+            if field not in doc:
+                continue
+            if not key:
+                projected[field] = doc[field]
+            elif key in doc[field]:
+                projected.setdefault(field, dict())[key] = doc[field][key]
+        return projected
+
+    def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        doc = MongoDocumentStorage.to_document(
+            uri, counter, validators, indexes
+        )
+        if self.rtt:
+            time.sleep(self.rtt)
+        with self._lock:
+            self.documents[uri] = (time.monotonic(), doc)
+
+    def get(self, uri: str) -> Counter:
+        doc = self._find_one(uri)
+        without_indexes = {k: v for k, v in doc.items() if k != "indexes"}
+        return MongoDocumentStorage.from_document(without_indexes)
+
+    def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        doc = dict(self._find_one(uri, fresh=False))
+        indexes = doc.pop("indexes", None) or dict()
+        return (
+            MongoDocumentStorage.from_document(doc),
+            doc["validators"],
+            indexes,
+        )
+
+    def get_index(self, uri: str, name: str) -> bytes:
+        indexes = self._find_one(uri).get("indexes", dict())
+        if name in indexes:
+            return indexes[name]
+
+        raise NotInDocumentStorage
+
+    def get_counts(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        words = list(words)
+        doc = self._project(
+            self._find_one(uri), MongoDocumentStorage.counts_projection(words)
+        )
+        counter = MongoDocumentStorage.from_document(doc)
+        return {word: counter[word] for word in words}
+
+    def clear(self):
+        with self._lock:
+            self.documents.clear()
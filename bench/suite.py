@@ -0,0 +1,321 @@
+"""
+End-to-end benchmarks of `WordCountServicer` over gRPC, and microbenchmarks
+of hot paths. Every benchmark runs in this process against local stand-ins,
+so results of two commits on the same machine can be compared
+"""
+
+import platform
+import random
+import statistics
+import subprocess
+import time
+import timeit
+from concurrent import futures
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import grpc
+
+from bench.corpus import make_html, serve_corpus, vocabulary
+from bench.standins import MongoStandIn, RedisStandIn
+from simplewc import config, model, storage
+from simplewc.codec import decode_counter, encode_counter
+from simplewc.model import count_html_words, tokenize_html_to_words
+from simplewc.protos import wc_pb2_grpc
+from simplewc.protos.wc_pb2 import WordCountRequest
+from simplewc.servicer import WordCountServicer
+from simplewc.storage import (
+    LocalDocumentStorage,
+    LocalQueryCache,
+    LRUCache,
+    MongoDocumentStorage,
+)
+from simplewc.tokenizer import tokenize_html_stream
+
+# (size in bytes, vocabulary size) of each document
+CORPUS = ((10_000, 1_000), (100_000, 5_000), (1_000_000, 20_000))
+QUICK_CORPUS = ((10_000, 1_000), (100_000, 5_000))
+
+# In order. Each path warms up the next one
+PATHS = ("cold", "warm-mongo", "warm-redis", "warm-l1")
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile
+    :param values: Samples, in any order
+    :param q: Percentile between 0 and 100
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def git_commit() -> str:
+    """Commit of working tree, or "unknown" outside of git"""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return out.stdout.strip()
+
+
+def _clear_l1(query_cache: LocalQueryCache, doc_storage: LocalDocumentStorage):
+    query_cache.local = LRUCache(
+        query_cache.local.max_entries, query_cache.local.ttl
+    )
+    doc_storage.local = LRUCache(
+        doc_storage.local.max_entries, doc_storage.local.ttl
+    )
+
+
+def _drive(
+    stub, uris: List[str], words: List[str], concurrency: int
+) -> Tuple[float, List[float], List[Tuple[int, ...]]]:
+    """
+    Call CountWords once for each URI from `concurrency` clients
+    :return: (Wall clock seconds, latency of each call, counts of each call)
+    """
+
+    def call(uri: str) -> Tuple[float, Tuple[int, ...]]:
+        start = time.perf_counter()
+        responses = list(
+            stub.CountWords(WordCountRequest(uri=uri, words=words))
+        )
+        return time.perf_counter() - start, tuple(r.count for r in responses)
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(concurrency) as clients:
+        results = list(clients.map(call, uris))
+    return (
+        time.perf_counter() - start,
+        [latency for latency, _ in results],
+        [counts for _, counts in results],
+    )
+
+
+def _allow_loopback(raise_if_not_public: Callable) -> Callable:
+    """
+    :param raise_if_not_public: Host safety check of `simplewc.model`
+    :return: Same check, which lets 127.0.0.1 of corpus server through
+    """
+
+    def check(ip: str, uri: str):
+        if ip != "127.0.0.1":
+            raise_if_not_public(ip, uri)
+
+    return check
+
+
+def run_e2e(
+    corpus: Sequence[Tuple[int, int]] = CORPUS,
+    requests: int = 50,
+    concurrency: int = 4,
+    words: int = 10,
+    rtt: float = 0.0005,
+) -> List[dict]:
+    """
+    Benchmark `WordCountServicer` over gRPC on each path of each document.
+      * cold: document is downloaded and tokenized
+      * warm-mongo: counts come from MongoDB stand-in
+      * warm-redis: counts come from Redis stand-in
+      * warm-l1: counts come from in-process L1 caches
+    :param corpus: (size in bytes, vocabulary size) of each document
+    :param requests: Calls of each path, each on a distinct URI
+    :param concurrency: Number of concurrent clients
+    :param words: Number of words asked in each call
+    :param rtt: Seconds of simulated Redis and MongoDB round trip
+    :return: Result of each path of each document
+    """
+    redis, mongo = RedisStandIn(rtt), MongoStandIn(rtt=rtt)
+    max_pending = config.WRITE_BEHIND_MAX_PENDING
+    query_cache = storage._LQC = LocalQueryCache(redis, max_pending=max_pending)
+    doc_storage = storage._LDS = LocalDocumentStorage(
+        mongo, max_pending=max_pending
+    )
+
+    corpus_server = serve_corpus()
+    server = grpc.server(futures.ThreadPoolExecutor(max(concurrency, 1) * 2))
+    wc_pb2_grpc.add_WordCountServiceServicer_to_server(
+        WordCountServicer(), server
+    )
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+
+    # Corpus server is local. Let it through only while benchmark runs
+    raise_if_not_public = model.raise_if_not_public
+    model.raise_if_not_public = _allow_loopback(raise_if_not_public)
+    results = []
+    try:
+        with grpc.insecure_channel("127.0.0.1:%d" % port) as channel:
+            stub = wc_pb2_grpc.WordCountServiceStub(channel)
+            for size, vocabulary_size in corpus:
+                # Frequent words, rare words, and a word not in document
+                vocab = vocabulary(vocabulary_size)
+                asked = random.Random(size).sample(
+                    vocab, min(words, len(vocab))
+                )
+                asked[-1:] = ["notaword"]
+                uris = [
+                    "%s/%d/%d/%d"
+                    % (corpus_server.url, size, vocabulary_size, i)
+                    for i in range(requests)
+                ]
+
+                expected = None
+                for path in PATHS:
+                    # Previous path is written through to stand-ins
+                    for tier in (query_cache, doc_storage):
+                        if tier.writes is not None:
+                            tier.writes.flush()
+                    if path == "warm-mongo":
+                        redis.clear()
+                        _clear_l1(query_cache, doc_storage)
+                    elif path == "warm-redis":
+                        mongo.clear()
+                        _clear_l1(query_cache, doc_storage)
+                    wall, latencies, counts = _drive(
+                        stub, uris, asked, concurrency
+                    )
+                    if expected is None:
+                        expected = counts[0]
+                    if any(c != expected for c in counts):
+                        raise AssertionError("%s path miscounted" % path)
+                    results.append(
+                        {
+                            "name": "e2e/%s/%dx%d"
+                            % (path, size, vocabulary_size),
+                            "kind": "e2e",
+                            "requests": len(latencies),
+                            "throughput_rps": len(latencies) / wall,
+                            "p50_ms": percentile(latencies, 50) * 1000,
+                            "p99_ms": percentile(latencies, 99) * 1000,
+                        }
+                    )
+    finally:
+        model.raise_if_not_public = raise_if_not_public
+        server.stop(0)
+        corpus_server.shutdown()
+        corpus_server.server_close()
+        storage.close_writes()
+        storage._LQC = storage._LDS = None
+    return results
+
+
+def _micro(name: str, fn: Callable, repeat: int, nbytes: int = 0) -> dict:
+    runs = timeit.Timer(fn).repeat(repeat, number=1)
+    median = statistics.median(runs)
+    result = {
+        "name": name,
+        "kind": "micro",
+        "runs": repeat,
+        "median_ms": median * 1000,
+        "min_ms": min(runs) * 1000,
+    }
+    if nbytes:
+        result["mb_per_s"] = nbytes / median / 1e6
+    return result
+
+
+def run_micro(
+    corpus: Sequence[Tuple[int, int]] = CORPUS, repeat: int = 5
+) -> List[dict]:
+    """
+    Benchmark tokenizing and serialization of each document
+    :param corpus: (size in bytes, vocabulary size) of each document
+    :param repeat: Runs of each benchmark. Median is reported
+    :return: Result of each benchmark of each document
+    """
+    results = []
+    for size, vocabulary_size in corpus:
+        html = make_html(size, vocabulary_size)
+        counter = count_html_words(html)
+        mongo_hash = MongoDocumentStorage.to_mongo_hash(counter)
+        blobs = encode_counter(counter, config.MONGO_COMPACT_BUCKETS)
+        suffix = "%dx%d" % (size, vocabulary_size)
+
+        cases: Dict[str, Tuple[Callable, int]] = {
+            "tokenize_html_to_words": (
+                lambda: list(tokenize_html_to_words(html)),
+                len(html),
+            ),
+            "tokenize_html_stream": (
+                lambda: list(tokenize_html_stream((html,))),
+                len(html),
+            ),
+            "count_html_words": (lambda: count_html_words(html), len(html)),
+            "to_mongo_hash": (
+                lambda: MongoDocumentStorage.to_mongo_hash(counter),
+                0,
+            ),
+            "to_counter": (
+                lambda: MongoDocumentStorage.to_counter(mongo_hash),
+                0,
+            ),
+            "encode_counter": (
+                lambda: encode_counter(counter, config.MONGO_COMPACT_BUCKETS),
+                0,
+            ),
+            "decode_counter": (lambda: decode_counter(blobs), 0),
+        }
+        for name, (fn, nbytes) in cases.items():
+            results.append(
+                _micro("micro/%s/%s" % (name, suffix), fn, repeat, nbytes)
+            )
+    return results
+
+
+def run(
+    corpus: Sequence[Tuple[int, int]] = CORPUS,
+    requests: int = 50,
+    concurrency: int = 4,
+    repeat: int = 5,
+    rtt: float = 0.0005,
+) -> dict:
+    """
+    Run every benchmark
+    :return: Machine-readable report, see README
+    """
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "options": {
+            "corpus": [list(doc) for doc in corpus],
+            "requests": requests,
+            "concurrency": concurrency,
+            "repeat": repeat,
+            "rtt": rtt,
+        },
+        "results": run_e2e(corpus, requests, concurrency, rtt=rtt)
+        + run_micro(corpus, repeat),
+    }
+
+
+# Lower is better
+PRIMARY_METRIC = {"e2e": "p50_ms", "micro": "median_ms"}
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = 0.1
+) -> List[Tuple[str, float, float, bool]]:
+    """
+    Compare results present in both reports
+    :param threshold: Slowdown ratio regarded as a regression, 0.1 for 10%
+    :return: [(Name, baseline value, current value, Is regression)]
+    """
+    before = {r["name"]: r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        if result["name"] not in before:
+            continue
+        metric = PRIMARY_METRIC[result["kind"]]
+        old, new = before[result["name"]][metric], result[metric]
+        rows.append((result["name"], old, new, new > old * (1 + threshold)))
+    return rows
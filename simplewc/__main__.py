@@ -1,7 +1,41 @@
 """Call from CLI"""
 
+import argparse
+
+parser = argparse.ArgumentParser(prog="simplewc")
+parser.add_argument("--host-port", default="[::]:50001")
+parser.add_argument(
+    "--aio", action="store_true", help="Serve with asyncio gRPC server"
+)
+parser.add_argument(
+    "--compression",
+    choices=("gzip", "deflate"),
+    help="Compress responses. Defaults to `GRPC_COMPRESSION` in config",
+)
+parser.add_argument(
+    "--metrics-host-port",
+    help="Serve Prometheus metrics here. Defaults to `METRICS_HOST_PORT` in "
+    "config",
+)
+parser.add_argument(
+    "--dedupe-mongo",
+    action="store_true",
+    help="Remove duplicated documents in MongoDB and create unique index, "
+    "then exit",
+)
+args = parser.parse_args()
+
 # Start word count service
-from simplewc.servicer import serve_insecure
+if args.dedupe_mongo:
+    from simplewc.storage import get_mongo_db
+
+    print("Removed %d duplicated documents" % get_mongo_db().dedupe())
+elif args.aio:
+    from simplewc.aio import serve_insecure_aio
+
+    serve_insecure_aio(args.host_port, args.compression, args.metrics_host_port)
+else:
+    from simplewc.servicer import serve_insecure
 
-# Test purpose server
-serve_insecure("[::]:50001")
+    # Test purpose server
+    serve_insecure(args.host_port, args.compression, args.metrics_host_port)
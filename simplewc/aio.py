@@ -0,0 +1,1270 @@
+"""
+Asyncio counterparts of data model, data storage and service layers.
+One process can hold many concurrent streams while they wait on I/O
+"""
+
+import asyncio
+import functools
+import socket
+import sys
+from collections import Counter
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlparse
+
+import aiohttp
+import grpc
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from redis import asyncio as aioredis
+
+from simplewc import config, metrics
+from simplewc.codec import COMPACT_FORMAT
+from simplewc.exceptions import (
+    NotInDocumentStorage,
+    NotInResultCacheQuery,
+    NotReacheableLocation,
+    TooBigResource,
+)
+from simplewc.index import (
+    FrequencyIndex,
+    PositionIndex,
+    VocabularyIndex,
+    build_indexes,
+)
+from simplewc.model import (
+    HOST_FAILURES,
+    NEGATIVE_CACHED,
+    VALIDATORS,
+    count_html_words_in_pool,
+    encode_failure,
+    failure_key,
+    failure_keys,
+    find_cause,
+    host_failure_key,
+    index_html_words_in_pool,
+    is_resolved,
+    phrase_cache_key,
+    raise_failure,
+    raise_if_not_safe,
+    resolve_public_host,
+    tokenize_phrase,
+)
+from simplewc.protos import wc_pb2_grpc
+from simplewc.protos.wc_pb2 import (
+    BatchWordCountRequest,
+    MatchMode,
+    MatchWordsRequest,
+    TopWordsRequest,
+    WordCount,
+    WordCountRequest,
+)
+from simplewc.protos.wc_pb2_grpc import WordCountServiceServicer
+from simplewc.servicer import (
+    error_status,
+    error_word_count,
+    grpc_compression,
+    interrupt_on_sigterm,
+    pack_word_counts,
+    start_metrics,
+)
+from simplewc.storage import (
+    INDEX_OPTIONS_CONFLICT,
+    NO_INDEXES,
+    DocumentStorage,
+    HashRing,
+    MongoDocumentStorage,
+    QueryCache,
+    RedisQueryCache,
+)
+
+
+class AsyncHTMLResponse:
+    """
+    Pieces of HTML document read without blocking event loop, along with
+    validators of response. Asyncio counterpart of
+    `simplewc.model.HTMLResponse`
+    """
+
+    def __init__(self, rqg: aiohttp.ClientResponse, chunks: List[bytes]):
+        """
+        :param rqg: Response whose content is read
+        :param chunks: Pieces of its content
+        """
+        self.chunks = chunks
+        self.not_modified = rqg.status == 304
+        self.validators = {
+            key: rqg.headers[header]
+            for key, header, _ in VALIDATORS
+            if header in rqg.headers
+        }
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.chunks)
+
+
+async def async_retrieve_html(
+    uri: str,
+    session: aiohttp.ClientSession,
+    validators: Dict[str, str] = None,
+) -> AsyncHTMLResponse:
+    """
+    Retrieve HTML document in given uri without blocking event loop.
+    Size limit is enforced on bytes actually read, after decompression
+    :param uri: URI to the HTML document
+    :param session: Shared aiohttp client session
+    :param validators: Validators of the copy we have. Server may answer
+    `AsyncHTMLResponse.not_modified`, with empty content
+    :return: Read response. Iterate it for pieces of the document
+    :raise: TooBigResource, and NotReacheableLocation when we cannot connect
+    """
+    headers = {
+        conditional: validators[key]
+        for key, _, conditional in VALIDATORS
+        if validators and validators.get(key)
+    }
+    try:
+        with metrics.FETCH_SECONDS.time():
+            rqg = await session.get(uri, headers=headers)
+    except aiohttp.ClientConnectorError as e:
+        # Resolver refused non public address, or failed to resolve. Tell why
+        raise find_cause(e, HOST_FAILURES) or NotReacheableLocation(
+            "Could not connect to %s" % urlparse(uri).hostname
+        ) from e
+    async with rqg:
+        metrics.FETCH_RESPONSES.inc(status=rqg.status)
+        length = rqg.headers.get("Content-length", "")
+        if length.isdigit() and int(length) >= config.MAX_CONTENT_SIZE:
+            raise TooBigResource("%s is too big file to parse" % length)
+
+        chunks, read = [], 0
+        try:
+            async for chunk in rqg.content.iter_chunked(config.HTML_CHUNK_SIZE):
+                read += len(chunk)
+                if read >= config.MAX_CONTENT_SIZE:
+                    raise TooBigResource("%s is too big file to parse" % uri)
+                chunks.append(chunk)
+        finally:
+            metrics.FETCH_BYTES.observe(read)
+        return AsyncHTMLResponse(rqg, chunks)
+
+
+class PinnedResolver(aiohttp.abc.AbstractResolver):
+    """
+    aiohttp resolver answering from the same DNS cache as `raise_if_not_safe`
+    and only with public IP addresses. See `simplewc.model.PinnedHTTPConnection`
+    """
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        ip = await loop.run_in_executor(None, resolve_public_host, host)
+        return [
+            {
+                "hostname": host,
+                "host": ip,
+                "port": port,
+                "family": socket.AF_INET,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+        ]
+
+    async def close(self):
+        pass
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutines sharing the same key into a single
+    execution. Asyncio counterpart of `simplewc.model.SingleFlight`
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = dict()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Await `fn()` once for all concurrent callers of `key`
+        :param key: Identity of the work, such as URI
+        :param fn: Coroutine function without argument doing the actual work
+        :return: Result of `fn()`, shared among concurrent callers
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # A caller going away, such as a disconnected client, must not cancel
+        # the work others wait on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved, even if every caller went away
+            task.exception()
+
+
+# Coalescing of document loading, keyed by URI
+_DOCUMENT_FLIGHT = AsyncSingleFlight()
+# Background refreshes of stale documents in progress, by URI
+_REFRESHES: Dict[str, asyncio.Task] = dict()
+
+
+class AsyncQueryCacheAdapter:
+    """
+    Expose in-memory `QueryCache` (such as `MockQueryCache` and
+    `LocalQueryCache` over mock) through asyncio interface.
+    Do not wrap network backed cache. It blocks event loop
+    """
+
+    def __init__(self, query_cache: QueryCache):
+        self.query_cache = query_cache
+
+    async def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        return self.query_cache.get_many(uri, words)
+
+    async def store_many(self, uri: str, counts: Dict[str, int]):
+        self.query_cache.store_many(uri, counts)
+
+    async def store_failure(self, key: str, failure: str, ttl: float):
+        self.query_cache.store_failure(key, failure, ttl)
+
+    async def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        return self.query_cache.get_failure(keys, remote)
+
+
+class AsyncDocumentStorageAdapter:
+    """
+    Expose in-memory `DocumentStorage` (such as `MockDocumentStorage`)
+    through asyncio interface. Do not wrap network backed storage
+    """
+
+    def __init__(self, doc_store: DocumentStorage):
+        self.doc_store = doc_store
+
+    async def get(self, uri: str) -> Counter:
+        return self.doc_store.get(uri)
+
+    async def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        return self.doc_store.get_servable(uri)
+
+    async def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        return self.doc_store.get_stale(uri)
+
+    async def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        self.doc_store.store(uri, counter, validators, indexes)
+
+    async def get_index(self, uri: str, name: str) -> bytes:
+        return self.doc_store.get_index(uri, name)
+
+    async def get_counts(
+        self, uri: str, words: Iterable[str]
+    ) -> Dict[str, int]:
+        return self.doc_store.get_counts(uri, words)
+
+
+class AsyncRedisQueryCache:
+    """Redis as a LRU query cache, over asyncio connections"""
+
+    def __init__(self, host: str, port: int, db: int, **redis_opt):
+        """
+        Instantiate AsyncRedisQueryCache
+        :param host: Redis host
+        :param port: Redis port
+        :param db: Redis DB
+        :param redis_opt: Redis additional options such as cert and password
+        """
+        self.host = host
+        self.redis = aioredis.Redis(host=host, port=port, db=db, **redis_opt)
+        self.expire = config.CACHE_EXPIRE
+        self._store_script = self.redis.register_script(
+            RedisQueryCache._STORE_SCRIPT
+        )
+
+    @metrics.REDIS_SECONDS.timed(op="get")
+    async def get(self, uri: str, word: str) -> int:
+        """
+        Get ResultCache from Redis Server
+        :raise: NotInResultCacheQuery in case we didn't hit cache
+        """
+        cache = await self.redis.hget(uri, word)
+        if cache is not None:
+            metrics.QUERY_CACHE_REQUESTS.inc(layer="redis", result="hit")
+            return int(cache)
+
+        metrics.QUERY_CACHE_REQUESTS.inc(layer="redis", result="miss")
+        raise NotInResultCacheQuery
+
+    @metrics.REDIS_SECONDS.timed(op="get_many")
+    async def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        """Get ResultCache of multiple words in a single `HMGET` round trip"""
+        words = list(words)
+        if not words:
+            return dict()
+        caches = await self.redis.hmget(uri, words)
+        found = {
+            word: int(cache)
+            for word, cache in zip(words, caches)
+            if cache is not None
+        }
+        metrics.count_lookups(
+            metrics.QUERY_CACHE_REQUESTS,
+            len(found),
+            len(words) - len(found),
+            layer="redis",
+        )
+        return found
+
+    @metrics.REDIS_SECONDS.timed(op="store_many")
+    async def store_many(self, uri: str, counts: Dict[str, int]):
+        """Store ResultCache of multiple words in a single round trip"""
+        items = list(counts.items())
+        if not items:
+            return
+        chunk = RedisQueryCache._STORE_CHUNK
+        pipe = self.redis.pipeline(transaction=False)
+        for i in range(0, len(items), chunk):
+            args = [self.expire]
+            for word, count in items[i : i + chunk]:
+                args.extend((word, str(count)))
+            await self._store_script(keys=[uri], args=args, client=pipe)
+        await pipe.execute()
+
+    @metrics.REDIS_SECONDS.timed(op="store_failure")
+    async def store_failure(self, key: str, failure: str, ttl: float):
+        """See `RedisQueryCache.store_failure`"""
+        await self.redis.set(
+            RedisQueryCache.FAILURE_PREFIX + key,
+            failure,
+            px=max(1, int(ttl * 1000)),
+        )
+
+    @metrics.REDIS_SECONDS.timed(op="get_failure")
+    async def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        """See `RedisQueryCache.get_failure`"""
+        keys = list(keys)
+        if not remote or not keys:
+            return None
+        failures = await self.redis.mget(
+            [RedisQueryCache.FAILURE_PREFIX + k for k in keys]
+        )
+        found = next((f for f in failures if f is not None), None)
+        metrics.NEGATIVE_CACHE_REQUESTS.inc(
+            layer="redis", result="miss" if found is None else "hit"
+        )
+        return None if found is None else found.decode("utf-8")
+
+
+class AsyncMongoDocumentStorage:
+    """MongoDB as a document storage, over asyncio connections"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        mongo_db_name: str,
+        mongo_collection: str,
+        mongo_ttl: int,
+        stale_ttl: int = config.MONGO_STALE_TTL,
+        **mongo_opt,
+    ):
+        """
+        :param host: MongoDB host
+        :param port: MongoDB port
+        :param mongo_db_name: MongoDB database name
+        :param mongo_collection: MongoDB collection name for HTML documents
+        :param mongo_ttl: MongoDB document's life span
+        :param stale_ttl: How long we serve documents after `mongo_ttl` while
+        they are refreshed
+        :param mongo_opt: Additional option (auth for example) for MongoDB connection
+        """
+        self.host = host
+        self.mongo_ttl = mongo_ttl
+        self.stale_ttl = stale_ttl
+        self._mongo = AsyncIOMotorClient(host, port, **mongo_opt)
+        self.collection = self._mongo.get_database(
+            mongo_db_name
+        ).get_collection(mongo_collection)
+
+    async def ensure_indexes(self):
+        """
+        Create TTL and unique `uri` indexes. Call once before servicing.
+        Lifespan of existing TTL index is changed. See
+        `MongoDocumentStorage.ensure_ttl_index`
+        """
+        expire = self.mongo_ttl + config.MONGO_REVALIDATE_WINDOW
+        try:
+            await self.collection.create_index(
+                "added", expireAfterSeconds=expire
+            )
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            await self.collection.database.command(
+                MongoDocumentStorage.ttl_index_command(
+                    self.collection.name, expire
+                )
+            )
+        try:
+            await self.collection.create_index("uri", unique=True)
+        except OperationFailure:
+            print(
+                "Warning: MongoDB document collection has duplicated URIs. "
+                "Run `python -m simplewc --dedupe-mongo`",
+                file=sys.stderr,
+            )
+
+    @metrics.MONGO_SECONDS.timed(op="store")
+    async def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        """Save (word-counted) HTML document into MongoDB, replacing old one"""
+        doc = MongoDocumentStorage.to_document(
+            uri, counter, validators, indexes
+        )
+        try:
+            await self.collection.replace_one(
+                {"uri": doc["uri"]}, doc, upsert=True
+            )
+        except DuplicateKeyError:
+            # Concurrent upsert inserted it first. Now it is there to replace
+            await self.collection.replace_one(
+                {"uri": doc["uri"]}, doc, upsert=True
+            )
+
+    @metrics.MONGO_SECONDS.timed(op="get")
+    async def get(self, uri: str) -> Counter:
+        """
+        Get (word-counted) HTML document from MongoDB
+        :raise: NotInDocumentStorage when we can't find fresh one in MongoDB
+        """
+        doc = await self.collection.find_one(
+            MongoDocumentStorage.fresh_filter(uri, self.mongo_ttl),
+            projection=NO_INDEXES,
+        )
+        if doc:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="hit")
+            return MongoDocumentStorage.from_document(doc)
+
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="miss")
+        raise NotInDocumentStorage
+
+    @metrics.MONGO_SECONDS.timed(op="get_servable")
+    async def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        """
+        Get (word-counted) HTML document from MongoDB, even within
+        `stale_ttl` after it expires. See `MongoDocumentStorage.get_servable`
+        :return: (Counter, Is fresh)
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        doc = await self.collection.find_one(
+            MongoDocumentStorage.fresh_filter(
+                uri, self.mongo_ttl + self.stale_ttl
+            ),
+            projection=NO_INDEXES,
+        )
+        if not doc:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="miss")
+            raise NotInDocumentStorage
+
+        fresh = MongoDocumentStorage.is_fresh(doc, self.mongo_ttl)
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(
+            layer="mongo", result="hit" if fresh else "stale"
+        )
+        return MongoDocumentStorage.from_document(doc), fresh
+
+    @metrics.MONGO_SECONDS.timed(op="get_stale")
+    async def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        """
+        Get (word-counted) HTML document from MongoDB, its validators and
+        indexes, even if it is not fresh. See `MongoDocumentStorage.get_stale`
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        doc = await self.collection.find_one(
+            {"uri": MongoDocumentStorage.to_mongo_key(uri)}
+        )
+        if doc:
+            indexes = doc.pop("indexes", None) or dict()
+            return (
+                MongoDocumentStorage.from_document(doc),
+                doc.get("validators", dict()),
+                indexes,
+            )
+
+        raise NotInDocumentStorage
+
+    @metrics.MONGO_SECONDS.timed(op="get_index")
+    async def get_index(self, uri: str, name: str) -> bytes:
+        """
+        Get serialized index of fresh document in MongoDB.
+        See `MongoDocumentStorage.get_index`
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        doc = await self.collection.find_one(
+            MongoDocumentStorage.fresh_filter(uri, self.mongo_ttl),
+            projection={"indexes." + name: True},
+        )
+        if doc and name in doc.get("indexes", dict()):
+            return doc["indexes"][name]
+
+        raise NotInDocumentStorage
+
+    @metrics.MONGO_SECONDS.timed(op="get_counts")
+    async def get_counts(
+        self, uri: str, words: Iterable[str]
+    ) -> Dict[str, int]:
+        """
+        Get counts of given words only from fresh document in MongoDB.
+        See `MongoDocumentStorage.get_counts`
+        :raise: NotInDocumentStorage when we can't find fresh one in MongoDB
+        """
+        words = list(words)
+        doc = await self.collection.find_one(
+            MongoDocumentStorage.fresh_filter(uri, self.mongo_ttl),
+            projection=MongoDocumentStorage.counts_projection(words),
+        )
+        if not doc:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="miss")
+            raise NotInDocumentStorage
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="hit")
+        if doc.get("format") == COMPACT_FORMAT and (
+            doc.get("bucket_count") != config.MONGO_COMPACT_BUCKETS
+        ):
+            counter = await self.get(uri)
+        else:
+            counter = MongoDocumentStorage.from_document(doc)
+        return {word: counter[word] for word in words}
+
+
+class AsyncShardedQueryCache:
+    """
+    Asyncio query caches of URIs spread over nodes by consistent hashing.
+    URIs go to the same nodes as of `simplewc.storage.ShardedQueryCache`
+    """
+
+    def __init__(
+        self,
+        nodes: Dict[str, AsyncRedisQueryCache],
+        replicas: int = config.HASH_RING_REPLICAS,
+    ):
+        """
+        :param nodes: {Name: query cache}, such as {"host:port":
+        `AsyncRedisQueryCache`}
+        :param replicas: Points of each node on hash ring
+        """
+        self.host = ",".join(nodes)
+        self.ring = HashRing(nodes, replicas)
+
+    async def get(self, uri: str, word: str) -> int:
+        return await self.ring.node_of(uri).get(uri, word)
+
+    async def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        return await self.ring.node_of(uri).get_many(uri, words)
+
+    async def store_many(self, uri: str, counts: Dict[str, int]):
+        await self.ring.node_of(uri).store_many(uri, counts)
+
+    async def store_failure(self, key: str, failure: str, ttl: float):
+        await self.ring.node_of(key).store_failure(key, failure, ttl)
+
+    async def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        for node, keys_of_node in self.ring.group(keys).items():
+            failure = await node.get_failure(keys_of_node, remote)
+            if failure is not None:
+                return failure
+        return None
+
+
+class AsyncShardedDocumentStorage:
+    """
+    Asyncio document storages of URIs spread over nodes by consistent
+    hashing. URIs go to the same nodes as of
+    `simplewc.storage.ShardedDocumentStorage`
+    """
+
+    def __init__(
+        self,
+        nodes: Dict[str, AsyncMongoDocumentStorage],
+        replicas: int = config.HASH_RING_REPLICAS,
+    ):
+        """
+        :param nodes: {Name: document storage}, such as {"host:port":
+        `AsyncMongoDocumentStorage`}
+        :param replicas: Points of each node on hash ring
+        """
+        self.host = ",".join(nodes)
+        self.ring = HashRing(nodes, replicas)
+
+    async def ensure_indexes(self):
+        """Create indexes on each node. Call once before servicing"""
+        for node in self.ring.nodes.values():
+            await node.ensure_indexes()
+
+    async def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        await self.ring.node_of(uri).store(uri, counter, validators, indexes)
+
+    async def get(self, uri: str) -> Counter:
+        return await self.ring.node_of(uri).get(uri)
+
+    async def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        return await self.ring.node_of(uri).get_servable(uri)
+
+    async def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        return await self.ring.node_of(uri).get_stale(uri)
+
+    async def get_index(self, uri: str, name: str) -> bytes:
+        return await self.ring.node_of(uri).get_index(uri, name)
+
+    async def get_counts(
+        self, uri: str, words: Iterable[str]
+    ) -> Dict[str, int]:
+        return await self.ring.node_of(uri).get_counts(uri, words)
+
+
+def get_async_redis_cache():
+    """
+    Asyncio redis cache, sharded over `REDIS_NODES` as of
+    `simplewc.storage.get_redis_cache`
+    """
+    if not config.REDIS_NODES:
+        return AsyncRedisQueryCache(
+            config.REDIS_HOST, config.REDIS_PORT, config.REDIS_DB
+        )
+
+    nodes = dict()
+    for host, port in config.REDIS_NODES:
+        nodes["%s:%d" % (host, port)] = AsyncRedisQueryCache(
+            host, port, config.REDIS_DB
+        )
+    return AsyncShardedQueryCache(nodes)
+
+
+def get_async_mongo_db():
+    """
+    Asyncio mongodb document storage, sharded over `MONGO_NODES` as of
+    `simplewc.storage.get_mongo_db`
+    """
+    if not config.MONGO_NODES:
+        return AsyncMongoDocumentStorage(
+            config.MONGO_HOST,
+            config.MONGO_PORT,
+            config.MONGO_DB,
+            config.MONGO_COLLECTION,
+            config.MONGO_TTL,
+        )
+
+    nodes = dict()
+    for host, port in config.MONGO_NODES:
+        nodes["%s:%d" % (host, port)] = AsyncMongoDocumentStorage(
+            host,
+            port,
+            config.MONGO_DB,
+            config.MONGO_COLLECTION,
+            config.MONGO_TTL,
+        )
+    return AsyncShardedDocumentStorage(nodes)
+
+
+async def remember_failure(uri: str, query_cache, e: Exception):
+    """Asyncio counterpart of `simplewc.model.remember_failure`"""
+    key = failure_key(uri, e)
+    if key is not None:
+        await query_cache.store_failure(
+            key, encode_failure(e), config.NEGATIVE_CACHE_TTL
+        )
+
+
+def negative_cached(method: Callable) -> Callable:
+    """Asyncio counterpart of `simplewc.model.negative_cached`"""
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        raise_failure(
+            await self.query_cache.get_failure(failure_keys(self.uri))
+        )
+        try:
+            return await method(self, *args, **kwargs)
+        except tuple(NEGATIVE_CACHED.values()) as e:
+            if self.remember_failures:
+                await remember_failure(self.uri, self.query_cache, e)
+            raise
+
+    return wrapper
+
+
+class AsyncHTMLDocumentModel:
+    """
+    Represents HTML Document and its behaviors, without blocking event loop.
+    Create it with `await AsyncHTMLDocumentModel.create(...)`
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        doc_store: AsyncMongoDocumentStorage,
+        query_cache: AsyncRedisQueryCache,
+        session: aiohttp.ClientSession,
+        remember_failures: bool = True,
+    ):
+        """
+        Create AsyncHTMLDocumentModel without safety check of `uri`
+        :param uri: Where the HTML Document is serviced
+        :param doc_store: Asyncio document storage for cache service
+        :param query_cache: Asyncio query result cache
+        :param session: Shared aiohttp client session
+        :param remember_failures: Remember failures in negative cache. False
+        for background refreshes
+        """
+        self.uri = uri
+        self.doc_store = doc_store
+        self.query_cache = query_cache
+        self.remember_failures = remember_failures
+        # Define how we retrieve HTML document
+        # `get_html(uri[, validators])`. See `async_retrieve_html`
+        self.get_html = functools.partial(async_retrieve_html, session=session)
+        self._local_counter_cache: Counter = None  # Local HTML document cache
+        self._indexes = dict()  # Loaded indexes by their name
+
+    @classmethod
+    async def create(
+        cls,
+        uri: str,
+        doc_store: AsyncMongoDocumentStorage,
+        query_cache: AsyncRedisQueryCache,
+        session: aiohttp.ClientSession,
+    ) -> "AsyncHTMLDocumentModel":
+        """
+        Check `uri` is safe to access, then create the model. Failure of
+        the host remembered in negative cache is raised right away. See
+        `HTMLDocumentModel`
+        """
+        if not is_resolved(urlparse(uri).hostname or ""):
+            raise_failure(
+                await query_cache.get_failure([host_failure_key(uri)])
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, raise_if_not_safe, uri)
+        except tuple(NEGATIVE_CACHED.values()) as e:
+            await remember_failure(uri, query_cache, e)
+            raise
+        return cls(uri, doc_store, query_cache, session)
+
+    async def count_words(self, words: Iterable[str]) -> List[int]:
+        """
+        Facade for counting multiple words with batched cache access
+        :param words: Count each of given `words`' appearance in this document
+        :return: Appearances of `words` in this HTML document, in given order
+        """
+        words = [word.lower() for word in words]
+        unique_words = list(dict.fromkeys(words))
+
+        counts = await self.query_cache.get_many(self.uri, unique_words)
+
+        missing = [w for w in unique_words if w not in counts]
+        if missing:
+            found = await self._count_in_document(missing)
+            await self.query_cache.store_many(self.uri, found)
+            counts.update(found)
+
+        return [counts[word] for word in words]
+
+    async def _count_in_document(self, words: List[str]) -> Dict[str, int]:
+        """Count words in HTML document. See `HTMLDocumentModel`"""
+        if not self._local_counter_cache:
+            try:
+                return await self.doc_store.get_counts(self.uri, words)
+            except NotInDocumentStorage:
+                pass
+        counter = await self.local_counter_cache()
+        return {word: counter[word] for word in words}
+
+    async def count_phrases(self, phrases: Iterable[str]) -> List[int]:
+        """Count phrases. See `HTMLDocumentModel.count_phrases`"""
+        tokenized = [tokenize_phrase(phrase) for phrase in phrases]
+        keys = [" ".join(words) for words in tokenized]
+        words_of = dict(zip(keys, tokenized))
+
+        cache_key = phrase_cache_key(self.uri)
+        counts = await self.query_cache.get_many(cache_key, list(words_of))
+
+        missing = [key for key in words_of if key not in counts]
+        if missing:
+            positions = await self.position_index()
+            found = {
+                key: positions.count_phrase(words_of[key]) for key in missing
+            }
+            await self.query_cache.store_many(cache_key, found)
+            counts.update(found)
+
+        return [counts[key] for key in keys]
+
+    async def top_ngrams(self, n: int, limit: int = 0) -> List[Tuple[str, int]]:
+        """Most frequent n-grams. See `HTMLDocumentModel.top_ngrams`"""
+        positions = await self.position_index()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, positions.top_ngrams, n, limit
+        )
+
+    async def top_words(
+        self, limit: int = 0, offset: int = 0
+    ) -> List[Tuple[str, int]]:
+        """Most frequent words. See `HTMLDocumentModel.top_words`"""
+        return (await self.frequency_index()).page(offset, limit)
+
+    async def match_words(
+        self,
+        pattern: str,
+        mode: str = "prefix",
+        max_distance: int = 0,
+        limit: int = 0,
+    ) -> List[Tuple[str, int]]:
+        """Words matching a pattern. See `HTMLDocumentModel.match_words`"""
+        vocabulary = await self.get_index(VocabularyIndex)
+        # Fuzzy matching is CPU work. Keep event loop responsive
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            vocabulary.match,
+            pattern.lower(),
+            mode,
+            min(max_distance, config.FUZZY_MAX_DISTANCE),
+            limit,
+        )
+
+    async def frequency_index(self) -> FrequencyIndex:
+        """Words sorted by occurrence. See `HTMLDocumentModel`"""
+        if FrequencyIndex.NAME not in self._indexes:
+            self._indexes[FrequencyIndex.NAME] = FrequencyIndex.from_vocabulary(
+                await self.get_index(VocabularyIndex)
+            )
+        return self._indexes[FrequencyIndex.NAME]
+
+    async def get_index(self, index_cls: type):
+        """Index of HTML document. See `HTMLDocumentModel.get_index`"""
+        if index_cls.NAME in self._indexes:
+            return self._indexes[index_cls.NAME]
+
+        try:
+            blob = await self.doc_store.get_index(self.uri, index_cls.NAME)
+            index = index_cls.from_bytes(blob)
+        except NotInDocumentStorage:
+            index = index_cls.from_counter(await self.local_counter_cache())
+        self._indexes[index_cls.NAME] = index
+        return index
+
+    async def position_index(self) -> PositionIndex:
+        """Words in their order. See `HTMLDocumentModel.position_index`"""
+        if PositionIndex.NAME in self._indexes:
+            return self._indexes[PositionIndex.NAME]
+
+        try:
+            blob = await self.doc_store.get_index(self.uri, PositionIndex.NAME)
+            index = PositionIndex.from_bytes(blob)
+        except NotInDocumentStorage:
+            index = await _DOCUMENT_FLIGHT.do(
+                (self.uri, PositionIndex.NAME), self._load_positions
+            )
+        self._indexes[PositionIndex.NAME] = index
+        return index
+
+    async def local_counter_cache(self) -> Counter:
+        """
+        Returns counter(internal form of HTML document) cache
+          * If we can find html doc in Document storage, load it
+          * else, get it over the internet and store it in Document storage
+        :return: Locally loaded cache of HTML document
+        """
+        if self._local_counter_cache:
+            return self._local_counter_cache
+
+        self._local_counter_cache = await _DOCUMENT_FLIGHT.do(
+            self.uri, self._load_counter
+        )
+        return self._local_counter_cache
+
+    async def _load_counter(self) -> Counter:
+        """
+        Load counter from document storage, or over the internet.
+        Stale one in document storage is served as it is, and refreshed in
+        background
+        """
+        try:
+            counter, fresh = await self.doc_store.get_servable(self.uri)
+        except NotInDocumentStorage:
+            return await self.fetch_counter()
+
+        if not fresh and self.uri not in _REFRESHES:
+            task = asyncio.ensure_future(self._refresh())
+            _REFRESHES[self.uri] = task
+            task.add_done_callback(lambda _: _REFRESHES.pop(self.uri, None))
+        return counter
+
+    async def _refresh(self):
+        # Callers are served what we have. Failed refresh must not fail them
+        # from negative cache
+        model = type(self)(
+            self.uri,
+            self.doc_store,
+            self.query_cache,
+            session=None,
+            remember_failures=False,
+        )
+        model.get_html = self.get_html
+        try:
+            await model.fetch_counter()
+        except Exception:
+            # Served as it is. Next caller of stale document tries again
+            metrics.DOCUMENT_REFRESHES.inc(trigger="stale", result="error")
+        else:
+            metrics.DOCUMENT_REFRESHES.inc(trigger="stale", result="ok")
+
+    @negative_cached
+    async def fetch_counter(self) -> Counter:
+        """
+        Get HTML document over the internet and store its counter. Expired
+        copy is revalidated. See `HTMLDocumentModel.fetch_counter`
+        """
+        try:
+            stale, validators, indexes = await self.doc_store.get_stale(
+                self.uri
+            )
+        except NotInDocumentStorage:
+            stale, validators, indexes = None, None, None
+
+        if validators:
+            content = await self.get_html(self.uri, validators)
+        else:
+            content = await self.get_html(self.uri)
+
+        fresh = getattr(content, "validators", None)
+        loop = asyncio.get_running_loop()
+        if stale is not None and getattr(content, "not_modified", False):
+            # 304 may carry only some of validators. Keep the ones it omits
+            fresh = {**(validators or dict()), **(fresh or dict())}
+            await self._store(stale, fresh, None, indexes)
+            return stale
+        if config.POSITION_INDEX:
+            # Tokenizing is CPU work. Keep event loop responsive
+            positions = await loop.run_in_executor(
+                None, index_html_words_in_pool, content
+            )
+            counter = positions.counter()
+            metrics.DOCUMENT_TOKENS.observe(len(positions))
+        else:
+            counter = await loop.run_in_executor(
+                None, count_html_words_in_pool, content
+            )
+            positions = None
+            metrics.DOCUMENT_TOKENS.observe(sum(counter.values()))
+        await self._store(counter, fresh, positions)
+        return counter
+
+    @negative_cached
+    async def _load_positions(self) -> PositionIndex:
+        """Get HTML document over the internet, and build position index"""
+        content = await self.get_html(self.uri)
+        positions = await asyncio.get_running_loop().run_in_executor(
+            None, index_html_words_in_pool, content
+        )
+        metrics.DOCUMENT_TOKENS.observe(len(positions))
+        await self._store(
+            positions.counter(),
+            getattr(content, "validators", None),
+            positions,
+        )
+        return positions
+
+    async def _store(
+        self,
+        counter: Counter,
+        validators: Optional[Dict[str, str]],
+        positions: Optional[PositionIndex],
+        indexes: Optional[Dict[str, bytes]] = None,
+    ):
+        """Store counter. See `HTMLDocumentModel._store`"""
+        if (
+            positions is not None
+            and len(positions) > config.POSITION_INDEX_MAX_TOKENS
+        ):
+            positions = None
+        if not indexes:
+            indexes = build_indexes(counter, positions)
+        await self.doc_store.store(self.uri, counter, validators, indexes)
+
+
+class AsyncWordCountServicer(WordCountServiceServicer):
+    """gRPC asyncio servicer for WordCountService"""
+
+    def __init__(
+        self,
+        doc_store: AsyncMongoDocumentStorage,
+        query_cache: AsyncRedisQueryCache,
+        session: aiohttp.ClientSession,
+    ):
+        self.doc_store = doc_store
+        self.query_cache = query_cache
+        self.session = session
+
+    async def CountWords(self, request: WordCountRequest, context):
+        """
+        API for Word Count. Same behavior as `WordCountServicer.CountWords`
+        :param request: gRPC request of `WordCountRequest`
+        :param context: gRPC asyncio context
+        :return: stream of `WordCount`. in a form of async generator
+        """
+        try:
+            uri, words = request.uri, request.words
+            model = await AsyncHTMLDocumentModel.create(
+                uri, self.doc_store, self.query_cache, self.session
+            )
+
+            for word, count in zip(words, await model.count_words(words)):
+                yield WordCount(uri=uri, word=word, count=count)
+            return
+
+        except Exception as e:
+            code, msg = error_status(e)
+            context.set_details(msg)
+            context.set_code(code)
+            return
+
+    async def CountPhrases(self, request: WordCountRequest, context):
+        """
+        API for Phrase Count. Same behavior as
+        `WordCountServicer.CountPhrases`
+        :param request: gRPC request of `WordCountRequest`, of phrases
+        :param context: gRPC asyncio context
+        :return: stream of `WordCount`. in a form of async generator
+        """
+        try:
+            uri, phrases = request.uri, request.words
+            model = await AsyncHTMLDocumentModel.create(
+                uri, self.doc_store, self.query_cache, self.session
+            )
+
+            counts = await model.count_phrases(phrases)
+            for phrase, count in zip(phrases, counts):
+                yield WordCount(uri=uri, word=phrase, count=count)
+            return
+
+        except Exception as e:
+            code, msg = error_status(e)
+            context.set_details(msg)
+            context.set_code(code)
+            return
+
+    async def CountWordsPacked(self, request: WordCountRequest, context):
+        """
+        API for Word Count of many words. Same behavior as
+        `WordCountServicer.CountWordsPacked`
+        :param request: gRPC request of `WordCountRequest`
+        :param context: gRPC asyncio context
+        :return: stream of `PackedWordCounts`. in a form of async generator
+        """
+        try:
+            uri, words = request.uri, request.words
+            model = await AsyncHTMLDocumentModel.create(
+                uri, self.doc_store, self.query_cache, self.session
+            )
+
+            counts = await model.count_words(words)
+            for packed in pack_word_counts(uri, words, counts):
+                yield packed
+            return
+
+        except Exception as e:
+            code, msg = error_status(e)
+            context.set_details(msg)
+            context.set_code(code)
+            return
+
+    async def TopWords(self, request: TopWordsRequest, context):
+        """
+        API for the most frequent words. Same behavior as
+        `WordCountServicer.TopWords`
+        :param request: gRPC request of `TopWordsRequest`
+        :param context: gRPC asyncio context
+        :return: stream of `PackedWordCounts`. in a form of async generator
+        """
+        try:
+            uri = request.uri
+            model = await AsyncHTMLDocumentModel.create(
+                uri, self.doc_store, self.query_cache, self.session
+            )
+
+            top = await model.top_words(request.limit, request.offset)
+            words, counts = [w for w, _ in top], [c for _, c in top]
+            for packed in pack_word_counts(uri, words, counts):
+                yield packed
+            return
+
+        except Exception as e:
+            code, msg = error_status(e)
+            context.set_details(msg)
+            context.set_code(code)
+            return
+
+    async def MatchWords(self, request: MatchWordsRequest, context):
+        """
+        API for words matching a pattern. Same behavior as
+        `WordCountServicer.MatchWords`
+        :param request: gRPC request of `MatchWordsRequest`
+        :param context: gRPC asyncio context
+        :return: stream of `PackedWordCounts`. in a form of async generator
+        """
+        try:
+            uri = request.uri
+            model = await AsyncHTMLDocumentModel.create(
+                uri, self.doc_store, self.query_cache, self.session
+            )
+
+            found = await model.match_words(
+                request.pattern,
+                MatchMode.Name(request.mode).lower(),
+                request.max_distance,
+                request.limit,
+            )
+            words, counts = [w for w, _ in found], [c for _, c in found]
+            for packed in pack_word_counts(uri, words, counts):
+                yield packed
+            return
+
+        except Exception as e:
+            code, msg = error_status(e)
+            context.set_details(msg)
+            context.set_code(code)
+            return
+
+    async def CountWordsBatch(self, request: BatchWordCountRequest, context):
+        """
+        API for Word Count on many URIs. Same behavior as
+        `WordCountServicer.CountWordsBatch`
+        :param request: gRPC request of `BatchWordCountRequest`
+        :param context: gRPC asyncio context
+        :return: stream of `WordCount`. in a form of async generator
+        """
+        semaphore = asyncio.Semaphore(config.BATCH_MAX_CONCURRENCY)
+
+        async def count_request(r: WordCountRequest) -> List[WordCount]:
+            async with semaphore:
+                try:
+                    model = await AsyncHTMLDocumentModel.create(
+                        r.uri, self.doc_store, self.query_cache, self.session
+                    )
+                    counts = await model.count_words(r.words)
+                except Exception as e:
+                    return [error_word_count(r.uri, e)]
+            return [
+                WordCount(uri=r.uri, word=word, count=count)
+                for word, count in zip(r.words, counts)
+            ]
+
+        jobs = [
+            asyncio.ensure_future(count_request(r)) for r in request.requests
+        ]
+        try:
+            for job in asyncio.as_completed(jobs):
+                for word_count in await job:
+                    yield word_count
+        finally:
+            for job in jobs:
+                job.cancel()
+
+
+async def serve_insecure_async(
+    host_port: str,
+    compression: Optional[str] = None,
+    metrics_host_port: Optional[str] = None,
+):
+    """
+    Open Insecure asyncio service of `AsyncWordCountServicer`
+    :param host_port: Where we listen to
+    :param compression: Compression of responses. None, "gzip" or "deflate".
+    Defaults to `GRPC_COMPRESSION`
+    :param metrics_host_port: Where we serve metrics. Defaults to
+    `METRICS_HOST_PORT`
+    """
+    start_metrics(metrics_host_port)
+    query_cache = get_async_redis_cache()
+    doc_store = get_async_mongo_db()
+    await doc_store.ensure_indexes()
+
+    connector = aiohttp.TCPConnector(
+        limit=config.AIO_MAX_CONNECTIONS,
+        resolver=PinnedResolver(),
+        use_dns_cache=False,
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        server = grpc.aio.server(
+            interceptors=(metrics.AsyncMetricsInterceptor(),),
+            compression=grpc_compression(
+                compression or config.GRPC_COMPRESSION
+            ),
+        )
+        wc_pb2_grpc.add_WordCountServiceServicer_to_server(
+            AsyncWordCountServicer(doc_store, query_cache, session), server
+        )
+        server.add_insecure_port(host_port)
+        await server.start()
+        try:
+            await server.wait_for_termination()
+        finally:
+            await server.stop(0)
+
+
+def serve_insecure_aio(
+    host_port: str,
+    compression: Optional[str] = None,
+    metrics_host_port: Optional[str] = None,
+):
+    """
+    Open Insecure asyncio service of `AsyncWordCountServicer`. Blocks until
+    Ctrl-C or SIGTERM. Writes are awaited on requests, so none are pending
+    """
+    interrupt_on_sigterm()
+    try:
+        asyncio.run(
+            serve_insecure_async(host_port, compression, metrics_host_port)
+        )
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,149 @@
+"""
+Compact binary encoding of word counters for document storage.
+
+A counter is split into buckets by hash of each word, so a few words can be
+read without decoding the whole counter. Each bucket is a compressed blob of
+  * Number of words and size of vocabulary, as little endian uint32
+  * Sorted vocabulary, joined by new lines. Words never contain white spaces
+  * Count of each word, as little endian uint32 array in vocabulary order
+
+Token streams (`encode_tokens`) are a compressed blob of
+  * Size of vocabulary, its length in bytes and number of tokens, as little
+    endian uint32
+  * Vocabulary, joined by new lines
+  * Vocabulary id of each token, as little endian uint16 array, or uint32
+    array if vocabulary does not fit in uint16
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Version of stored format. Documents without version are legacy hashes
+COMPACT_FORMAT = 2
+
+_HEADER = struct.Struct("<II")
+_TOKENS_HEADER = struct.Struct("<III")
+
+
+def bucket_of(word: str, buckets: int) -> int:
+    """Bucket index of `word` among `buckets` buckets"""
+    return zlib.crc32(word.encode("utf-8")) % buckets
+
+
+def encode_words(words: Sequence[str], counts: Sequence[int]) -> bytes:
+    """
+    Encode words and their counts, keeping their order
+    :param words: Words. They must not contain new lines
+    :param counts: Count of each word, in the same order
+    :return: Compressed blob
+    """
+    vocabulary = "\n".join(words).encode("utf-8")
+    return zlib.compress(
+        _HEADER.pack(len(words), len(vocabulary))
+        + vocabulary
+        + struct.pack("<%dI" % len(words), *counts)
+    )
+
+
+def decode_words(blob: bytes) -> Tuple[List[str], Tuple[int, ...]]:
+    """
+    Decode words and their counts encoded by `encode_words`
+    :param blob: Compressed blob
+    :return: (words, counts) in encoded order
+    """
+    raw = zlib.decompress(blob)
+    n, size = _HEADER.unpack_from(raw)
+    if not n:
+        return [], ()
+    offset = _HEADER.size
+    words = raw[offset : offset + size].decode("utf-8").split("\n")
+    return words, struct.unpack_from("<%dI" % n, raw, offset + size)
+
+
+def encode_bucket(counter: Dict[str, int]) -> bytes:
+    """
+    Encode a bucket of counter
+    :param counter: {Word:str, Occurrence:int}
+    :return: Compressed blob
+    """
+    words = sorted(counter)
+    return encode_words(words, [counter[w] for w in words])
+
+
+def decode_bucket(blob: bytes) -> Counter:
+    """
+    Decode a bucket encoded by `encode_bucket`
+    :param blob: Compressed blob
+    :return: Counter{Word:str, Occurrence:int}
+    """
+    return Counter(dict(zip(*decode_words(blob))))
+
+
+def encode_counter(counter: Counter, buckets: int) -> List[bytes]:
+    """
+    Encode counter into buckets
+    :param counter: Counter{Word:str, Occurrence:int}
+    :param buckets: Number of buckets
+    :return: Compressed blob of each bucket
+    """
+    split: List[Dict[str, int]] = [dict() for _ in range(buckets)]
+    for word, count in counter.items():
+        split[bucket_of(word, buckets)][word] = count
+    return [encode_bucket(bucket) for bucket in split]
+
+
+def decode_counter(blobs: Iterable[bytes]) -> Counter:
+    """
+    Decode counter encoded by `encode_counter`
+    :param blobs: Compressed blob of each bucket
+    :return: Counter{Word:str, Occurrence:int}
+    """
+    counter = Counter()
+    for blob in blobs:
+        counter.update(decode_bucket(blob))
+    return counter
+
+
+def _id_type(vocabulary_size: int) -> str:
+    """Narrowest array type holding ids of vocabulary"""
+    return "H" if vocabulary_size <= 2**16 else "I"
+
+
+def encode_tokens(words: Sequence[str], ids: Sequence[int]) -> bytes:
+    """
+    Encode a token stream as vocabulary ids
+    :param words: Vocabulary. They must not contain new lines
+    :param ids: Index in `words` of each token, in order
+    :return: Compressed blob
+    """
+    vocabulary = "\n".join(words).encode("utf-8")
+    packed = array(_id_type(len(words)), ids)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return zlib.compress(
+        _TOKENS_HEADER.pack(len(words), len(vocabulary), len(packed))
+        + vocabulary
+        + packed.tobytes()
+    )
+
+
+def decode_tokens(blob: bytes) -> Tuple[List[str], array]:
+    """
+    Decode a token stream encoded by `encode_tokens`
+    :param blob: Compressed blob
+    :return: (vocabulary, vocabulary id of each token)
+    """
+    raw = zlib.decompress(blob)
+    n, size, length = _TOKENS_HEADER.unpack_from(raw)
+    offset = _TOKENS_HEADER.size
+    words = raw[offset : offset + size].decode("utf-8").split("\n") if n else []
+    ids = array(_id_type(n))
+    offset += size
+    ids.frombytes(raw[offset : offset + length * ids.itemsize])
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return words, ids
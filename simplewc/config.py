@@ -2,7 +2,31 @@
 
 ALLOWED_PROTOCOLS = ("http", "https")
 MAX_CONTENT_SIZE = 2 ** (10 + 10 + 4)  # 16.0 MiB
+HTML_CHUNK_SIZE = 2 ** 16  # 64 KiB. Read and tokenize HTML by this size
+HTTP_POOL_HOSTS = 64  # Number of hosts we keep connections to
+HTTP_POOL_CONNECTIONS = 16  # Number of connections we keep per host
+DNS_CACHE_MAX_ENTRIES = 2 ** 12
+DNS_CACHE_TTL = 60  # Seconds we trust a DNS answer
 MAX_GRPC_SERVER_THREADS = 16
+# URIs of a batch request counted at the same time
+BATCH_MAX_CONCURRENCY = 8
+# Words in each PackedWordCounts message
+PACKED_CHUNK_SIZE = 4096
+# Largest edit distance of fuzzy word matching
+FUZZY_MAX_DISTANCE = 2
+# Keep word positions of documents, for phrase and n-gram counting. Documents
+# longer than POSITION_INDEX_MAX_TOKENS words are not kept
+POSITION_INDEX = True
+POSITION_INDEX_MAX_TOKENS = 2 ** 22
+# Indexes stored along with a document are skipped past this size in total,
+# so they fit in a MongoDB document (16 MiB) with its counter
+MAX_INDEX_BYTES = 2 ** (10 + 10 + 3)  # 8.0 MiB
+# gRPC compression of responses. None, "gzip" or "deflate"
+GRPC_COMPRESSION = None
+# Tokenize HTML on this many worker processes. 0 tokenizes on gRPC threads
+TOKENIZER_PROCESSES = 0
+# Serve Prometheus metrics at http://METRICS_HOST_PORT/metrics. None disables
+METRICS_HOST_PORT = "localhost:9101"
 INSECURE_HOST = "localhost"
 INSECURE_PORT = 50001
 
@@ -10,9 +34,58 @@ REDIS_HOST = "localhost"
 REDIS_PORT = 6379
 REDIS_DB = 0
 CACHE_EXPIRE = "600"
+# Shard URIs over several Redis servers, as [(host, port)], each with its own
+# connection pool. Empty uses REDIS_HOST and REDIS_PORT only
+REDIS_NODES = ()
 
 MONGO_HOST = "localhost"
 MONGO_PORT = 27017
 MONGO_DB = "wc_doc_cache"
 MONGO_COLLECTION = "wc_doc_collection"
+# Shard URIs over several MongoDB servers, as [(host, port)]. Empty uses
+# MONGO_HOST and MONGO_PORT only
+MONGO_NODES = ()
+# Points of each node on consistent hash ring. More spread URIs more evenly
+HASH_RING_REPLICAS = 160
+# Documents older than MONGO_TTL (soft expiry) are served as they are, and
+# refreshed in background, until MONGO_STALE_TTL more seconds (hard expiry)
 MONGO_TTL = 3600
+MONGO_STALE_TTL = 600
+# Documents older than MONGO_TTL are kept this long to be revalidated
+MONGO_REVALIDATE_WINDOW = 60 * 60 * 24
+# Stored counters are split into this many compressed buckets by word hash
+MONGO_COMPACT_BUCKETS = 16
+
+# In-process L1 cache in front of query cache and document storage
+LOCAL_QUERY_CACHE_MAX_ENTRIES = 2 ** 16
+LOCAL_QUERY_CACHE_TTL = 60
+LOCAL_DOC_CACHE_MAX_ENTRIES = 128
+LOCAL_DOC_CACHE_TTL = 300
+# Failures of URIs, such as unreachable host or too big document, are
+# remembered in query cache this long, and in process LOCAL_NEGATIVE_CACHE_TTL
+NEGATIVE_CACHE_TTL = 30
+LOCAL_NEGATIVE_CACHE_TTL = 5
+
+# Refresh documents accessed REFRESH_AHEAD_MIN_HITS times or more once they
+# are REFRESH_AHEAD_AT of MONGO_TTL old, before they expire. 0 disables
+REFRESH_AHEAD_MIN_HITS = 8
+REFRESH_AHEAD_AT = 0.8
+REFRESH_AHEAD_INTERVAL = 30  # Seconds between checks of due documents
+REFRESH_WORKERS = 2  # Threads refreshing documents in background
+
+# Query results and new documents are written to Redis and MongoDB by a
+# background worker, up to WRITE_BEHIND_BATCH at a time. Requests wait while
+# WRITE_BEHIND_MAX_PENDING writes are pending. 0 writes on request threads
+WRITE_BEHIND_MAX_PENDING = 1024
+WRITE_BEHIND_BATCH = 64
+
+# Popular documents have counts of their PREFILL_TOP_K most frequent words,
+# all of them if they have no more, written into query cache at once. A
+# document is popular when accessed PREFILL_MIN_FREQUENCY times recently, as
+# estimated by TinyLFU sketch of PREFILL_SKETCH_WIDTH counters. 0 disables
+PREFILL_TOP_K = 4096
+PREFILL_MIN_FREQUENCY = 3
+PREFILL_SKETCH_WIDTH = 2 ** 16
+
+# Asyncio server: limit of concurrent outbound HTTP connections
+AIO_MAX_CONNECTIONS = 1024
@@ -21,6 +21,10 @@ class NotReacheableLocation(IOError):
     """No routing possible"""
 
 
+class UnresolvableHost(NotReacheableLocation):
+    """Host name of requested URI does not resolve"""
+
+
 class TooBigResource(IOError):
     """User requested resource is too big to count a word"""
 
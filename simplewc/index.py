@@ -0,0 +1,330 @@
+"""
+Indexes of HTML document, built once when its counter is made and stored
+along with it in document storage. Frequency index is not stored. It is a
+view of the stored vocabulary, so words are stored once
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from simplewc.codec import (
+    decode_tokens,
+    decode_words,
+    encode_tokens,
+    encode_words,
+)
+from simplewc.config import MAX_INDEX_BYTES
+
+
+class FrequencyIndex:
+    """Words of HTML document sorted by occurrence, the most frequent first"""
+
+    # Name of this index in document storage
+    NAME = "frequency"
+
+    def __init__(self, words: Sequence[str], counts: Sequence[int]):
+        """
+        :param words: Words, the most frequent first
+        :param counts: Occurrence of each word, in the same order
+        """
+        self.words = words
+        self.counts = counts
+
+    @classmethod
+    def from_counter(cls, counter: Counter) -> "FrequencyIndex":
+        """Build index of counter. Ties are in alphabetical order"""
+        ranked = sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+        return cls([w for w, _ in ranked], [c for _, c in ranked])
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary: "VocabularyIndex") -> "FrequencyIndex":
+        """
+        Build index of vocabulary index, without sorting words. Stable sort
+        keeps ties in alphabetical order of vocabulary
+        """
+        counts = vocabulary.counts
+        ranked = sorted(
+            range(len(counts)), key=counts.__getitem__, reverse=True
+        )
+        return cls(
+            [vocabulary.words[i] for i in ranked], [counts[i] for i in ranked]
+        )
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "FrequencyIndex":
+        return cls(*decode_words(blob))
+
+    def to_bytes(self) -> bytes:
+        return encode_words(self.words, self.counts)
+
+    def page(self, offset: int = 0, limit: int = 0) -> List[Tuple[str, int]]:
+        """
+        Get words and their occurrences by rank
+        :param offset: Number of the most frequent words to skip
+        :param limit: Number of words to get. 0 for all the rest
+        :return: [(Word:str, Occurrence:int)], the most frequent first
+        """
+        end = offset + limit if limit else len(self.words)
+        return list(zip(self.words[offset:end], self.counts[offset:end]))
+
+    def __len__(self):
+        return len(self.words)
+
+
+# Sorts after any word starting with a given prefix
+_AFTER_PREFIX = "\U0010ffff"
+_WILDCARDS = re.compile(r"[*?]")
+
+
+class VocabularyIndex:
+    """
+    Words of HTML document in alphabetical order. Words sharing a prefix are
+    next to each other, so it works as a trie
+    """
+
+    # Name of this index in document storage
+    NAME = "vocabulary"
+
+    def __init__(self, words: Sequence[str], counts: Sequence[int]):
+        """
+        :param words: Words, sorted
+        :param counts: Occurrence of each word, in the same order
+        """
+        self.words = words
+        self.counts = counts
+
+    @classmethod
+    def from_counter(cls, counter: Counter) -> "VocabularyIndex":
+        words = sorted(counter)
+        return cls(words, [counter[w] for w in words])
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "VocabularyIndex":
+        return cls(*decode_words(blob))
+
+    def to_bytes(self) -> bytes:
+        return encode_words(self.words, self.counts)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        """Range of words starting with `prefix`, in O(log n)"""
+        return (
+            bisect_left(self.words, prefix),
+            bisect_left(self.words, prefix + _AFTER_PREFIX),
+        )
+
+    def prefix(self, prefix: str) -> List[Tuple[str, int]]:
+        """
+        Find words starting with `prefix`
+        :return: [(Word:str, Occurrence:int)] in alphabetical order
+        """
+        start, end = self._range(prefix)
+        return list(zip(self.words[start:end], self.counts[start:end]))
+
+    def wildcard(self, pattern: str) -> List[Tuple[str, int]]:
+        """
+        Find words matching `pattern`. `*` matches any characters, and `?`
+        matches a character. Only words starting with the literal part before
+        the first wildcard are looked at
+        :return: [(Word:str, Occurrence:int)] in alphabetical order
+        """
+        literal = _WILDCARDS.split(pattern, 1)[0]
+        if literal == pattern:
+            return [(w, c) for w, c in self.prefix(pattern) if w == pattern]
+
+        regex = re.compile(
+            ".*".join(
+                ".".join(re.escape(part) for part in piece.split("?"))
+                for piece in pattern.split("*")
+            )
+        )
+        start, end = self._range(literal)
+        return [
+            (self.words[i], self.counts[i])
+            for i in range(start, end)
+            if regex.fullmatch(self.words[i])
+        ]
+
+    def match(
+        self,
+        pattern: str,
+        mode: str = "prefix",
+        max_distance: int = 0,
+        limit: int = 0,
+    ) -> List[Tuple[str, int]]:
+        """
+        Find words matching a pattern
+        :param pattern: Prefix, wildcard pattern or word
+        :param mode: "prefix", "wildcard" or "fuzzy"
+        :param max_distance: Edit distance allowed in fuzzy mode
+        :param limit: Number of words to get. 0 for all
+        :return: [(Word:str, Occurrence:int)] in alphabetical order
+        """
+        if mode == "fuzzy":
+            found = self.fuzzy(pattern, max_distance)
+        elif mode == "wildcard":
+            found = self.wildcard(pattern)
+        else:
+            found = self.prefix(pattern)
+        return found[:limit] if limit else found
+
+    def fuzzy(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """
+        Find words within Levenshtein distance `max_distance` from `word`.
+        Walks the vocabulary as a trie, sharing rows of distance table among
+        words with the same prefix, and skips every word under a prefix once
+        the prefix is too far
+        :return: [(Word:str, Occurrence:int)] in alphabetical order
+        """
+        found = []
+        # rows[k]: distances between word[:j] and the first k characters of
+        # current path
+        rows = [list(range(len(word) + 1))]
+        path = ""
+        i = 0
+        while i < len(self.words):
+            candidate = self.words[i]
+            shared = 0
+            limit = min(len(path), len(candidate))
+            while shared < limit and path[shared] == candidate[shared]:
+                shared += 1
+            del rows[shared + 1 :]
+
+            too_far = False
+            for char in candidate[shared:]:
+                rows.append(_next_row(rows[-1], char, word))
+                if min(rows[-1]) > max_distance:
+                    too_far = True
+                    break
+            path = candidate[: len(rows) - 1]
+
+            if too_far:
+                # No word under this prefix can be close enough
+                i = bisect_left(self.words, path + _AFTER_PREFIX, i)
+                continue
+            if rows[-1][-1] <= max_distance:
+                found.append((candidate, self.counts[i]))
+            i += 1
+        return found
+
+
+def _next_row(row: List[int], char: str, word: str) -> List[int]:
+    """Next row of Levenshtein distance table, after appending `char`"""
+    new = [row[0] + 1]
+    for j, target in enumerate(word, 1):
+        new.append(
+            min(new[j - 1] + 1, row[j] + 1, row[j - 1] + (char != target))
+        )
+    return new
+
+
+class PositionIndex:
+    """
+    Words of HTML document in their order, as an array of vocabulary ids.
+    Unlike a counter, phrases and n-grams can be counted on it
+    """
+
+    # Name of this index in document storage
+    NAME = "positions"
+
+    def __init__(self, words: Sequence[str], ids: array):
+        """
+        :param words: Vocabulary
+        :param ids: Index in `words` of each token, in document order
+        """
+        self.words = words
+        self.ids = ids
+        self._id_of = {word: i for i, word in enumerate(words)}
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[str]) -> "PositionIndex":
+        """Build index of tokens. Vocabulary is in order of appearance"""
+        id_of: Dict[str, int] = dict()
+        ids = array("I", (id_of.setdefault(t, len(id_of)) for t in tokens))
+        return cls(list(id_of), ids)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "PositionIndex":
+        return cls(*decode_tokens(blob))
+
+    def to_bytes(self) -> bytes:
+        return encode_tokens(self.words, self.ids)
+
+    def counter(self) -> Counter:
+        """Count of each word, same as counting tokens"""
+        return Counter(
+            {self.words[i]: count for i, count in Counter(self.ids).items()}
+        )
+
+    def count_phrase(self, phrase: Sequence[str]) -> int:
+        """
+        Count occurrences of consecutive words. Occurrences may overlap
+        :param phrase: Words, as tokenized
+        :return: Occurrence of `phrase`
+        """
+        ids = [self._id_of.get(word) for word in phrase]
+        if not ids or None in ids:
+            return 0
+
+        # Search bytes of whole phrase in C. `array.index` takes no start
+        # before Python 3.10. Matches within an id are skipped
+        needle = array(self.ids.typecode, ids).tobytes()
+        haystack, size = self.ids.tobytes(), self.ids.itemsize
+        count, at = 0, haystack.find(needle)
+        while at >= 0:
+            if at % size == 0:
+                count += 1
+            at = haystack.find(needle, at + 1)
+        return count
+
+    def top_ngrams(self, n: int, limit: int = 0) -> List[Tuple[str, int]]:
+        """
+        Get the most frequent sequences of `n` words
+        :param n: Number of words in each sequence
+        :param limit: Number of sequences to get. 0 for all
+        :return: [(Words joined by a space:str, Occurrence:int)], the most
+        frequent first. Ties are in order of first appearance
+        """
+        if n <= 0:
+            return []
+        grams = Counter(zip(*(self.ids[i:] for i in range(n))))
+        return [
+            (" ".join(self.words[i] for i in gram), count)
+            for gram, count in grams.most_common(limit or None)
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Indexes stored for every HTML document, built from its counter. Frequency
+# index is derived from vocabulary index when it is loaded
+INDEXES = (VocabularyIndex,)
+
+
+def build_indexes(
+    counter: Counter,
+    positions: Optional[PositionIndex] = None,
+    max_bytes: int = MAX_INDEX_BYTES,
+) -> Dict[str, bytes]:
+    """
+    Build every index of HTML document. An index which would make them
+    larger than `max_bytes` in total is skipped, and built on demand instead
+    :param counter: HTML document in a form of Counter
+    :param positions: Position index of HTML document, if it is kept
+    :param max_bytes: Limit of total size of serialized indexes
+    :return: {Index name:str, Serialized index:bytes}
+    """
+    built = [index.from_counter(counter) for index in INDEXES]
+    if positions is not None:
+        built.append(positions)
+
+    indexes, size = dict(), 0
+    for index in built:
+        blob = index.to_bytes()
+        if size + len(blob) <= max_bytes:
+            indexes[index.NAME] = blob
+            size += len(blob)
+    return indexes
@@ -0,0 +1,308 @@
+"""
+Load generator of WordCount gRPC service, for capacity planning.
+  * Concurrent streams over several channels, open loop at a target rate or
+    closed loop as fast as the server answers
+  * URIs and words are taken from a mix file, in turn
+  * Reports throughput, errors by `grpc.StatusCode` and latency percentiles
+    of the first message and of the full stream
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import grpc
+
+from simplewc.config import INSECURE_HOST, INSECURE_PORT
+from simplewc.protos.wc_pb2 import WordCountRequest
+from simplewc.protos.wc_pb2_grpc import WordCountServiceStub
+
+# Methods taking `WordCountRequest`
+METHODS = ("CountWords", "CountWordsPacked", "CountPhrases")
+PERCENTILES = (50, 90, 99, 99.9)
+# Seconds to wait for each channel to connect before the run
+CONNECT_TIMEOUT = 10
+
+
+def read_mix(lines: Iterable[str]) -> List[WordCountRequest]:
+    """
+    Read mix of requests, one request a line.
+      * `<uri> <word> <word> ...`, or separated by tabs to have phrases
+      * Empty lines and lines starting with `#` are skipped
+      * Repeat a line to send it more often
+    :param lines: Lines of mix file
+    :return: Requests, in order
+    """
+    mix = []
+    for line in lines:
+        line = line.strip("\r\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        fields = line.split("\t") if "\t" in line else line.split()
+        fields = [field.strip() for field in fields if field.strip()]
+        mix.append(WordCountRequest(uri=fields[0], words=fields[1:]))
+    if not mix:
+        raise ValueError("Mix has no request")
+    return mix
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of sorted `values`. 0 if there is none"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+class Pacer:
+    """Hands out send times of requests until the run is over"""
+
+    def __init__(self, rate: float, duration: float):
+        """
+        :param rate: Requests per second in total. 0 for as fast as possible
+        :param duration: Seconds of the run
+        """
+        self.start = time.perf_counter()
+        self.end = self.start + duration
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._turns = itertools.count()
+        self._lock = threading.Lock()
+
+    def wait(self) -> Optional[float]:
+        """
+        Wait until next request is due
+        :return: When it was due, in `time.perf_counter()`. None when over
+        """
+        if not self.interval:
+            now = time.perf_counter()
+            return now if now < self.end else None
+
+        with self._lock:
+            turn = next(self._turns)
+        # Multiply rather than add up intervals, whose rounding errors would
+        # let one more request in before the end
+        due = self.start + turn * self.interval
+        if due >= self.end:
+            return None
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return due
+
+
+def call(
+    stub: WordCountServiceStub,
+    method: str,
+    request: WordCountRequest,
+    timeout: Optional[float],
+) -> Tuple[Optional[float], float, grpc.StatusCode]:
+    """
+    Call a method and read its stream to the end
+    :return: (Seconds to the first message, None if the stream is empty,
+    Seconds to the end of stream, Status code)
+    """
+    start, first = time.perf_counter(), None
+    try:
+        for _ in getattr(stub, method)(request, timeout=timeout):
+            if first is None:
+                first = time.perf_counter() - start
+    except grpc.RpcError as e:
+        return first, time.perf_counter() - start, e.code()
+    return first, time.perf_counter() - start, grpc.StatusCode.OK
+
+
+def run_load(
+    target: str,
+    mix: Sequence[WordCountRequest],
+    method: str = "CountWords",
+    channels: int = 1,
+    streams: int = 4,
+    rate: float = 0.0,
+    duration: float = 10.0,
+    timeout: Optional[float] = None,
+) -> dict:
+    """
+    Send requests of `mix` in turn, from `streams` concurrent streams on each
+    of `channels` channels.
+    With a target `rate`, latency is measured from when each request was
+    due, so a server falling behind is not hidden by clients waiting on it
+    :param target: Server, such as "localhost:50001"
+    :param mix: Requests to send, in turn
+    :param method: One of `METHODS`
+    :param channels: Number of gRPC channels, each its own HTTP/2 connection
+    :param streams: Number of concurrent streams on each channel
+    :param rate: Requests per second in total. 0 for as fast as possible
+    :param duration: Seconds of the run
+    :param timeout: Deadline of each call in seconds
+    :return: Report, see `summarize`
+    """
+    if method not in METHODS:
+        raise ValueError("Method must be one of %s" % (METHODS,))
+
+    opened = [grpc.insecure_channel(target) for _ in range(channels)]
+    stubs = [WordCountServiceStub(channel) for channel in opened]
+    turns = itertools.count()
+    lock = threading.Lock()
+    firsts, fulls, codes = [], [], Counter()
+
+    def worker(stub: WordCountServiceStub):
+        while True:
+            due = pacer.wait()
+            if due is None:
+                return
+            request = mix[next(turns) % len(mix)]
+            lag = time.perf_counter() - due
+            first, full, code = call(stub, method, request, timeout)
+            with lock:
+                codes[code.name] += 1
+                if code == grpc.StatusCode.OK:
+                    fulls.append(lag + full)
+                    if first is not None:
+                        firsts.append(lag + first)
+
+    try:
+        for channel in opened:
+            grpc.channel_ready_future(channel).result(CONNECT_TIMEOUT)
+        pacer = Pacer(rate, duration)
+        with futures.ThreadPoolExecutor(channels * streams) as pool:
+            workers = [pool.submit(worker, stub) for stub in stubs * streams]
+            for done in workers:
+                done.result()
+        elapsed = time.perf_counter() - pacer.start
+    finally:
+        for channel in opened:
+            channel.close()
+
+    return summarize(firsts, fulls, codes, elapsed, rate)
+
+
+def summarize(
+    firsts: List[float],
+    fulls: List[float],
+    codes: Counter,
+    elapsed: float,
+    rate: float = 0.0,
+) -> dict:
+    """
+    Summarize a run
+    :param firsts: Seconds to the first message of each successful call
+    :param fulls: Seconds to the end of stream of each successful call
+    :param codes: Number of calls by status code name
+    :param elapsed: Seconds of the run
+    :param rate: Target rate of the run
+    :return: {"requests", "throughput", "target_rate", "codes",
+    "first_message_ms", "full_stream_ms"}. Latencies are of successful
+    calls, by percentile and "max"
+    """
+
+    def latencies(values: List[float]) -> dict:
+        values = sorted(values)
+        report = {"p%s" % q: percentile(values, q) * 1000 for q in PERCENTILES}
+        report["max"] = values[-1] * 1000 if values else 0.0
+        return report
+
+    requests = sum(codes.values())
+    return {
+        "requests": requests,
+        "throughput": requests / elapsed if elapsed else 0.0,
+        "target_rate": rate,
+        "codes": dict(codes),
+        "first_message_ms": latencies(firsts),
+        "full_stream_ms": latencies(fulls),
+    }
+
+
+def format_report(report: dict) -> str:
+    """Format report of `run_load` for humans"""
+    lines = [
+        "Requests     %d" % report["requests"],
+        "Throughput   %.1f req/s%s"
+        % (
+            report["throughput"],
+            (
+                " (target %.1f)" % report["target_rate"]
+                if report["target_rate"]
+                else ""
+            ),
+        ),
+        "Status codes %s"
+        % ", ".join("%s %d" % item for item in sorted(report["codes"].items())),
+        "Latency (ms) %s"
+        % "".join("%9s" % name for name in report["full_stream_ms"]),
+    ]
+    for title, key in (
+        ("first message", "first_message_ms"),
+        ("full stream", "full_stream_ms"),
+    ):
+        lines.append(
+            "%-13s%s"
+            % (title, "".join("%9.2f" % v for v in report[key].values()))
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Sequence[str] = None):
+    """Run load generator from CLI"""
+    parser = argparse.ArgumentParser(prog="simplewc.loadgen")
+    parser.add_argument(
+        "mix",
+        type=argparse.FileType("r"),
+        help="File of `<uri> <word> ...` lines. `-` for stdin",
+    )
+    parser.add_argument(
+        "--target", default="%s:%d" % (INSECURE_HOST, INSECURE_PORT)
+    )
+    parser.add_argument("--method", choices=METHODS, default="CountWords")
+    parser.add_argument(
+        "--channels",
+        type=int,
+        default=1,
+        help="gRPC channels, each its own connection",
+    )
+    parser.add_argument(
+        "--streams", type=int, default=4, help="Concurrent streams per channel"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="Requests per second in total. Defaults to as fast as possible",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds of the run"
+    )
+    parser.add_argument(
+        "--timeout", type=float, help="Deadline of each call in seconds"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print report in JSON"
+    )
+    args = parser.parse_args(argv)
+
+    with args.mix:
+        mix = read_mix(args.mix)
+    report = run_load(
+        args.target,
+        mix,
+        args.method,
+        args.channels,
+        args.streams,
+        args.rate,
+        args.duration,
+        args.timeout,
+    )
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
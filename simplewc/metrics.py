@@ -0,0 +1,441 @@
+"""
+Metrics of each layer, served in Prometheus text format.
+  * Counters, gauges and histograms are kept in process memory
+  * `serve_metrics` serves them at `/metrics` over HTTP, next to gRPC server
+  * `MetricsInterceptor` and `AsyncMetricsInterceptor` track gRPC streams
+"""
+
+import functools
+import inspect
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import grpc
+
+# Upper bounds of histogram buckets
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = tuple(float(2 ** n) for n in range(10, 25, 2))  # 1 KiB ~ 16 MiB
+COUNT_BUCKETS = tuple(float(10 ** n) for n in range(1, 8))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: List["Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, _escape(v)) for k, v in pairs)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """A metric family. Each combination of label values is a sample"""
+
+    TYPE = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        """
+        :param name: Metric name, such as `wc_fetch_bytes`
+        :param documentation: Help text of metric
+        :param labels: Label names. Values are given as keyword arguments
+        :param registry: Where metric is rendered. None not to register
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = dict()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                "%s takes labels %s" % (self.name, self.label_names)
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self, key: Tuple[str, ...], value) -> List[str]:
+        labels = _format_labels(list(zip(self.label_names, key)))
+        return ["%s%s %s" % (self.name, labels, _format_value(value))]
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+            lines = [
+                "# HELP %s %s" % (self.name, self.documentation),
+                "# TYPE %s %s" % (self.name, self.TYPE),
+            ]
+            for key, value in items:
+                lines.extend(self._samples(key, value))
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """Value only goes up, such as number of requests"""
+
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    """Value goes up and down, such as streams in progress"""
+
+    TYPE = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values, such as latency in seconds"""
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        """
+        :param buckets: Upper bounds of buckets, in increasing order
+        See `Metric` for the other parameters
+        """
+        self.buckets = tuple(buckets) + (float("inf"),)
+        super(Histogram, self).__init__(name, documentation, labels, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._values:
+                # [count of each bucket, sum]
+                self._values[key] = [[0] * len(self.buckets), 0.0]
+            counts, _ = sample = self._values[key]
+            counts[i] += 1
+            sample[1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            sample = self._values.get(self._key(labels))
+            return sum(sample[0]) if sample else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe seconds spent in `with` block, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """Decorator observing seconds spent in a function or coroutine"""
+
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.time(**labels):
+                        return await fn(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _samples(self, key: Tuple[str, ...], value) -> List[str]:
+        counts, total = value
+        pairs = list(zip(self.label_names, key))
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(pairs + [("le", _format_value(bound))])
+            lines.append("%s_bucket%s %d" % (self.name, labels, cumulative))
+        labels = _format_labels(pairs)
+        lines.append("%s_sum%s %s" % (self.name, labels, _format_value(total)))
+        lines.append("%s_count%s %d" % (self.name, labels, cumulative))
+        return lines
+
+
+# Cache tiers. `layer` is "l1", "redis" or "mongo", `result` is hit or miss.
+# Documents served past soft expiry are "stale"
+QUERY_CACHE_REQUESTS = Counter(
+    "wc_query_cache_requests_total",
+    "Words looked up in query cache",
+    ("layer", "result"),
+)
+NEGATIVE_CACHE_REQUESTS = Counter(
+    "wc_negative_cache_requests_total",
+    "URIs and hosts looked up in negative cache of failures",
+    ("layer", "result"),
+)
+# `kind` is "whole" or "top", as of words written
+QUERY_CACHE_PREFILLS = Counter(
+    "wc_query_cache_prefills_total",
+    "Popular documents written into query cache at once",
+    ("kind",),
+)
+DOCUMENT_STORAGE_REQUESTS = Counter(
+    "wc_document_storage_requests_total",
+    "Documents looked up in document storage",
+    ("layer", "result"),
+)
+REDIS_SECONDS = Histogram(
+    "wc_redis_seconds", "Latency of Redis round trips", ("op",)
+)
+MONGO_SECONDS = Histogram(
+    "wc_mongo_seconds", "Latency of MongoDB round trips", ("op",)
+)
+
+# `trigger` is "stale" or "ahead", `result` is "ok" or "error"
+DOCUMENT_REFRESHES = Counter(
+    "wc_document_refreshes_total",
+    "Documents refreshed in background",
+    ("trigger", "result"),
+)
+
+# Background writes. `store` is "query_cache" or "document_storage", and
+# `result` is "ok" or "error"
+WRITE_BEHIND_PENDING = Gauge(
+    "wc_write_behind_pending",
+    "Writes waiting for background worker",
+    ("store",),
+)
+WRITE_BEHIND_WAITS = Counter(
+    "wc_write_behind_waits_total",
+    "Writes which waited for room in full write-behind queue",
+    ("store",),
+)
+WRITE_BEHIND_WRITES = Counter(
+    "wc_write_behind_writes_total",
+    "Writes done by background worker",
+    ("store", "result"),
+)
+
+# Safety check of URI
+SAFETY_CHECK_SECONDS = Histogram(
+    "wc_safety_check_seconds", "Latency of URI safety check, including DNS"
+)
+DNS_CACHE_REQUESTS = Counter(
+    "wc_dns_cache_requests_total",
+    "Host names looked up in DNS cache",
+    ("result",),
+)
+
+# Download and tokenizing of HTML documents
+FETCH_SECONDS = Histogram(
+    "wc_fetch_seconds", "Latency of HTML document download until headers"
+)
+FETCH_RESPONSES = Counter(
+    "wc_fetch_responses_total", "HTTP responses of HTML documents", ("status",)
+)
+FETCH_BYTES = Histogram(
+    "wc_fetch_bytes",
+    "Bytes of HTML documents read",
+    buckets=SIZE_BUCKETS,
+)
+TOKENIZE_SECONDS = Histogram(
+    "wc_tokenize_seconds",
+    "Latency of tokenizing HTML document, including streamed download",
+)
+DOCUMENT_TOKENS = Histogram(
+    "wc_document_tokens",
+    "Words in each tokenized HTML document",
+    buckets=COUNT_BUCKETS,
+)
+
+# gRPC
+ACTIVE_STREAMS = Gauge(
+    "wc_active_streams", "gRPC response streams in progress", ("method",)
+)
+RPC_SECONDS = Histogram(
+    "wc_rpc_seconds", "Latency of gRPC calls, to the end of stream", ("method",)
+)
+RPC_ERRORS = Counter(
+    "wc_rpc_errors_total", "Errors reported to gRPC clients", ("code",)
+)
+
+
+def count_lookups(counter: Counter, hits: int, misses: int, **labels):
+    """Count hits and misses of a cache lookup"""
+    if hits:
+        counter.inc(hits, result="hit", **labels)
+    if misses:
+        counter.inc(misses, result="miss", **labels)
+
+
+@contextmanager
+def track_stream(method: str):
+    """Count a gRPC stream as active, and observe its latency"""
+    ACTIVE_STREAMS.inc(method=method)
+    try:
+        with RPC_SECONDS.time(method=method):
+            yield
+    finally:
+        ACTIVE_STREAMS.dec(method=method)
+
+
+def _method_name(handler_call_details) -> str:
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Track response streams of gRPC server. See `track_stream`"""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_stream is None:
+            return handler
+        method, behavior = (
+            _method_name(handler_call_details),
+            handler.unary_stream,
+        )
+
+        def tracked(request, context):
+            with track_stream(method):
+                yield from behavior(request, context)
+
+        return handler._replace(unary_stream=tracked)
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Track response streams of gRPC asyncio server. See `track_stream`"""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or handler.unary_stream is None:
+            return handler
+        method, behavior = (
+            _method_name(handler_call_details),
+            handler.unary_stream,
+        )
+
+        async def tracked(request, context):
+            with track_stream(method):
+                async for response in behavior(request, context):
+                    yield response
+
+        return handler._replace(unary_stream=tracked)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scraped every few seconds. Do not flood stderr
+        pass
+
+
+def serve_metrics(
+    host_port: str, registry: Registry = REGISTRY
+) -> ThreadingHTTPServer:
+    """
+    Serve metrics at `/metrics` on a background thread
+    :param host_port: Where we listen to, such as "localhost:9101"
+    :param registry: Metrics to serve
+    :return: Started HTTP server. Call `shutdown()` to stop it
+    """
+    host, port = host_port.rsplit(":", 1)
+    host = host.strip("[]")
+    server_cls = ThreadingHTTPServer
+    if ":" in host:
+        server_cls = type(
+            "MetricsServer",
+            (ThreadingHTTPServer,),
+            {"address_family": socket.AF_INET6},
+        )
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = server_cls((host, int(port)), handler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    return server
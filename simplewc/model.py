@@ -1,42 +1,112 @@
 """Represent Data Model Layer"""
+
+import functools
+import multiprocessing
 import socket
+import threading
+import time
 from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.cookiejar import DefaultCookiePolicy
 from ipaddress import IPv6Address, ip_address
 from string import punctuation
-from typing import Generator, Union
+from typing import (
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
-from simplewc.config import ALLOWED_PROTOCOLS, MAX_CONTENT_SIZE
+from simplewc import metrics
+from simplewc.config import (
+    ALLOWED_PROTOCOLS,
+    CACHE_EXPIRE,
+    DNS_CACHE_MAX_ENTRIES,
+    DNS_CACHE_TTL,
+    FUZZY_MAX_DISTANCE,
+    HTML_CHUNK_SIZE,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_HOSTS,
+    LOCAL_QUERY_CACHE_MAX_ENTRIES,
+    MAX_CONTENT_SIZE,
+    MONGO_TTL,
+    NEGATIVE_CACHE_TTL,
+    POSITION_INDEX,
+    POSITION_INDEX_MAX_TOKENS,
+    PREFILL_MIN_FREQUENCY,
+    PREFILL_SKETCH_WIDTH,
+    PREFILL_TOP_K,
+    REFRESH_AHEAD_AT,
+    REFRESH_AHEAD_INTERVAL,
+    REFRESH_AHEAD_MIN_HITS,
+    REFRESH_WORKERS,
+    TOKENIZER_PROCESSES,
+)
 from simplewc.exceptions import (
     AccessLocalURI,
     NotAllowedScheme,
     NotInDocumentStorage,
-    NotInResultCacheQuery,
     NotReacheableLocation,
     TooBigResource,
+    UnresolvableHost,
 )
-from simplewc.storage import DocumentStorage, QueryCache
+from simplewc.index import (
+    FrequencyIndex,
+    PositionIndex,
+    VocabularyIndex,
+    build_indexes,
+)
+from simplewc.storage import DocumentStorage, LRUCache, QueryCache, TinyLFU
+from simplewc.tokenizer import tokenize_html_stream
+
+_DNS_CACHE = LRUCache(DNS_CACHE_MAX_ENTRIES, DNS_CACHE_TTL)
 
 
-def raise_if_not_safe(uri: str):
+def resolve_host(host: str) -> str:
     """
-    Check if given URI is pointing publicly available resource
-    :param uri: URI to user requested resource
-    :return: None
-    :raises: `NotAllowedScheme` for unexpected protocol and `AccessLocalURI`
-    for local resources
+    Resolve host name into IP address. Answers are cached for `DNS_CACHE_TTL`
+    :param host: Host name
+    :return: IP address
+    :raises: `UnresolvableHost` when we cannot resolve it
     """
-    up = urlparse(uri)
-    if up.scheme not in ALLOWED_PROTOCOLS:
-        raise NotAllowedScheme
     try:
-        ip = ip_address(socket.gethostbyname(up.netloc))
+        ip = _DNS_CACHE.get(host)
+    except KeyError:
+        metrics.DNS_CACHE_REQUESTS.inc(result="miss")
+    else:
+        metrics.DNS_CACHE_REQUESTS.inc(result="hit")
+        return ip
+
+    try:
+        ip = socket.gethostbyname(host)
     except socket.gaierror:
-        raise NotReacheableLocation
+        raise UnresolvableHost("Could not resolve %s" % host)
+    _DNS_CACHE.put(host, ip)
+    return ip
+
 
+def raise_if_not_public(ip: str, uri: str):
+    """
+    Check if given IP address is publicly available
+    :param ip: IP address to check
+    :param uri: What we are accessing, for error messages
+    :raises: `AccessLocalURI` for local resources
+    """
+    ip = ip_address(ip)
     if ip.is_link_local:
         raise AccessLocalURI("Access to %s is to local resource" % uri)
     if isinstance(ip, IPv6Address) and ip.is_site_local:
@@ -45,8 +115,152 @@ def raise_if_not_safe(uri: str):
         raise AccessLocalURI("Access to %s is to non public resource" % uri)
 
 
+def resolve_public_host(host: str) -> str:
+    """
+    Resolve host name into IP address, and check it is publicly available
+    :param host: Host name
+    :return: Public IP address
+    :raises: `NotReacheableLocation` and `AccessLocalURI`
+    """
+    ip = resolve_host(host)
+    raise_if_not_public(ip, host)
+    return ip
+
+
+@metrics.SAFETY_CHECK_SECONDS.timed()
+def raise_if_not_safe(uri: str) -> str:
+    """
+    Check if given URI is pointing publicly available resource
+    :param uri: URI to user requested resource
+    :return: IP address we validated. Downloads connect to this address
+    :raises: `NotAllowedScheme` for unexpected protocol and `AccessLocalURI`
+    for local resources
+    """
+    up = urlparse(uri)
+    if up.scheme not in ALLOWED_PROTOCOLS:
+        raise NotAllowedScheme
+    ip = resolve_host(up.hostname or "")
+    raise_if_not_public(ip, uri)
+    return ip
+
+
+def is_resolved(host: str) -> bool:
+    """Check if we have a DNS answer of host in cache"""
+    try:
+        _DNS_CACHE.get(host)
+    except KeyError:
+        return False
+    return True
+
+
+# Failures remembered in negative cache, by name. Cheap ones such as
+# `NotAllowedScheme` are checked every time
+NEGATIVE_CACHED = {
+    cls.__name__: cls
+    for cls in (
+        AccessLocalURI,
+        NotReacheableLocation,
+        TooBigResource,
+        UnresolvableHost,
+    )
+}
+# Failures of every URI on the host. The others are failures of the URI
+HOST_FAILURES = (AccessLocalURI, UnresolvableHost)
+
+
+def host_failure_key(uri: str) -> str:
+    """Key a failure of every URI on the host of `uri` is remembered under"""
+    return "host:" + (urlparse(uri).hostname or "")
+
+
+def failure_keys(uri: str) -> List[str]:
+    """Keys a failure of `uri` may be remembered under. See `failure_key`"""
+    return ["uri:" + uri, host_failure_key(uri)]
+
+
+def failure_key(uri: str, e: Exception) -> Optional[str]:
+    """
+    Key to remember failure `e` of `uri` under
+      * Unresolvable or local host is a failure of every URI on the host
+      * Too big document, or connection failure such as reset or TLS error,
+        is a failure of the URI. Other URIs on the host may well work
+    :return: Key, or None if `e` is not worth remembering
+    """
+    if type(e) not in NEGATIVE_CACHED.values():
+        return None
+    if type(e) in HOST_FAILURES:
+        return host_failure_key(uri)
+    return "uri:" + uri
+
+
+def encode_failure(e: Exception) -> str:
+    """Encode failure to keep in negative cache, as `<class name>:<message>`"""
+    return "%s:%s" % (type(e).__name__, e)
+
+
+def raise_failure(failure: Optional[str]):
+    """
+    Raise failure from negative cache again, if there is one
+    :param failure: Encoded by `encode_failure`, or None
+    """
+    if failure is None:
+        return
+    name, _, message = failure.partition(":")
+    if name in NEGATIVE_CACHED:
+        raise NEGATIVE_CACHED[name](message)
+
+
+def raise_if_failed_recently(
+    uri: str, query_cache: QueryCache, remote: bool = True
+):
+    """
+    Raise failure of `uri` remembered in negative cache, without trying again
+    :param remote: Ask query cache backend too, costing a round trip
+    """
+    raise_failure(query_cache.get_failure(failure_keys(uri), remote))
+
+
+def remember_failure(uri: str, query_cache: QueryCache, e: Exception):
+    """
+    Remember failure `e` of `uri` in negative cache for `NEGATIVE_CACHE_TTL`,
+    shared through query cache backend
+    """
+    key = failure_key(uri, e)
+    if key is not None:
+        query_cache.store_failure(key, encode_failure(e), NEGATIVE_CACHE_TTL)
+
+
+def negative_cached(method: Callable) -> Callable:
+    """
+    Decorate a method of HTML document model reaching origin server, called
+    once cache tiers miss. It fails right away with a remembered failure,
+    and remembers a new one unless the model is of a background refresh
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        raise_if_failed_recently(self.uri, self.query_cache)
+        try:
+            return method(self, *args, **kwargs)
+        except tuple(NEGATIVE_CACHED.values()) as e:
+            if self.remember_failures:
+                remember_failure(self.uri, self.query_cache, e)
+            raise
+
+    return wrapper
+
+
+def is_ip_address(host: str) -> bool:
+    """Check if host is IP address rather than host name"""
+    try:
+        ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return True
+
+
 def tokenize_html_to_words(
-    content: Union[str, bytes]
+    content: Union[str, bytes],
 ) -> Generator[str, None, None]:
     """
     Parse HTML content and split into word tokens.
@@ -65,41 +279,548 @@ def tokenize_html_to_words(
     return
 
 
+def tokenize_phrase(phrase: str) -> List[str]:
+    """
+    Split a phrase into words, the same way as text of HTML document
+      * e.g., "True to size." is ["true", "to", "size"]
+    :param phrase: Words separated by white spaces
+    :return: Each word of `phrase`
+    """
+    return [tok.strip(punctuation).lower() for tok in phrase.split()]
+
+
+def phrase_cache_key(uri: str) -> str:
+    """
+    Query cache key of phrase counts of `uri`, apart from its word counts.
+    "true to size" counted as a phrase is not the same as counted as a word.
+    URIs are http or https, so it never names a document
+    """
+    return "phrases:" + uri
+
+
+_HTTP_SESSION: Optional[requests.Session] = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+# (Key in stored validators, response header, conditional request header)
+VALIDATORS = (
+    ("etag", "ETag", "If-None-Match"),
+    ("last_modified", "Last-Modified", "If-Modified-Since"),
+)
+
+
+class PinnedHTTPConnection(HTTPConnection):
+    """
+    HTTP connection to the public IP address we validated, from the same DNS
+    cache as `raise_if_not_safe`. It never resolves host name on its own, so
+    DNS answer cannot change between safety check and download
+    """
+
+    def _new_conn(self):
+        host = self._dns_host
+        if not is_ip_address(host):
+            # Only socket connects to IP. Host header and TLS use host name
+            self._dns_host = resolve_public_host(host)
+        try:
+            return super(PinnedHTTPConnection, self)._new_conn()
+        finally:
+            self._dns_host = host
+
+
+class PinnedHTTPSConnection(PinnedHTTPConnection, HTTPSConnection):
+    """HTTPS version of `PinnedHTTPConnection`"""
+
+
+class PinnedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PinnedHTTPConnection
+
+
+class PinnedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PinnedHTTPSConnection
+
+
+class PinnedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter connecting only to validated public IP addresses"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PinnedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": PinnedHTTPConnectionPool,
+            "https": PinnedHTTPSConnectionPool,
+        }
+
+
+def find_cause(
+    error: BaseException, cls: Union[type, Tuple[type, ...]]
+) -> Optional[BaseException]:
+    """
+    Find an exception of `cls` (or one of them) that caused `error`, through
+    exceptions wrapped by requests and urllib3
+    """
+    seen, pending = set(), [error]
+    while pending:
+        error = pending.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        if isinstance(error, cls):
+            return error
+        pending.extend((error.__cause__, error.__context__))
+        pending.append(getattr(error, "reason", None))
+        pending.extend(a for a in error.args if isinstance(a, BaseException))
+    return None
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get singleton HTTP session shared by every fetch.
+      * Keeps alive up to `HTTP_POOL_CONNECTIONS` connections per host, for
+        `HTTP_POOL_HOSTS` hosts
+      * Negotiates compressed transfer
+      * Does not keep cookies. Every fetch is anonymous
+      * Connects to validated public IP addresses. See `PinnedHTTPConnection`
+    """
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is not None:
+            return _HTTP_SESSION
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = PinnedHTTPAdapter(
+            pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_CONNECTIONS
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+class HTMLResponse:
+    """
+    Opened HTTP response of HTML document. Iterate it to read the document
+    piece by piece.
+    Size limit is enforced on bytes actually read, after decompression
+    """
+
+    def __init__(self, uri: str, rqg: requests.Response):
+        """
+        :param uri: URI to the HTML document
+        :param rqg: Response opened with `stream=True`
+        """
+        self.uri = uri
+        self._rqg = rqg
+        self.not_modified = rqg.status_code == 304
+        self.validators = {
+            key: rqg.headers[header]
+            for key, header, _ in VALIDATORS
+            if header in rqg.headers
+        }
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        :return: Pieces of HTML document response's content
+        :raise: TooBigResource as soon as we read `MAX_CONTENT_SIZE` bytes
+        """
+        with self._rqg:
+            read = 0
+            try:
+                for chunk in self._rqg.iter_content(HTML_CHUNK_SIZE):
+                    read += len(chunk)
+                    if read >= MAX_CONTENT_SIZE:
+                        # Leaving `with` block drops the connection
+                        raise TooBigResource(
+                            "%s is too big file to parse" % self.uri
+                        )
+                    yield chunk
+            finally:
+                metrics.FETCH_BYTES.observe(read)
+
+
+def fetch_html(uri: str, validators: Dict[str, str] = None) -> HTMLResponse:
+    """
+    Open HTML document in given uri over shared HTTP session
+    :param uri: URI to the HTML document
+    :param validators: Validators of the copy we have. Server may answer
+    `HTMLResponse.not_modified` instead of sending the document again
+    :return: Opened response. Iterate it to read the document
+    :raise: TooBigResource when the server tells us it is too big, and
+    NotReacheableLocation when we cannot connect to it
+    """
+
+    # TODO(KMilhan): Implement retry
+    headers = {
+        conditional: validators[key]
+        for key, _, conditional in VALIDATORS
+        if validators and validators.get(key)
+    }
+    try:
+        with metrics.FETCH_SECONDS.time():
+            rqg = get_http_session().get(uri, headers=headers, stream=True)
+    except requests.ConnectionError as e:
+        # Connection refused to connect to non public address, or to resolve
+        # host. Tell why
+        raise find_cause(e, HOST_FAILURES) or NotReacheableLocation(
+            "Could not connect to %s" % urlparse(uri).hostname
+        ) from e
+    metrics.FETCH_RESPONSES.inc(status=rqg.status_code)
+    # Reject early when the server tells us it is too big
+    length = rqg.headers.get("Content-length", "")
+    if length.isdigit() and int(length) >= MAX_CONTENT_SIZE:
+        rqg.close()
+        raise TooBigResource("%s is too big file to parse" % length)
+
+    response = HTMLResponse(uri, rqg)
+    if response.not_modified:
+        rqg.close()
+    return response
+
+
 def retrieve_html(uri: str) -> bytes:
     """
     Retrieve HTML document in given uri
     :param uri: URI to the HTML document
     :return: HTML document response's content
     """
+    return b"".join(fetch_html(uri))
+
+
+def count_html_words(content: Union[str, bytes, Iterable[bytes]]) -> Counter:
+    """
+    Count words of HTML document, as tokenized by `tokenize_html_to_words`
+    :param content: HTML document, or its pieces such as `fetch_html(uri)`
+    :return: Counter{Word:str, Occurrence:int}
+    """
+    if isinstance(content, (str, bytes)):
+        content = (content,)
+    return Counter(tokenize_html_stream(content))
 
-    # TODO(KMilhan): Implement retry
-    rqg = requests.get(uri, stream=True)
-    if int(rqg.headers["Content-length"]) < MAX_CONTENT_SIZE:
-        return rqg.content
 
-    raise TooBigResource(
-        "%s is too big file to parse" % rqg.headers["Content-length"]
+def index_html_words(
+    content: Union[str, bytes, Iterable[bytes]],
+) -> PositionIndex:
+    """
+    Keep words of HTML document in their order, as tokenized by
+    `tokenize_html_to_words`
+    :param content: HTML document, or its pieces such as `fetch_html(uri)`
+    :return: Position index of HTML document
+    """
+    if isinstance(content, (str, bytes)):
+        content = (content,)
+    return PositionIndex.from_tokens(tokenize_html_stream(content))
+
+
+_TOKENIZER_POOL: Optional[ProcessPoolExecutor] = None
+_TOKENIZER_POOL_LOCK = threading.Lock()
+
+
+def get_tokenizer_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Get singleton process pool for tokenizing
+    :return: Process pool, or None if `TOKENIZER_PROCESSES` is not positive
+    """
+    global _TOKENIZER_POOL
+    if TOKENIZER_PROCESSES <= 0:
+        return None
+    with _TOKENIZER_POOL_LOCK:
+        if _TOKENIZER_POOL is None:
+            # Do not fork gRPC server process. Start clean interpreters
+            _TOKENIZER_POOL = ProcessPoolExecutor(
+                TOKENIZER_PROCESSES, multiprocessing.get_context("spawn")
+            )
+        return _TOKENIZER_POOL
+
+
+def count_html_words_in_pool(
+    content: Union[str, bytes, Iterable[bytes]],
+) -> Counter:
+    """
+    Count words of HTML document on tokenizer process pool
+    :param content: HTML document, or its pieces such as `fetch_html(uri)`
+    :return: Counter{Word:str, Occurrence:int}
+    """
+    return tokenize_in_pool(count_html_words, content)
+
+
+def index_html_words_in_pool(
+    content: Union[str, bytes, Iterable[bytes]],
+) -> PositionIndex:
+    """
+    Build position index of HTML document on tokenizer process pool
+    :param content: HTML document, or its pieces such as `fetch_html(uri)`
+    :return: Position index of HTML document
+    """
+    return tokenize_in_pool(index_html_words, content)
+
+
+@metrics.TOKENIZE_SECONDS.timed()
+def tokenize_in_pool(fn: Callable, content: Union[str, bytes, Iterable[bytes]]):
+    """
+    Tokenize HTML document on tokenizer process pool.
+      * Raw document goes to a worker, and the result comes back
+      * Falls back to tokenizing in this thread when the pool is disabled or
+        broken
+    :param fn: Module level function taking HTML document, such as
+    `count_html_words`
+    :param content: HTML document, or its pieces such as `fetch_html(uri)`
+    :return: Result of `fn`
+    """
+    global _TOKENIZER_POOL
+    pool = get_tokenizer_pool()
+    if pool is None:
+        return fn(content)
+
+    if not isinstance(content, (str, bytes)):
+        content = b"".join(content)
+    try:
+        return pool.submit(fn, content).result()
+    except BrokenProcessPool:
+        # A worker died. Release the others, and start over next time
+        with _TOKENIZER_POOL_LOCK:
+            if _TOKENIZER_POOL is pool:
+                _TOKENIZER_POOL = None
+        pool.shutdown(wait=False)
+        return fn(content)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing the same key into a single execution.
+      * The first caller of a key runs the function
+      * Callers arriving while it runs wait and share its result (or exception)
+      * Once finished, the key is forgotten. Next call runs the function again
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = dict()
+
+    def do(self, key: Hashable, fn: Callable):
+        """
+        Run `fn` once for all concurrent callers of `key`
+        :param key: Identity of the work, such as URI
+        :param fn: Function without argument doing the actual work
+        :return: Return value of `fn`, shared among concurrent callers
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            call.set_result(fn())
+        except BaseException as e:
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+        return call.result()
+
+
+# Process-wide coalescing of document loading, keyed by URI
+_DOCUMENT_FLIGHT = SingleFlight()
+
+
+class Refresher:
+    """
+    Refresh documents in background, so callers do not wait on the internet.
+      * A stale document is refreshed once, however many callers served it
+      * A document accessed `min_hits` times or more since it was stored is
+        refreshed ahead of its soft expiry
+    """
+
+    def __init__(
+        self,
+        workers: int = REFRESH_WORKERS,
+        ttl: float = MONGO_TTL,
+        ahead_at: float = REFRESH_AHEAD_AT,
+        min_hits: int = REFRESH_AHEAD_MIN_HITS,
+        interval: float = REFRESH_AHEAD_INTERVAL,
+    ):
+        """
+        :param workers: Threads refreshing documents
+        :param ttl: Seconds documents are fresh after they are stored
+        :param ahead_at: Refresh hot documents at this fraction of `ttl`
+        :param min_hits: Accesses making a document hot. 0 not to refresh
+        ahead
+        :param interval: Seconds between checks of due documents
+        """
+        self.workers = workers
+        self.ttl = ttl
+        self.ahead_at = ahead_at
+        self.min_hits = min_hits
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._scheduler: Optional[threading.Thread] = None
+        self._refreshing = set()
+        # {URI: [Due time, Accesses since stored, (doc_store, query_cache,
+        # get_html)]}
+        self._tracked: Dict[str, list] = dict()
+
+    @staticmethod
+    def _recipe(model: "HTMLDocumentModel") -> tuple:
+        # Not the model itself. It may hold whole counter and indexes
+        return model.doc_store, model.query_cache, model.get_html
+
+    def refresh(self, model: "HTMLDocumentModel", trigger: str = "stale"):
+        """
+        Refresh document of `model` in background, unless it is in progress
+        :param trigger: Why it is refreshed, "stale" or "ahead"
+        :return: True if it is started now
+        """
+        return self._submit(model.uri, self._recipe(model), trigger)
+
+    def stored(self, model: "HTMLDocumentModel"):
+        """Start counting accesses of document of `model`, just stored"""
+        if self.min_hits <= 0:
+            return
+        due = time.monotonic() + self.ttl * self.ahead_at
+        with self._lock:
+            self._tracked[model.uri] = [due, 0, self._recipe(model)]
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(
+                    target=self._schedule, name="refresh-ahead", daemon=True
+                )
+                self._scheduler.start()
+
+    def touch(self, uri: str):
+        """Count an access of document at `uri`"""
+        with self._lock:
+            tracked = self._tracked.get(uri)
+            if tracked is not None:
+                tracked[1] += 1
+
+    def run_due(self, now: float = None) -> int:
+        """
+        Refresh hot documents which are due, and forget the others. They
+        expire as usual
+        :param now: `time.monotonic()` to check against
+        :return: Number of refreshes started
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [
+                (uri, tracked)
+                for uri, tracked in self._tracked.items()
+                if tracked[0] <= now
+            ]
+            for uri, _ in due:
+                del self._tracked[uri]
+        return sum(
+            self._submit(uri, recipe, "ahead")
+            for uri, (_, hits, recipe) in due
+            if hits >= self.min_hits
+        )
+
+    def _schedule(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_due()
+
+    def _submit(self, uri: str, recipe: tuple, trigger: str) -> bool:
+        with self._lock:
+            if uri in self._refreshing:
+                return False
+            self._refreshing.add(uri)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="refresh"
+                )
+            pool = self._pool
+        pool.submit(self._refresh, uri, recipe, trigger)
+        return True
+
+    def _refresh(self, uri: str, recipe: tuple, trigger: str):
+        doc_store, query_cache, get_html = recipe
+        try:
+            # Callers are served what we have. Failed refresh must not fail them
+            # from negative cache
+            model = HTMLDocumentModel(
+                uri, doc_store, query_cache, remember_failures=False
+            )
+            model.get_html = get_html
+            model.fetch_counter()
+        except Exception:
+            # Served as it is. Next caller of stale document tries again
+            metrics.DOCUMENT_REFRESHES.inc(trigger=trigger, result="error")
+        else:
+            metrics.DOCUMENT_REFRESHES.inc(trigger=trigger, result="ok")
+        finally:
+            with self._lock:
+                self._refreshing.discard(uri)
+
+
+# Process-wide background refresh of documents
+_REFRESHER = Refresher()
+
+# Recent accesses of URIs, and URIs prefilled into query cache recently
+_POPULARITY = TinyLFU(PREFILL_SKETCH_WIDTH)
+_PREFILLED = LRUCache(LOCAL_QUERY_CACHE_MAX_ENTRIES, int(CACHE_EXPIRE))
+
+
+def is_popular(uri: str) -> bool:
+    """Whether document at `uri` is worth prefilling into query cache"""
+    return (
+        PREFILL_TOP_K > 0
+        and _POPULARITY.frequency(uri) >= PREFILL_MIN_FREQUENCY
     )
 
 
+def is_prefill_due(uri: str) -> bool:
+    """Whether document at `uri` is popular, and not prefilled recently"""
+    if not is_popular(uri):
+        return False
+    try:
+        _PREFILLED.get(uri)
+    except KeyError:
+        return True
+    return False
+
+
 class HTMLDocumentModel:
     """Represents HTML Document and its behaviors"""
 
     def __init__(
-        self, uri: str, doc_store: DocumentStorage, query_cache: QueryCache
+        self,
+        uri: str,
+        doc_store: DocumentStorage,
+        query_cache: QueryCache,
+        remember_failures: bool = True,
     ):
         """
         Create HTMLDocumentModel
         :param uri: Where the HTML Document is serviced
         :param doc_store: Document Storage for cache service
         :param query_cache: Query result cache
+        :param remember_failures: Remember failures in negative cache. False
+        for background refreshes
         """
-        raise_if_not_safe(uri)
+        if not is_resolved(urlparse(uri).hostname or ""):
+            # Do not resolve dead or local host again. Failures of the URI are
+            # checked when it is fetched, once cache tiers miss
+            raise_failure(query_cache.get_failure([host_failure_key(uri)]))
+        try:
+            raise_if_not_safe(uri)
+        except tuple(NEGATIVE_CACHED.values()) as e:
+            if remember_failures:
+                remember_failure(uri, query_cache, e)
+            raise
         self.uri = uri
         self.doc_store = doc_store
         self.query_cache = query_cache
-        self.get_html = retrieve_html  # Define how we retrieve HTML document
+        self.remember_failures = remember_failures
+        # Define how we retrieve HTML document. Either whole, or piece by piece
+        # `get_html(uri[, validators])`. See `fetch_html`
+        self.get_html = fetch_html
         self._local_counter_cache: Counter = None  # Local HTML document cache
+        self._indexes = dict()  # Loaded indexes by their name
+        _REFRESHER.touch(uri)
+        _POPULARITY.increment(uri)
 
     def count_word(self, word: str) -> int:
         """
@@ -107,16 +828,183 @@ class HTMLDocumentModel:
         :param word: Count the given `word`'s appearance in this HTML document
         :return: An appearance of `word` in this HTML document
         """
-        word = word.lower()
-        try:
-            # Try to use cache first. And do not extend TTL
-            return self.query_cache.get(self.uri, word)
-        except NotInResultCacheQuery:
+        return self.count_words([word])[0]
+
+    def count_words(self, words: Iterable[str]) -> List[int]:
+        """
+        Facade for counting multiple words with batched cache access
+        :param words: Count each of given `words`' appearance in this document
+        :return: Appearances of `words` in this HTML document, in given order
+        """
+        words = [word.lower() for word in words]
+        unique_words = list(dict.fromkeys(words))
+
+        # Try to use cache first. And do not extend TTL
+        counts = self.query_cache.get_many(self.uri, unique_words)
+
+        missing = [w for w in unique_words if w not in counts]
+        if missing:
             # Try to use document storage. Update query cache
-            self.query_cache.store(
-                self.uri, word, self.local_counter_cache[word]
+            found = self._count_in_document(missing)
+            self.query_cache.store_many(self.uri, found)
+            counts.update(found)
+
+        return [counts[word] for word in words]
+
+    def _count_in_document(self, words: List[str]) -> Dict[str, int]:
+        """
+        Count words in HTML document itself.
+          * Without local counter, read counts of `words` only from document
+            storage
+          * Otherwise, or if document storage does not have it, load counter
+          * Popular document is loaded whole, and prefilled into query cache
+        :return: {Word:str, Occurrence:int} of every word in `words`
+        """
+        prefill = is_prefill_due(self.uri)
+        if not self._local_counter_cache and not prefill:
+            try:
+                return self.doc_store.get_counts(self.uri, words)
+            except NotInDocumentStorage:
+                pass
+        counter = self.local_counter_cache
+        if prefill:
+            self.prefill_query_cache(counter)
+        return {word: counter[word] for word in words}
+
+    def prefill_query_cache(self, counter: Counter, force: bool = False):
+        """
+        Store counts of `PREFILL_TOP_K` most frequent words of popular
+        document into query cache at once, so words asked later hit. Whole
+        document if it has no more words
+        :param counter: Counter of HTML document
+        :param force: Store even if stored recently, such as of new content
+        """
+        if not (is_popular(self.uri) if force else is_prefill_due(self.uri)):
+            return
+        _PREFILLED.put(self.uri, True)
+        whole = len(counter) <= PREFILL_TOP_K
+        top = counter if whole else counter.most_common(PREFILL_TOP_K)
+        self.query_cache.prefill(self.uri, dict(top))
+        metrics.QUERY_CACHE_PREFILLS.inc(kind="whole" if whole else "top")
+
+    def count_phrases(self, phrases: Iterable[str]) -> List[int]:
+        """
+        Facade for counting multiple phrases, such as "true to size"
+          * Phrases are split into words by `tokenize_phrase`
+          * Counted on position index, and cached in query cache under
+            `phrase_cache_key`, by the words joined by a space
+        :param phrases: Count each of given `phrases`' appearance
+        :return: Appearances of `phrases` in this HTML document, in given order
+        """
+        tokenized = [tokenize_phrase(phrase) for phrase in phrases]
+        keys = [" ".join(words) for words in tokenized]
+        words_of = dict(zip(keys, tokenized))
+
+        cache_key = phrase_cache_key(self.uri)
+        counts = self.query_cache.get_many(cache_key, list(words_of))
+
+        missing = [key for key in words_of if key not in counts]
+        if missing:
+            positions = self.position_index
+            found = {
+                key: positions.count_phrase(words_of[key]) for key in missing
+            }
+            self.query_cache.store_many(cache_key, found)
+            counts.update(found)
+
+        return [counts[key] for key in keys]
+
+    def top_ngrams(self, n: int, limit: int = 0) -> List[Tuple[str, int]]:
+        """
+        Facade for the most frequent sequences of `n` words
+        :param n: Number of words in each sequence. 2 for bigrams
+        :param limit: Number of sequences to get. 0 for all
+        :return: [(Words joined by a space:str, Occurrence:int)], the most
+        frequent first
+        """
+        return self.position_index.top_ngrams(n, limit)
+
+    def top_words(
+        self, limit: int = 0, offset: int = 0
+    ) -> List[Tuple[str, int]]:
+        """
+        Facade for the most frequent words, or histogram of all words
+        :param limit: Number of words to get. 0 for all
+        :param offset: Number of the most frequent words to skip
+        :return: [(Word:str, Occurrence:int)], the most frequent first
+        """
+        return self.frequency_index.page(offset, limit)
+
+    def match_words(
+        self,
+        pattern: str,
+        mode: str = "prefix",
+        max_distance: int = 0,
+        limit: int = 0,
+    ) -> List[Tuple[str, int]]:
+        """
+        Facade for words matching a pattern
+        :param pattern: Prefix, wildcard pattern or word. Case insensitive
+        :param mode: "prefix", "wildcard" (`*` and `?`) or "fuzzy"
+        :param max_distance: Edit distance allowed in fuzzy mode, up to
+        `FUZZY_MAX_DISTANCE`
+        :param limit: Number of words to get. 0 for all
+        :return: [(Word:str, Occurrence:int)] in alphabetical order
+        """
+        return self.get_index(VocabularyIndex).match(
+            pattern.lower(),
+            mode,
+            min(max_distance, FUZZY_MAX_DISTANCE),
+            limit,
+        )
+
+    @property
+    def frequency_index(self) -> FrequencyIndex:
+        """Returns words sorted by occurrence, a view of vocabulary index"""
+        if FrequencyIndex.NAME not in self._indexes:
+            self._indexes[FrequencyIndex.NAME] = FrequencyIndex.from_vocabulary(
+                self.get_index(VocabularyIndex)
             )
-            return self.local_counter_cache[word]
+        return self._indexes[FrequencyIndex.NAME]
+
+    def get_index(self, index_cls: type):
+        """
+        Returns index of HTML document. See `simplewc.index`
+          * If document storage has the index, load it
+          * else, build it from counter
+        :param index_cls: Class of stored index, such as `VocabularyIndex`
+        """
+        if index_cls.NAME in self._indexes:
+            return self._indexes[index_cls.NAME]
+
+        try:
+            blob = self.doc_store.get_index(self.uri, index_cls.NAME)
+            index = index_cls.from_bytes(blob)
+        except NotInDocumentStorage:
+            index = index_cls.from_counter(self.local_counter_cache)
+        self._indexes[index_cls.NAME] = index
+        return index
+
+    @property
+    def position_index(self) -> PositionIndex:
+        """
+        Returns words of HTML document in their order
+          * If document storage has the index, load it
+          * else, get HTML document over the internet again, and store it
+            along with the index
+        """
+        if PositionIndex.NAME in self._indexes:
+            return self._indexes[PositionIndex.NAME]
+
+        try:
+            blob = self.doc_store.get_index(self.uri, PositionIndex.NAME)
+            index = PositionIndex.from_bytes(blob)
+        except NotInDocumentStorage:
+            index = _DOCUMENT_FLIGHT.do(
+                (self.uri, PositionIndex.NAME), self._load_positions
+            )
+        self._indexes[PositionIndex.NAME] = index
+        return index
 
     @property
     def local_counter_cache(self) -> Counter:
@@ -129,17 +1017,99 @@ class HTMLDocumentModel:
         if self._local_counter_cache:
             #  If we already cached it, early return
             return self._local_counter_cache
+
+        # Concurrent requests on the same URI share a single load
+        self._local_counter_cache = _DOCUMENT_FLIGHT.do(
+            self.uri, self._load_counter
+        )
+        return self._local_counter_cache
+
+    def _load_counter(self) -> Counter:
+        """
+        Load counter from document storage, or over the internet.
+        Stale one in document storage is served as it is, and refreshed in
+        background
+        :return: Counter of HTML document
+        """
         try:
             # Try to use document storage
-            self._local_counter_cache = self.doc_store.get(self.uri)
+            counter, fresh = self.doc_store.get_servable(self.uri)
         except NotInDocumentStorage:
             # We failed to query document storage.
+            return self.fetch_counter()
 
-            # Then, actually access web
-            self._local_counter_cache = Counter(
-                tokenize_html_to_words(self.get_html(self.uri))
-            )
-            # Store the result
-            self.doc_store.store(self.uri, self._local_counter_cache)
+        if not fresh:
+            _REFRESHER.refresh(self)
+        return counter
 
-        return self._local_counter_cache
+    @negative_cached
+    def fetch_counter(self) -> Counter:
+        """
+        Get HTML document over the internet and store its counter. Expired
+        copy in document storage is revalidated, and reused if not modified
+        :return: Counter of HTML document
+        """
+        try:
+            # We may have an expired copy. Ask if it has changed since then
+            stale, validators, indexes = self.doc_store.get_stale(self.uri)
+        except NotInDocumentStorage:
+            stale, validators, indexes = None, None, None
+
+        # Then, actually access web
+        if validators:
+            content = self.get_html(self.uri, validators)
+        else:
+            content = self.get_html(self.uri)
+
+        fresh = getattr(content, "validators", None)
+        if stale is not None and getattr(content, "not_modified", False):
+            # 304 may carry only some of validators. Keep the ones it omits
+            fresh = {**(validators or dict()), **(fresh or dict())}
+            # Copy is unchanged, and so are its indexes, positions included
+            self._store(stale, fresh, None, indexes)
+            return stale
+        if POSITION_INDEX:
+            # Tokenize as pieces arrive, or on tokenizer process pool
+            positions = index_html_words_in_pool(content)
+            counter = positions.counter()
+            metrics.DOCUMENT_TOKENS.observe(len(positions))
+        else:
+            counter, positions = count_html_words_in_pool(content), None
+            metrics.DOCUMENT_TOKENS.observe(sum(counter.values()))
+        self._store(counter, fresh, positions)
+        return counter
+
+    @negative_cached
+    def _load_positions(self) -> PositionIndex:
+        """
+        Get HTML document over the internet, and build its position index
+        :return: Position index of HTML document
+        """
+        content = self.get_html(self.uri)
+        positions = index_html_words_in_pool(content)
+        metrics.DOCUMENT_TOKENS.observe(len(positions))
+        self._store(
+            positions.counter(), getattr(content, "validators", None), positions
+        )
+        return positions
+
+    def _store(
+        self,
+        counter: Counter,
+        validators: Optional[Dict[str, str]],
+        positions: Optional[PositionIndex],
+        indexes: Optional[Dict[str, bytes]] = None,
+    ):
+        """
+        Store counter in document storage, with indexes built once for all
+        :param indexes: Serialized indexes of revalidated copy, reused as
+        they are. Built from `counter` and `positions` when there are none
+        """
+        if positions is not None and len(positions) > POSITION_INDEX_MAX_TOKENS:
+            # Too long to keep. Phrases of it are counted over the internet
+            positions = None
+        if not indexes:
+            indexes = build_indexes(counter, positions)
+        self.doc_store.store(self.uri, counter, validators, indexes)
+        self.prefill_query_cache(counter, force=True)
+        _REFRESHER.stored(self)
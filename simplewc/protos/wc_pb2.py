@@ -3,6 +3,7 @@
 
 import sys
 
+from google.protobuf.internal import enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
 from google.protobuf import reflection as _reflection
@@ -20,10 +21,51 @@ DESCRIPTOR = _descriptor.FileDescriptor(
     syntax="proto3",
     serialized_options=None,
     serialized_pb=_b(
-        '\n\x08wc.proto".\n\x10WordCountRequest\x12\x0b\n\x03uri\x18\x01 \x01(\t\x12\r\n\x05words\x18\x02 \x03(\t"5\n\tWordCount\x12\x0c\n\x04word\x18\x01 \x01(\t\x12\x0b\n\x03uri\x18\x02 \x01(\t\x12\r\n\x05\x63ount\x18\x03 \x01(\r2m\n\x10WordCountService\x12-\n\nCountWords\x12\x11.WordCountRequest\x1a\n.WordCount0\x01\x12*\n\tCountWord\x12\x11.WordCountRequest\x1a\n.WordCountb\x06proto3'
+        '\n\x08wc.proto".\n\x10WordCountRequest\x12\x0b\n\x03uri\x18\x01 \x01(\t\x12\r\n\x05words\x18\x02 \x03(\t"V\n\tWordCount\x12\x0c\n\x04word\x18\x01 \x01(\t\x12\x0b\n\x03uri\x18\x02 \x01(\t\x12\r\n\x05\x63ount\x18\x03 \x01(\r\x12\x0e\n\x06status\x18\x04 \x01(\r\x12\x0f\n\x07\x64\x65tails\x18\x05 \x01(\t">\n\x10PackedWordCounts\x12\x0b\n\x03uri\x18\x01 \x01(\t\x12\r\n\x05words\x18\x02 \x03(\t\x12\x0e\n\x06\x63ounts\x18\x03 \x03(\r"=\n\x0fTopWordsRequest\x12\x0b\n\x03uri\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\r\x12\x0e\n\x06offset\x18\x03 \x01(\r"p\n\x11MatchWordsRequest\x12\x0b\n\x03uri\x18\x01 \x01(\t\x12\x0f\n\x07pattern\x18\x02 \x01(\t\x12\x18\n\x04mode\x18\x03 \x01(\x0e\x32\n.MatchMode\x12\x14\n\x0cmax_distance\x18\x04 \x01(\r\x12\r\n\x05limit\x18\x05 \x01(\r"<\n\x15\x42\x61tchWordCountRequest\x12#\n\x08requests\x18\x01 \x03(\x0b\x32\x11.WordCountRequest*0\n\tMatchMode\x12\n\n\x06PREFIX\x10\x00\x12\x0c\n\x08WILDCARD\x10\x01\x12\t\n\x05\x46UZZY\x10\x02\x32\xd1\x02\n\x10WordCountService\x12-\n\nCountWords\x12\x11.WordCountRequest\x1a\n.WordCount0\x01\x12/\n\x0c\x43ountPhrases\x12\x11.WordCountRequest\x1a\n.WordCount0\x01\x12\x37\n\x0f\x43ountWordsBatch\x12\x16.BatchWordCountRequest\x1a\n.WordCount0\x01\x12:\n\x10\x43ountWordsPacked\x12\x11.WordCountRequest\x1a\x11.PackedWordCounts0\x01\x12\x31\n\x08TopWords\x12\x10.TopWordsRequest\x1a\x11.PackedWordCounts0\x01\x12\x35\n\nMatchWords\x12\x12.MatchWordsRequest\x1a\x11.PackedWordCounts0\x01\x62\x06proto3'
     ),
 )
 
+_MATCHMODE = _descriptor.EnumDescriptor(
+    name="MatchMode",
+    full_name="MatchMode",
+    filename=None,
+    file=DESCRIPTOR,
+    values=[
+        _descriptor.EnumValueDescriptor(
+            name="PREFIX",
+            index=0,
+            number=0,
+            serialized_options=None,
+            type=None,
+        ),
+        _descriptor.EnumValueDescriptor(
+            name="WILDCARD",
+            index=1,
+            number=1,
+            serialized_options=None,
+            type=None,
+        ),
+        _descriptor.EnumValueDescriptor(
+            name="FUZZY",
+            index=2,
+            number=2,
+            serialized_options=None,
+            type=None,
+        ),
+    ],
+    containing_type=None,
+    serialized_options=None,
+    serialized_start=451,
+    serialized_end=499,
+)
+_sym_db.RegisterEnumDescriptor(_MATCHMODE)
+
+MatchMode = enum_type_wrapper.EnumTypeWrapper(_MATCHMODE)
+PREFIX = 0
+WILDCARD = 1
+FUZZY = 2
+
+
 _WORDCOUNTREQUEST = _descriptor.Descriptor(
     name="WordCountRequest",
     full_name="WordCountRequest",
@@ -141,6 +183,42 @@ _WORDCOUNT = _descriptor.Descriptor(
             serialized_options=None,
             file=DESCRIPTOR,
         ),
+        _descriptor.FieldDescriptor(
+            name="status",
+            full_name="WordCount.status",
+            index=3,
+            number=4,
+            type=13,
+            cpp_type=3,
+            label=1,
+            has_default_value=False,
+            default_value=0,
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="details",
+            full_name="WordCount.details",
+            index=4,
+            number=5,
+            type=9,
+            cpp_type=9,
+            label=1,
+            has_default_value=False,
+            default_value=_b("").decode("utf-8"),
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
     ],
     extensions=[],
     nested_types=[],
@@ -151,11 +229,318 @@ _WORDCOUNT = _descriptor.Descriptor(
     extension_ranges=[],
     oneofs=[],
     serialized_start=60,
-    serialized_end=113,
+    serialized_end=146,
 )
 
+_PACKEDWORDCOUNTS = _descriptor.Descriptor(
+    name="PackedWordCounts",
+    full_name="PackedWordCounts",
+    filename=None,
+    file=DESCRIPTOR,
+    containing_type=None,
+    fields=[
+        _descriptor.FieldDescriptor(
+            name="uri",
+            full_name="PackedWordCounts.uri",
+            index=0,
+            number=1,
+            type=9,
+            cpp_type=9,
+            label=1,
+            has_default_value=False,
+            default_value=_b("").decode("utf-8"),
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="words",
+            full_name="PackedWordCounts.words",
+            index=1,
+            number=2,
+            type=9,
+            cpp_type=9,
+            label=3,
+            has_default_value=False,
+            default_value=[],
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="counts",
+            full_name="PackedWordCounts.counts",
+            index=2,
+            number=3,
+            type=13,
+            cpp_type=3,
+            label=3,
+            has_default_value=False,
+            default_value=[],
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+    ],
+    extensions=[],
+    nested_types=[],
+    enum_types=[],
+    serialized_options=None,
+    is_extendable=False,
+    syntax="proto3",
+    extension_ranges=[],
+    oneofs=[],
+    serialized_start=148,
+    serialized_end=210,
+)
+
+_TOPWORDSREQUEST = _descriptor.Descriptor(
+    name="TopWordsRequest",
+    full_name="TopWordsRequest",
+    filename=None,
+    file=DESCRIPTOR,
+    containing_type=None,
+    fields=[
+        _descriptor.FieldDescriptor(
+            name="uri",
+            full_name="TopWordsRequest.uri",
+            index=0,
+            number=1,
+            type=9,
+            cpp_type=9,
+            label=1,
+            has_default_value=False,
+            default_value=_b("").decode("utf-8"),
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="limit",
+            full_name="TopWordsRequest.limit",
+            index=1,
+            number=2,
+            type=13,
+            cpp_type=3,
+            label=1,
+            has_default_value=False,
+            default_value=0,
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="offset",
+            full_name="TopWordsRequest.offset",
+            index=2,
+            number=3,
+            type=13,
+            cpp_type=3,
+            label=1,
+            has_default_value=False,
+            default_value=0,
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+    ],
+    extensions=[],
+    nested_types=[],
+    enum_types=[],
+    serialized_options=None,
+    is_extendable=False,
+    syntax="proto3",
+    extension_ranges=[],
+    oneofs=[],
+    serialized_start=212,
+    serialized_end=273,
+)
+
+_MATCHWORDSREQUEST = _descriptor.Descriptor(
+    name="MatchWordsRequest",
+    full_name="MatchWordsRequest",
+    filename=None,
+    file=DESCRIPTOR,
+    containing_type=None,
+    fields=[
+        _descriptor.FieldDescriptor(
+            name="uri",
+            full_name="MatchWordsRequest.uri",
+            index=0,
+            number=1,
+            type=9,
+            cpp_type=9,
+            label=1,
+            has_default_value=False,
+            default_value=_b("").decode("utf-8"),
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="pattern",
+            full_name="MatchWordsRequest.pattern",
+            index=1,
+            number=2,
+            type=9,
+            cpp_type=9,
+            label=1,
+            has_default_value=False,
+            default_value=_b("").decode("utf-8"),
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="mode",
+            full_name="MatchWordsRequest.mode",
+            index=2,
+            number=3,
+            type=14,
+            cpp_type=8,
+            label=1,
+            has_default_value=False,
+            default_value=0,
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="max_distance",
+            full_name="MatchWordsRequest.max_distance",
+            index=3,
+            number=4,
+            type=13,
+            cpp_type=3,
+            label=1,
+            has_default_value=False,
+            default_value=0,
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+        _descriptor.FieldDescriptor(
+            name="limit",
+            full_name="MatchWordsRequest.limit",
+            index=4,
+            number=5,
+            type=13,
+            cpp_type=3,
+            label=1,
+            has_default_value=False,
+            default_value=0,
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+    ],
+    extensions=[],
+    nested_types=[],
+    enum_types=[],
+    serialized_options=None,
+    is_extendable=False,
+    syntax="proto3",
+    extension_ranges=[],
+    oneofs=[],
+    serialized_start=275,
+    serialized_end=387,
+)
+
+_BATCHWORDCOUNTREQUEST = _descriptor.Descriptor(
+    name="BatchWordCountRequest",
+    full_name="BatchWordCountRequest",
+    filename=None,
+    file=DESCRIPTOR,
+    containing_type=None,
+    fields=[
+        _descriptor.FieldDescriptor(
+            name="requests",
+            full_name="BatchWordCountRequest.requests",
+            index=0,
+            number=1,
+            type=11,
+            cpp_type=10,
+            label=3,
+            has_default_value=False,
+            default_value=[],
+            message_type=None,
+            enum_type=None,
+            containing_type=None,
+            is_extension=False,
+            extension_scope=None,
+            serialized_options=None,
+            file=DESCRIPTOR,
+        ),
+    ],
+    extensions=[],
+    nested_types=[],
+    enum_types=[],
+    serialized_options=None,
+    is_extendable=False,
+    syntax="proto3",
+    extension_ranges=[],
+    oneofs=[],
+    serialized_start=389,
+    serialized_end=449,
+)
+
+_MATCHWORDSREQUEST.fields_by_name["mode"].enum_type = _MATCHMODE
+_BATCHWORDCOUNTREQUEST.fields_by_name["requests"].message_type = (
+    _WORDCOUNTREQUEST
+)
 DESCRIPTOR.message_types_by_name["WordCountRequest"] = _WORDCOUNTREQUEST
 DESCRIPTOR.message_types_by_name["WordCount"] = _WORDCOUNT
+DESCRIPTOR.message_types_by_name["PackedWordCounts"] = _PACKEDWORDCOUNTS
+DESCRIPTOR.message_types_by_name["TopWordsRequest"] = _TOPWORDSREQUEST
+DESCRIPTOR.message_types_by_name["MatchWordsRequest"] = _MATCHWORDSREQUEST
+DESCRIPTOR.message_types_by_name["BatchWordCountRequest"] = (
+    _BATCHWORDCOUNTREQUEST
+)
+DESCRIPTOR.enum_types_by_name["MatchMode"] = _MATCHMODE
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
 WordCountRequest = _reflection.GeneratedProtocolMessageType(
@@ -180,14 +565,58 @@ WordCount = _reflection.GeneratedProtocolMessageType(
 )
 _sym_db.RegisterMessage(WordCount)
 
+PackedWordCounts = _reflection.GeneratedProtocolMessageType(
+    "PackedWordCounts",
+    (_message.Message,),
+    dict(
+        DESCRIPTOR=_PACKEDWORDCOUNTS,
+        __module__="wc_pb2"
+        # @@protoc_insertion_point(class_scope:PackedWordCounts)
+    ),
+)
+_sym_db.RegisterMessage(PackedWordCounts)
+
+TopWordsRequest = _reflection.GeneratedProtocolMessageType(
+    "TopWordsRequest",
+    (_message.Message,),
+    dict(
+        DESCRIPTOR=_TOPWORDSREQUEST,
+        __module__="wc_pb2"
+        # @@protoc_insertion_point(class_scope:TopWordsRequest)
+    ),
+)
+_sym_db.RegisterMessage(TopWordsRequest)
+
+MatchWordsRequest = _reflection.GeneratedProtocolMessageType(
+    "MatchWordsRequest",
+    (_message.Message,),
+    dict(
+        DESCRIPTOR=_MATCHWORDSREQUEST,
+        __module__="wc_pb2"
+        # @@protoc_insertion_point(class_scope:MatchWordsRequest)
+    ),
+)
+_sym_db.RegisterMessage(MatchWordsRequest)
+
+BatchWordCountRequest = _reflection.GeneratedProtocolMessageType(
+    "BatchWordCountRequest",
+    (_message.Message,),
+    dict(
+        DESCRIPTOR=_BATCHWORDCOUNTREQUEST,
+        __module__="wc_pb2"
+        # @@protoc_insertion_point(class_scope:BatchWordCountRequest)
+    ),
+)
+_sym_db.RegisterMessage(BatchWordCountRequest)
+
 _WORDCOUNTSERVICE = _descriptor.ServiceDescriptor(
     name="WordCountService",
     full_name="WordCountService",
     file=DESCRIPTOR,
     index=0,
     serialized_options=None,
-    serialized_start=115,
-    serialized_end=224,
+    serialized_start=502,
+    serialized_end=839,
     methods=[
         _descriptor.MethodDescriptor(
             name="CountWords",
@@ -199,14 +628,50 @@ _WORDCOUNTSERVICE = _descriptor.ServiceDescriptor(
             serialized_options=None,
         ),
         _descriptor.MethodDescriptor(
-            name="CountWord",
-            full_name="WordCountService.CountWord",
+            name="CountPhrases",
+            full_name="WordCountService.CountPhrases",
             index=1,
             containing_service=None,
             input_type=_WORDCOUNTREQUEST,
             output_type=_WORDCOUNT,
             serialized_options=None,
         ),
+        _descriptor.MethodDescriptor(
+            name="CountWordsBatch",
+            full_name="WordCountService.CountWordsBatch",
+            index=2,
+            containing_service=None,
+            input_type=_BATCHWORDCOUNTREQUEST,
+            output_type=_WORDCOUNT,
+            serialized_options=None,
+        ),
+        _descriptor.MethodDescriptor(
+            name="CountWordsPacked",
+            full_name="WordCountService.CountWordsPacked",
+            index=3,
+            containing_service=None,
+            input_type=_WORDCOUNTREQUEST,
+            output_type=_PACKEDWORDCOUNTS,
+            serialized_options=None,
+        ),
+        _descriptor.MethodDescriptor(
+            name="TopWords",
+            full_name="WordCountService.TopWords",
+            index=4,
+            containing_service=None,
+            input_type=_TOPWORDSREQUEST,
+            output_type=_PACKEDWORDCOUNTS,
+            serialized_options=None,
+        ),
+        _descriptor.MethodDescriptor(
+            name="MatchWords",
+            full_name="WordCountService.MatchWords",
+            index=5,
+            containing_service=None,
+            input_type=_MATCHWORDSREQUEST,
+            output_type=_PACKEDWORDCOUNTS,
+            serialized_options=None,
+        ),
     ],
 )
 _sym_db.RegisterServiceDescriptor(_WORDCOUNTSERVICE)
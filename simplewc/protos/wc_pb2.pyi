@@ -1,10 +1,14 @@
 # @generated by generate_proto_mypy_stubs.py.  Do not edit!
 import sys
 from typing import Iterable as typing___Iterable
+from typing import List as typing___List
 from typing import Optional as typing___Optional
 from typing import Text as typing___Text
+from typing import Tuple as typing___Tuple
+from typing import cast as typing___cast
 
 from google.protobuf.internal.containers import (
+    RepeatedCompositeFieldContainer as google___protobuf___internal___containers___RepeatedCompositeFieldContainer,
     RepeatedScalarFieldContainer as google___protobuf___internal___containers___RepeatedScalarFieldContainer,
 )
 from google.protobuf.message import (
@@ -13,6 +17,24 @@ from google.protobuf.message import (
 
 from typing_extensions import Literal as typing_extensions___Literal
 
+class MatchMode(int):
+    @classmethod
+    def Name(cls, number: int) -> str: ...
+    @classmethod
+    def Value(cls, name: str) -> MatchMode: ...
+    @classmethod
+    def keys(cls) -> typing___List[str]: ...
+    @classmethod
+    def values(cls) -> typing___List[MatchMode]: ...
+    @classmethod
+    def items(cls) -> typing___List[typing___Tuple[str, MatchMode]]: ...
+    PREFIX = typing___cast(MatchMode, 0)
+    WILDCARD = typing___cast(MatchMode, 1)
+    FUZZY = typing___cast(MatchMode, 2)
+PREFIX = typing___cast(MatchMode, 0)
+WILDCARD = typing___cast(MatchMode, 1)
+FUZZY = typing___cast(MatchMode, 2)
+
 class WordCountRequest(google___protobuf___message___Message):
     uri = ...  # type: typing___Text
     words = ...  # type: google___protobuf___internal___containers___RepeatedScalarFieldContainer[typing___Text]
@@ -50,11 +72,15 @@ class WordCount(google___protobuf___message___Message):
     word = ...  # type: typing___Text
     uri = ...  # type: typing___Text
     count = ...  # type: int
+    status = ...  # type: int
+    details = ...  # type: typing___Text
 
     def __init__(self,
                  word: typing___Optional[typing___Text] = None,
                  uri: typing___Optional[typing___Text] = None,
                  count: typing___Optional[int] = None,
+                 status: typing___Optional[int] = None,
+                 details: typing___Optional[typing___Text] = None,
                  ) -> None:
         ...
 
@@ -72,9 +98,150 @@ class WordCount(google___protobuf___message___Message):
 
     if sys.version_info >= (3,):
         def ClearField(self, field_name: typing_extensions___Literal[
-            u"count", u"uri", u"word"]) -> None:
+            u"count", u"details", u"status", u"uri", u"word"]) -> None:
+            ...
+    else:
+        def ClearField(self, field_name: typing_extensions___Literal[
+            b"count", b"details", b"status", b"uri", b"word"]) -> None:
+            ...
+
+
+class PackedWordCounts(google___protobuf___message___Message):
+    uri = ...  # type: typing___Text
+    words = ...  # type: google___protobuf___internal___containers___RepeatedScalarFieldContainer[typing___Text]
+    counts = ...  # type: google___protobuf___internal___containers___RepeatedScalarFieldContainer[int]
+
+    def __init__(self,
+                 uri: typing___Optional[typing___Text] = None,
+                 words: typing___Optional[
+                     typing___Iterable[typing___Text]] = None,
+                 counts: typing___Optional[typing___Iterable[int]] = None,
+                 ) -> None:
+        ...
+
+    @classmethod
+    def FromString(cls, s: bytes) -> PackedWordCounts:
+        ...
+
+    def MergeFrom(self,
+                  other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    def CopyFrom(self,
+                 other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    if sys.version_info >= (3,):
+        def ClearField(self, field_name: typing_extensions___Literal[
+            u"counts", u"uri", u"words"]) -> None:
+            ...
+    else:
+        def ClearField(self, field_name: typing_extensions___Literal[
+            b"counts", b"uri", b"words"]) -> None:
+            ...
+
+
+class TopWordsRequest(google___protobuf___message___Message):
+    uri = ...  # type: typing___Text
+    limit = ...  # type: int
+    offset = ...  # type: int
+
+    def __init__(self,
+                 uri: typing___Optional[typing___Text] = None,
+                 limit: typing___Optional[int] = None,
+                 offset: typing___Optional[int] = None,
+                 ) -> None:
+        ...
+
+    @classmethod
+    def FromString(cls, s: bytes) -> TopWordsRequest:
+        ...
+
+    def MergeFrom(self,
+                  other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    def CopyFrom(self,
+                 other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    if sys.version_info >= (3,):
+        def ClearField(self, field_name: typing_extensions___Literal[
+            u"limit", u"offset", u"uri"]) -> None:
+            ...
+    else:
+        def ClearField(self, field_name: typing_extensions___Literal[
+            b"limit", b"offset", b"uri"]) -> None:
+            ...
+
+
+class MatchWordsRequest(google___protobuf___message___Message):
+    uri = ...  # type: typing___Text
+    pattern = ...  # type: typing___Text
+    mode = ...  # type: MatchMode
+    max_distance = ...  # type: int
+    limit = ...  # type: int
+
+    def __init__(self,
+                 uri: typing___Optional[typing___Text] = None,
+                 pattern: typing___Optional[typing___Text] = None,
+                 mode: typing___Optional[MatchMode] = None,
+                 max_distance: typing___Optional[int] = None,
+                 limit: typing___Optional[int] = None,
+                 ) -> None:
+        ...
+
+    @classmethod
+    def FromString(cls, s: bytes) -> MatchWordsRequest:
+        ...
+
+    def MergeFrom(self,
+                  other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    def CopyFrom(self,
+                 other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    if sys.version_info >= (3,):
+        def ClearField(self, field_name: typing_extensions___Literal[
+            u"limit", u"max_distance", u"mode", u"pattern", u"uri"]) -> None:
+            ...
+    else:
+        def ClearField(self, field_name: typing_extensions___Literal[
+            b"limit", b"max_distance", b"mode", b"pattern", b"uri"]) -> None:
+            ...
+
+
+class BatchWordCountRequest(google___protobuf___message___Message):
+
+    @property
+    def requests(self) -> google___protobuf___internal___containers___RepeatedCompositeFieldContainer[WordCountRequest]:
+        ...
+
+    def __init__(self,
+                 requests: typing___Optional[
+                     typing___Iterable[WordCountRequest]] = None,
+                 ) -> None:
+        ...
+
+    @classmethod
+    def FromString(cls, s: bytes) -> BatchWordCountRequest:
+        ...
+
+    def MergeFrom(self,
+                  other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    def CopyFrom(self,
+                 other_msg: google___protobuf___message___Message) -> None:
+        ...
+
+    if sys.version_info >= (3,):
+        def ClearField(self, field_name: typing_extensions___Literal[
+            u"requests"]) -> None:
             ...
     else:
         def ClearField(self, field_name: typing_extensions___Literal[
-            b"count", b"uri", b"word"]) -> None:
+            b"requests"]) -> None:
             ...
@@ -24,6 +24,31 @@ class WordCountServiceStub(object):
             request_serializer=wc__pb2.WordCountRequest.SerializeToString,
             response_deserializer=wc__pb2.WordCount.FromString,
         )
+        self.CountPhrases = channel.unary_stream(
+            "/WordCountService/CountPhrases",
+            request_serializer=wc__pb2.WordCountRequest.SerializeToString,
+            response_deserializer=wc__pb2.WordCount.FromString,
+        )
+        self.CountWordsBatch = channel.unary_stream(
+            "/WordCountService/CountWordsBatch",
+            request_serializer=wc__pb2.BatchWordCountRequest.SerializeToString,
+            response_deserializer=wc__pb2.WordCount.FromString,
+        )
+        self.CountWordsPacked = channel.unary_stream(
+            "/WordCountService/CountWordsPacked",
+            request_serializer=wc__pb2.WordCountRequest.SerializeToString,
+            response_deserializer=wc__pb2.PackedWordCounts.FromString,
+        )
+        self.TopWords = channel.unary_stream(
+            "/WordCountService/TopWords",
+            request_serializer=wc__pb2.TopWordsRequest.SerializeToString,
+            response_deserializer=wc__pb2.PackedWordCounts.FromString,
+        )
+        self.MatchWords = channel.unary_stream(
+            "/WordCountService/MatchWords",
+            request_serializer=wc__pb2.MatchWordsRequest.SerializeToString,
+            response_deserializer=wc__pb2.PackedWordCounts.FromString,
+        )
 
 
 class WordCountServiceServicer(object):
@@ -44,6 +69,48 @@ class WordCountServiceServicer(object):
         context.set_details("Method not implemented!")
         raise NotImplementedError("Method not implemented!")
 
+    def CountPhrases(self, request, context):
+        """Service each phrase's occurrence in a certain uri. Phrases are given
+        as words of WordCountRequest, and sent back as word of WordCount.
+        Errors are handled as CountWords
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def CountWordsBatch(self, request, context):
+        """Service each word's occurrence in many uris, in parallel.
+        WordCounts are streamed as each uri is done. Failure of an uri does not
+        cut a stream. See WordCount
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def CountWordsPacked(self, request, context):
+        """Same as CountWords, but streams many words in each PackedWordCounts.
+        Use this for large number of words
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def TopWords(self, request, context):
+        """Service the most frequent words in a certain uri, the most frequent
+        first. Errors are handled as CountWords
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def MatchWords(self, request, context):
+        """Service words matching a pattern and their occurrences in a certain
+        uri, in alphabetical order. Errors are handled as CountWords
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
 
 def add_WordCountServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -51,7 +118,32 @@ def add_WordCountServiceServicer_to_server(servicer, server):
             servicer.CountWords,
             request_deserializer=wc__pb2.WordCountRequest.FromString,
             response_serializer=wc__pb2.WordCount.SerializeToString,
-        )
+        ),
+        "CountPhrases": grpc.unary_stream_rpc_method_handler(
+            servicer.CountPhrases,
+            request_deserializer=wc__pb2.WordCountRequest.FromString,
+            response_serializer=wc__pb2.WordCount.SerializeToString,
+        ),
+        "CountWordsBatch": grpc.unary_stream_rpc_method_handler(
+            servicer.CountWordsBatch,
+            request_deserializer=wc__pb2.BatchWordCountRequest.FromString,
+            response_serializer=wc__pb2.WordCount.SerializeToString,
+        ),
+        "CountWordsPacked": grpc.unary_stream_rpc_method_handler(
+            servicer.CountWordsPacked,
+            request_deserializer=wc__pb2.WordCountRequest.FromString,
+            response_serializer=wc__pb2.PackedWordCounts.SerializeToString,
+        ),
+        "TopWords": grpc.unary_stream_rpc_method_handler(
+            servicer.TopWords,
+            request_deserializer=wc__pb2.TopWordsRequest.FromString,
+            response_serializer=wc__pb2.PackedWordCounts.SerializeToString,
+        ),
+        "MatchWords": grpc.unary_stream_rpc_method_handler(
+            servicer.MatchWords,
+            request_deserializer=wc__pb2.MatchWordsRequest.FromString,
+            response_serializer=wc__pb2.PackedWordCounts.SerializeToString,
+        ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
         "WordCountService", rpc_method_handlers
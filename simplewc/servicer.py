@@ -1,14 +1,26 @@
+import signal
+import sys
+import threading
 import time
 from concurrent import futures
+from typing import Iterator, List, Optional, Sequence, Tuple
 
 import grpc
 
-from simplewc import config, exceptions
+from simplewc import config, exceptions, metrics
 from simplewc.model import HTMLDocumentModel
 from simplewc.protos import wc_pb2_grpc
-from simplewc.protos.wc_pb2 import WordCount, WordCountRequest
+from simplewc.protos.wc_pb2 import (
+    BatchWordCountRequest,
+    MatchMode,
+    MatchWordsRequest,
+    PackedWordCounts,
+    TopWordsRequest,
+    WordCount,
+    WordCountRequest,
+)
 from simplewc.protos.wc_pb2_grpc import WordCountServiceServicer
-from simplewc.storage import get_mongo_db, get_redis_cache
+from simplewc.storage import close_writes, get_document_storage, get_query_cache
 
 _ONE_DAY_IN_SECONDS = 60 * 60 * 24
 
@@ -27,60 +39,312 @@ class WordCountServicer(WordCountServiceServicer):
         """
         try:
             uri, words = request.uri, request.words
-            model = HTMLDocumentModel(uri, get_mongo_db(), get_redis_cache())
+            model = HTMLDocumentModel(
+                uri, get_document_storage(), get_query_cache()
+            )
 
-            for word in words:
-                yield WordCount(
-                    uri=uri, word=word, count=model.count_word(word)
-                )
+            for word, count in zip(words, model.count_words(words)):
+                yield WordCount(uri=uri, word=word, count=count)
             return
 
-        except exceptions.NotAllowedScheme:
-            msg = f"You can only access {config.ALLOWED_PROTOCOLS} protocol"
+        except Exception as e:
+            code, msg = error_status(e)
             context.set_details(msg)
-            context.set_code(grpc.StatusCode.PERMISSION_DENIED)
+            context.set_code(code)
+            return
+
+    def CountPhrases(self, request: WordCountRequest, context):
+        """
+        API for Phrase Count, such as "true to size"
+        :param request: gRPC request of `WordCountRequest`, of phrases in
+        `words`
+        :param context: gRPC context
+        :return:
+          * stream of `WordCount`, with each phrase as `word`
+        :exception: cut stream, then `return` grpc error code and grpc error msg
+        """
+        try:
+            uri, phrases = request.uri, request.words
+            model = HTMLDocumentModel(
+                uri, get_document_storage(), get_query_cache()
+            )
+
+            for phrase, count in zip(phrases, model.count_phrases(phrases)):
+                yield WordCount(uri=uri, word=phrase, count=count)
             return
 
-        except exceptions.AccessLocalURI:
-            msg = "You cannot access Local URI"
+        except Exception as e:
+            code, msg = error_status(e)
             context.set_details(msg)
-            context.set_code(grpc.StatusCode.PERMISSION_DENIED)
+            context.set_code(code)
             return
 
-        except exceptions.TooBigResource:
-            msg = (
-                f"You can only access less than"
-                f"{config.MAX_CONTENT_SIZE} bytes document"
+    def CountWordsPacked(self, request: WordCountRequest, context):
+        """
+        API for Word Count of many words. Same as `CountWords`, but many words
+        are packed into each message
+        :param request: gRPC request of `WordCountRequest`
+        :param context: gRPC context
+        :return:
+          * stream of `PackedWordCounts`. in a form of Generator
+        :exception: cut stream, then `return` grpc error code and grpc error msg
+        """
+        try:
+            uri, words = request.uri, request.words
+            model = HTMLDocumentModel(
+                uri, get_document_storage(), get_query_cache()
             )
+
+            yield from pack_word_counts(uri, words, model.count_words(words))
+            return
+
+        except Exception as e:
+            code, msg = error_status(e)
             context.set_details(msg)
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_code(code)
+            return
+
+    def TopWords(self, request: TopWordsRequest, context):
+        """
+        API for the most frequent words, or histogram of all words
+        :param request: gRPC request of `TopWordsRequest`
+        :param context: gRPC context
+        :return:
+          * stream of `PackedWordCounts`, the most frequent first
+        :exception: cut stream, then `return` grpc error code and grpc error msg
+        """
+        try:
+            uri = request.uri
+            model = HTMLDocumentModel(
+                uri, get_document_storage(), get_query_cache()
+            )
+
+            top = model.top_words(request.limit, request.offset)
+            yield from pack_word_counts(
+                uri, [w for w, _ in top], [c for _, c in top]
+            )
             return
 
-        except exceptions.NotReacheableLocation:
-            msg = "We could not reach a server of requested URI"
+        except Exception as e:
+            code, msg = error_status(e)
             context.set_details(msg)
-            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_code(code)
+            return
+
+    def MatchWords(self, request: MatchWordsRequest, context):
+        """
+        API for words matching a pattern by prefix, wildcard or edit distance
+        :param request: gRPC request of `MatchWordsRequest`
+        :param context: gRPC context
+        :return:
+          * stream of `PackedWordCounts`, in alphabetical order
+        :exception: cut stream, then `return` grpc error code and grpc error msg
+        """
+        try:
+            uri = request.uri
+            model = HTMLDocumentModel(
+                uri, get_document_storage(), get_query_cache()
+            )
+
+            found = model.match_words(
+                request.pattern,
+                MatchMode.Name(request.mode).lower(),
+                request.max_distance,
+                request.limit,
+            )
+            yield from pack_word_counts(
+                uri, [w for w, _ in found], [c for _, c in found]
+            )
+            return
 
         except Exception as e:
-            msg = "Internal error occurred"
-            print(e)
+            code, msg = error_status(e)
             context.set_details(msg)
-            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_code(code)
             return
 
+    def CountWordsBatch(self, request: BatchWordCountRequest, context):
+        """
+        API for Word Count on many URIs. URIs are counted in parallel, up to
+        `BATCH_MAX_CONCURRENCY` at a time
+        :param request: gRPC request of `BatchWordCountRequest`
+        :param context: gRPC context
+        :return:
+          * stream of `WordCount`, of each URI as soon as it is done
+          * failed URI is streamed as `WordCount` with status and details
+        """
+        requests = list(request.requests)
+        if not requests:
+            return
+        workers = min(config.BATCH_MAX_CONCURRENCY, len(requests))
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(count_request, r) for r in requests]
+            try:
+                for job in futures.as_completed(jobs):
+                    yield from job.result()
+            finally:
+                # Client went away. Do not start the rest
+                for job in jobs:
+                    job.cancel()
+
+
+def pack_word_counts(
+    uri: str, words: Sequence[str], counts: Sequence[int]
+) -> Iterator[PackedWordCounts]:
+    """
+    Pack words and their counts into chunks of `PACKED_CHUNK_SIZE` words
+    :param uri: Where words are counted
+    :param words: Counted words
+    :param counts: Count of each word, in the same order
+    :return: `PackedWordCounts` of each chunk
+    """
+    size = config.PACKED_CHUNK_SIZE
+    for i in range(0, len(words), size):
+        yield PackedWordCounts(
+            uri=uri, words=words[i : i + size], counts=counts[i : i + size]
+        )
+
+
+def count_request(request: WordCountRequest) -> List[WordCount]:
+    """
+    Count words of a `WordCountRequest` in a batch
+    :param request: One of `BatchWordCountRequest.requests`
+    :return: `WordCount` of each word, or a `WordCount` with error status
+    """
+    uri, words = request.uri, request.words
+    try:
+        model = HTMLDocumentModel(
+            uri, get_document_storage(), get_query_cache()
+        )
+        counts = model.count_words(words)
+    except Exception as e:
+        return [error_word_count(uri, e)]
+    return [
+        WordCount(uri=uri, word=word, count=count)
+        for word, count in zip(words, counts)
+    ]
+
+
+def error_word_count(uri: str, e: Exception) -> WordCount:
+    """Report failure of `uri` in a batch as `WordCount`"""
+    code, msg = error_status(e)
+    return WordCount(uri=uri, status=code.value[0], details=msg)
+
+
+def error_status(e: Exception) -> Tuple[grpc.StatusCode, str]:
+    """
+    Translate exception into gRPC error code and error message, and count it
+    :param e: Exception raised while servicing a request
+    :return: (gRPC status code, detailed message)
+    """
+    code, msg = _error_status(e)
+    metrics.RPC_ERRORS.inc(code=code.name)
+    return code, msg
+
+
+def _error_status(e: Exception) -> Tuple[grpc.StatusCode, str]:
+    if isinstance(e, exceptions.NotAllowedScheme):
+        msg = f"You can only access {config.ALLOWED_PROTOCOLS} protocol"
+        return grpc.StatusCode.PERMISSION_DENIED, msg
+
+    if isinstance(e, exceptions.AccessLocalURI):
+        msg = "You cannot access Local URI"
+        return grpc.StatusCode.PERMISSION_DENIED, msg
+
+    if isinstance(e, exceptions.TooBigResource):
+        msg = (
+            f"You can only access less than"
+            f"{config.MAX_CONTENT_SIZE} bytes document"
+        )
+        return grpc.StatusCode.INVALID_ARGUMENT, msg
+
+    if isinstance(e, exceptions.NotReacheableLocation):
+        msg = "We could not reach a server of requested URI"
+        return grpc.StatusCode.INTERNAL, msg
+
+    msg = "Internal error occurred"
+    # Unexpected. Client gets no detail, so leave it in server log
+    print("Error: %r" % e, file=sys.stderr)
+    return grpc.StatusCode.INTERNAL, msg
+
+
+def grpc_compression(name: Optional[str]) -> grpc.Compression:
+    """
+    Get gRPC compression algorithm by its name
+    :param name: None, "gzip" or "deflate"
+    :return: gRPC compression algorithm
+    """
+    if not name:
+        return grpc.Compression.NoCompression
+    return {"gzip": grpc.Compression.Gzip, "deflate": grpc.Compression.Deflate}[
+        name.lower()
+    ]
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def interrupt_on_sigterm():
+    """
+    Stop on SIGTERM, sent by process managers such as Docker and systemd, as
+    on Ctrl-C. Only the main thread can handle signals
+    """
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _interrupt)
+
+
+def start_metrics(metrics_host_port: Optional[str] = None):
+    """
+    Serve metrics on background. A port taken, such as by another server on
+    the host, only warns. Serving word counts matters more
+    :param metrics_host_port: Where we serve metrics. Defaults to
+    `METRICS_HOST_PORT`. Not served if both are None
+    """
+    metrics_host_port = metrics_host_port or config.METRICS_HOST_PORT
+    if not metrics_host_port:
+        return
+    try:
+        metrics.serve_metrics(metrics_host_port)
+    except OSError as e:
+        print(
+            "Warning: Could not serve metrics at %s: %s"
+            % (metrics_host_port, e),
+            file=sys.stderr,
+        )
+
 
-def serve_insecure(host_port: str):
-    """Open Insecure service of `WordCountServicer`"""
+def serve_insecure(
+    host_port: str,
+    compression: Optional[str] = None,
+    metrics_host_port: Optional[str] = None,
+):
+    """
+    Open Insecure service of `WordCountServicer`. Writes pending to Redis
+    and MongoDB are flushed on shutdown, by Ctrl-C or SIGTERM
+    :param host_port: Where we listen to
+    :param compression: Compression of responses. None, "gzip" or "deflate".
+    Defaults to `GRPC_COMPRESSION`
+    :param metrics_host_port: Where we serve metrics. Defaults to
+    `METRICS_HOST_PORT`
+    """
+    start_metrics(metrics_host_port)
     server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=config.MAX_GRPC_SERVER_THREADS)
+        futures.ThreadPoolExecutor(max_workers=config.MAX_GRPC_SERVER_THREADS),
+        interceptors=(metrics.MetricsInterceptor(),),
+        compression=grpc_compression(compression or config.GRPC_COMPRESSION),
     )
     wc_pb2_grpc.add_WordCountServiceServicer_to_server(
         WordCountServicer(), server
     )
     server.add_insecure_port(host_port)
+    interrupt_on_sigterm()
     server.start()
     try:
         while True:
             time.sleep(_ONE_DAY_IN_SECONDS)
     except KeyboardInterrupt:
+        pass
+    finally:
         server.stop(0)
+        close_writes()
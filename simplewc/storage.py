@@ -1,23 +1,49 @@
 """Data storage layer"""
+
+import bisect
+import hashlib
 import sys
+import threading
+import time
 from abc import ABC
-from collections import Counter, defaultdict
-from datetime import datetime
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 
 import redis
-from pymongo import MongoClient
-from pymongo.errors import OperationFailure
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 
+from simplewc import metrics
+from simplewc.codec import (
+    COMPACT_FORMAT,
+    bucket_of,
+    decode_counter,
+    encode_counter,
+)
 from simplewc.config import (
     CACHE_EXPIRE,
+    HASH_RING_REPLICAS,
+    LOCAL_DOC_CACHE_MAX_ENTRIES,
+    LOCAL_DOC_CACHE_TTL,
+    LOCAL_NEGATIVE_CACHE_TTL,
+    LOCAL_QUERY_CACHE_MAX_ENTRIES,
+    LOCAL_QUERY_CACHE_TTL,
     MONGO_COLLECTION,
+    MONGO_COMPACT_BUCKETS,
     MONGO_DB,
     MONGO_HOST,
+    MONGO_NODES,
     MONGO_PORT,
+    MONGO_REVALIDATE_WINDOW,
+    MONGO_STALE_TTL,
     MONGO_TTL,
     REDIS_DB,
     REDIS_HOST,
+    REDIS_NODES,
     REDIS_PORT,
+    WRITE_BEHIND_BATCH,
+    WRITE_BEHIND_MAX_PENDING,
 )
 from simplewc.exceptions import (
     CannotAccessToMongo,
@@ -38,14 +64,77 @@ class DocumentStorage(ABC):
         self.host = host
         self.auth = auth
 
-    def store(self, uri: str, counter: Counter):
-        """Store html document"""
+    def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        """
+        Store html document
+        :param uri: Where HTML document originates
+        :param counter: HTML document in a form of Counter
+        :param validators: HTTP cache validators of HTML document, such as
+        {"etag": ..., "last_modified": ...}
+        :param indexes: Serialized indexes of HTML document by their name.
+        See `simplewc.index`
+        """
         raise NotImplementedError
 
+    def store_batch(self, documents: Dict[str, tuple]):
+        """
+        Store many html documents. Override to store them in a round trip
+        :param documents: {URI: (counter, validators, indexes)}. See `store`
+        """
+        for uri, (counter, validators, indexes) in documents.items():
+            self.store(uri, counter, validators, indexes)
+
     def get(self, uri: str):
-        """Get stored html document"""
+        """Get stored html document, only when it is fresh"""
+        raise NotImplementedError
+
+    def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        """
+        Get stored html document if it is fresh, or if it is past soft expiry
+        but not past hard expiry. Stale one can be served while it is
+        refreshed. Override to serve stale documents
+        :return: (Counter, Is fresh)
+        :raise: NotInDocumentStorage when we don't have one before hard expiry
+        """
+        return self.get(uri), True
+
+    def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        """
+        Get stored html document, its validators and indexes, even if it is
+        not fresh. Indexes can be reused when it is revalidated
+        :return: (Counter, validators, {Index name:str, Serialized index:bytes})
+        :raise: NotInDocumentStorage when we don't have it at all
+        """
         raise NotImplementedError
 
+    def get_index(self, uri: str, name: str) -> bytes:
+        """
+        Get serialized index of fresh stored html document
+        :param uri: Where HTML document originates
+        :param name: Name of index
+        :raise: NotInDocumentStorage when we don't have fresh one, or it has
+        no such index
+        """
+        raise NotImplementedError
+
+    def get_counts(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        """
+        Get counts of given words only, from fresh stored html document.
+        Override to avoid loading whole document
+        :return: {Word:str, Occurrence:int} of every word in `words`
+        :raise: NotInDocumentStorage when we don't have fresh one
+        """
+        counter = self.get(uri)
+        return {word: counter[word] for word in words}
+
 
 class QueryCache(ABC):
     """Where we store recent result"""
@@ -66,23 +155,135 @@ class QueryCache(ABC):
         """Get stored recent result"""
         raise NotImplementedError
 
+    def store_many(self, uri: str, counts: Dict[str, int]):
+        """Store recent results of multiple words in a document"""
+        for word, count in counts.items():
+            self.store(uri, word, count)
+
+    def store_batch(self, counts: Dict[str, Dict[str, int]]):
+        """
+        Store recent results of many documents. Override to store them in a
+        round trip
+        :param counts: {URI: {word: count}}
+        """
+        for uri, counts_of_uri in counts.items():
+            self.store_many(uri, counts_of_uri)
+
+    def prefill(self, uri: str, counts: Dict[str, int]):
+        """
+        Store results of many words of a popular document ahead of queries.
+        Override not to keep them where memory is scarce
+        :param counts: {word: count}
+        """
+        self.store_many(uri, counts)
+
+    def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        """
+        Get stored recent results of multiple words in a document
+        :return: {word: count} of words we have. Missing words are left out
+        """
+        result = dict()
+        for word in words:
+            try:
+                result[word] = self.get(uri, word)
+            except NotInResultCacheQuery:
+                pass
+        return result
+
+    def store_failure(self, key: str, failure: str, ttl: float):
+        """
+        Remember a failure, such as unreachable host, for `ttl` seconds.
+        Override to share failures. See `simplewc.model.remember_failure`
+        :param key: What failed, such as "host:example.com"
+        :param failure: Encoded failure
+        """
+
+    def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        """
+        Get a failure remembered under any of `keys`
+        :param remote: Ask shared backend too. False to look at what we have
+        in process only, which costs no round trip
+        :return: Encoded failure, or None
+        """
+        return None
+
 
 class MockDocumentStorage(DocumentStorage):
     """Pure in-memory mocking document storage for testing purpose"""
 
-    def __init__(self, host: str):
+    def __init__(
+        self, host: str, ttl: Optional[float] = None, stale_ttl: float = 0
+    ):
+        """
+        :param host: Not used
+        :param ttl: Documents older than this are not fresh. None for forever
+        :param stale_ttl: Seconds documents are served after `ttl` while they
+        are refreshed
+        """
         super(MockDocumentStorage, self).__init__(host)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
         self.mock_db = dict()
+        self.mock_validators = dict()
+        self.mock_indexes = dict()
+        self.mock_added = dict()
 
-    def store(self, uri: str, counter: Counter):
+    def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
         self.mock_db[uri] = counter
+        self.mock_validators[uri] = validators or dict()
+        self.mock_indexes[uri] = indexes or dict()
+        self.mock_added[uri] = time.monotonic()
+
+    def _is_fresh(self, uri: str) -> bool:
+        return uri in self.mock_db and (
+            self.ttl is None
+            or time.monotonic() - self.mock_added[uri] < self.ttl
+        )
 
     def get(self, uri: str):
-        if uri in self.mock_db:
+        if self._is_fresh(uri):
             return self.mock_db[uri]
 
         raise NotInDocumentStorage
 
+    def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        if self._is_fresh(uri):
+            return self.mock_db[uri], True
+        if (
+            uri in self.mock_db
+            and time.monotonic() - self.mock_added[uri]
+            < self.ttl + self.stale_ttl
+        ):
+            return self.mock_db[uri], False
+
+        raise NotInDocumentStorage
+
+    def get_index(self, uri: str, name: str) -> bytes:
+        if self._is_fresh(uri) and name in self.mock_indexes[uri]:
+            return self.mock_indexes[uri][name]
+
+        raise NotInDocumentStorage
+
+    def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        if uri in self.mock_db:
+            return (
+                self.mock_db[uri],
+                self.mock_validators.get(uri, dict()),
+                self.mock_indexes.get(uri, dict()),
+            )
+
+        raise NotInDocumentStorage
+
 
 class MockQueryCache(QueryCache):
     """Pure in-memory mocking query storage for testing purpose"""
@@ -90,6 +291,7 @@ class MockQueryCache(QueryCache):
     def __init__(self, host: str):
         super(MockQueryCache, self).__init__(host)
         self.mock_cache = defaultdict(int)
+        self.mock_failures = dict()
 
     def get(self, uri: str, word: str) -> int:
         if (uri, word) in self.mock_cache:
@@ -100,10 +302,518 @@ class MockQueryCache(QueryCache):
     def store(self, uri: str, word: str, count: int):
         self.mock_cache[(uri, word)] = count
 
+    def store_failure(self, key: str, failure: str, ttl: float):
+        self.mock_failures[key] = (time.monotonic() + ttl, failure)
+
+    def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        for key in keys:
+            expire_at, failure = self.mock_failures.get(key, (0, None))
+            if expire_at > time.monotonic():
+                return failure
+        return None
+
+
+class LRUCache:
+    """Thread-safe in-memory mapping bounded by entries and by lifespan"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        """
+        :param max_entries: Least recently used entries are evicted beyond this
+        :param ttl: Lifespan of each entry in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable):
+        """
+        Get cached value and mark it as recently used
+        :raise: KeyError when we don't have it or it is expired
+        """
+        with self._lock:
+            expire_at, value = self._entries[key]
+            if expire_at < time.monotonic():
+                del self._entries[key]
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value, ttl: float = None):
+        """
+        Cache value, evicting least recently used entries if we are full
+        :param ttl: Lifespan of this entry, if shorter than the others'
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Halves each byte of a `bytearray` with `bytearray.translate`
+_HALVE = bytes(i >> 1 for i in range(256))
+
+
+class TinyLFU:
+    """
+    Approximate access frequency of keys in bounded memory, the admission
+    filter of TinyLFU.
+      * Count-min sketch of `depth` rows of `width` counters, up to
+        `MAX_COUNT` each
+      * A doorkeeper takes the first access of each key, so keys accessed
+        once do not fill the sketch
+      * Every `sample_size` accesses, counters are halved and doorkeeper is
+        cleared. Frequency decays, and reflects recent accesses
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width: int, depth: int = 4, sample_size: int = 0):
+        """
+        :param width: Counters in each row. Around the number of keys to tell
+        apart
+        :param depth: Rows, each with its own hash of key
+        :param sample_size: Accesses between halving. Defaults to 10 times
+        `width`
+        """
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or 10 * width
+        self._lock = threading.Lock()
+        self._rows = [bytearray(width) for _ in range(depth)]
+        self._doorkeeper = bytearray(width)
+        self._accesses = 0
+
+    def _slots(self, key: Hashable) -> list:
+        return [hash((row, key)) % self.width for row in range(self.depth)]
+
+    def increment(self, key: Hashable):
+        """Count an access of `key`"""
+        slots = self._slots(key)
+        with self._lock:
+            if not all(self._doorkeeper[slot] for slot in slots):
+                for slot in slots:
+                    self._doorkeeper[slot] = 1
+            else:
+                counts = [row[slot] for row, slot in zip(self._rows, slots)]
+                low = min(counts)
+                if low < self.MAX_COUNT:
+                    # Conservative update. Only the smallest ones are raised
+                    for row, slot, count in zip(self._rows, slots, counts):
+                        if count == low:
+                            row[slot] += 1
+            self._accesses += 1
+            if self._accesses >= self.sample_size:
+                self._reset()
+
+    def frequency(self, key: Hashable) -> int:
+        """Estimated accesses of `key` recently. Never underestimated"""
+        slots = self._slots(key)
+        with self._lock:
+            seen = all(self._doorkeeper[slot] for slot in slots)
+            return seen + min(row[slot] for row, slot in zip(self._rows, slots))
+
+    def _reset(self):
+        for row in self._rows:
+            row[:] = row.translate(_HALVE)
+        self._doorkeeper = bytearray(self.width)
+        self._accesses = 0
+
+
+class WriteBehind:
+    """
+    Write to a backend in a background thread, off the request path.
+      * Pending writes of the same key are coalesced by `merge`. By default,
+        the latest one replaces the others
+      * Up to `batch_size` keys are written at a time by `write_batch`
+      * Writers wait while `max_pending` keys are pending (back-pressure)
+      * Once closed, writes are done on writer's thread
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[dict], None],
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        batch_size: int = WRITE_BEHIND_BATCH,
+        merge: Callable = None,
+    ):
+        """
+        :param name: Name of backend in metrics, such as "query_cache"
+        :param write_batch: Write {key: value} to backend
+        :param max_pending: Keys pending before writers wait
+        :param batch_size: Keys written at a time
+        :param merge: Coalesce (pending value, new value) into one value
+        """
+        self.name = name
+        self.write_batch = write_batch
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.merge = merge
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._writing = dict()  # Batch being written now
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, key: Hashable, value):
+        """Write `value` of `key` in background. Wait if queue is full"""
+        with self._cond:
+            if key not in self._pending and self._is_full():
+                metrics.WRITE_BEHIND_WAITS.inc(store=self.name)
+                self._cond.wait_for(
+                    lambda: self._closed
+                    or key in self._pending
+                    or not self._is_full()
+                )
+            if not self._closed:
+                if key in self._pending and self.merge is not None:
+                    value = self.merge(self._pending[key], value)
+                self._pending[key] = value
+                metrics.WRITE_BEHIND_PENDING.set(
+                    len(self._pending), store=self.name
+                )
+                self._start()
+                self._cond.notify_all()
+                return
+
+        self._write({key: value})
+
+    def pending(self, key: Hashable):
+        """
+        Get value of `key` not written yet, so it can be read meanwhile
+        :raise: KeyError when nothing of `key` is pending
+        """
+        with self._cond:
+            values = [
+                batch[key]
+                for batch in (self._writing, self._pending)
+                if key in batch
+            ]
+        if not values:
+            raise KeyError(key)
+        if len(values) > 1 and self.merge is not None:
+            return self.merge(*values)
+        return values[-1]
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until everything pending is written
+        :param timeout: Seconds to wait. None for as long as it takes
+        :return: False if writes are still pending
+        """
+        with self._cond:
+            return self._cond.wait_for(self._is_idle, timeout)
+
+    def close(self, timeout: float = None) -> bool:
+        """
+        Flush, then write on writer's thread from now on
+        :param timeout: Seconds to wait. None for as long as it takes
+        :return: False if writes are still pending. They are written anyway
+        """
+        with self._cond:
+            flushed = self._cond.wait_for(self._is_idle, timeout)
+            self._closed = True
+            self._cond.notify_all()
+        return flushed
+
+    def _is_full(self) -> bool:
+        return len(self._pending) >= self.max_pending
+
+    def _is_idle(self) -> bool:
+        return not self._pending and not self._writing
+
+    def _start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(
+                target=self._run,
+                name="write-behind-%s" % self.name,
+                daemon=True,
+            )
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                batch = dict(
+                    self._pending.popitem(last=False)
+                    for _ in range(min(self.batch_size, len(self._pending)))
+                )
+                self._writing = batch
+                metrics.WRITE_BEHIND_PENDING.set(
+                    len(self._pending), store=self.name
+                )
+                self._cond.notify_all()
+            self._write(batch)
+            with self._cond:
+                self._writing = dict()
+                self._cond.notify_all()
+
+    def _write(self, batch: dict):
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            # Caches only. Missing ones are built again on demand
+            metrics.WRITE_BEHIND_WRITES.inc(
+                len(batch), store=self.name, result="error"
+            )
+            print(
+                "Warning: %s write-behind failed: %r" % (self.name, e),
+                file=sys.stderr,
+            )
+        else:
+            metrics.WRITE_BEHIND_WRITES.inc(
+                len(batch), store=self.name, result="ok"
+            )
+
+
+def merge_counts(pending: Dict[str, int], new: Dict[str, int]):
+    """Coalesce pending query results of a document with new ones"""
+    return {**pending, **new}
+
+
+class LocalQueryCache(QueryCache):
+    """In-process L1 tier in front of another query cache"""
+
+    def __init__(
+        self,
+        backend: QueryCache,
+        max_entries: int = LOCAL_QUERY_CACHE_MAX_ENTRIES,
+        ttl: float = LOCAL_QUERY_CACHE_TTL,
+        failure_ttl: float = LOCAL_NEGATIVE_CACHE_TTL,
+        max_pending: int = 0,
+    ):
+        """
+        :param backend: Query cache to fall back to, such as `RedisQueryCache`
+        :param max_entries: Maximum number of (uri, word) results kept locally
+        :param ttl: Lifespan of locally kept results in seconds
+        :param failure_ttl: Lifespan of locally kept failures in seconds
+        :param max_pending: Write results to `backend` in background, with
+        this many documents pending at most. 0 writes on caller's thread
+        """
+        super(LocalQueryCache, self).__init__(backend.host)
+        self.backend = backend
+        self.local = LRUCache(max_entries, ttl)
+        self.failures = LRUCache(max_entries, failure_ttl)
+        self.writes = None
+        if max_pending > 0:
+            self.writes = WriteBehind(
+                "query_cache",
+                backend.store_batch,
+                max_pending,
+                merge=merge_counts,
+            )
+
+    def get(self, uri: str, word: str) -> int:
+        try:
+            count = self.local.get((uri, word))
+        except KeyError:
+            metrics.QUERY_CACHE_REQUESTS.inc(layer="l1", result="miss")
+            count = self.backend.get(uri, word)
+            self.local.put((uri, word), count)
+            return count
+        metrics.QUERY_CACHE_REQUESTS.inc(layer="l1", result="hit")
+        return count
+
+    def store(self, uri: str, word: str, count: int):
+        self.store_many(uri, {word: count})
+
+    def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        result, missing = dict(), []
+        for word in words:
+            try:
+                result[word] = self.local.get((uri, word))
+            except KeyError:
+                missing.append(word)
+        metrics.count_lookups(
+            metrics.QUERY_CACHE_REQUESTS,
+            len(result),
+            len(missing),
+            layer="l1",
+        )
+        if missing:
+            fetched = self.backend.get_many(uri, missing)
+            for word, count in fetched.items():
+                self.local.put((uri, word), count)
+            result.update(fetched)
+        return result
+
+    def store_many(self, uri: str, counts: Dict[str, int]):
+        for word, count in counts.items():
+            self.local.put((uri, word), count)
+        if self.writes is None:
+            self.backend.store_many(uri, counts)
+        else:
+            self.writes.submit(uri, dict(counts))
+
+    def prefill(self, uri: str, counts: Dict[str, int]):
+        # Not into L1. Words come into L1 as they are asked
+        if self.writes is None:
+            self.backend.prefill(uri, counts)
+        else:
+            self.writes.submit(uri, dict(counts))
+
+    def store_failure(self, key: str, failure: str, ttl: float):
+        self.failures.put(key, failure, ttl)
+        self.backend.store_failure(key, failure, ttl)
+
+    def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        keys = list(keys)
+        for key in keys:
+            try:
+                failure = self.failures.get(key)
+            except KeyError:
+                continue
+            metrics.NEGATIVE_CACHE_REQUESTS.inc(layer="l1", result="hit")
+            return failure
+
+        metrics.NEGATIVE_CACHE_REQUESTS.inc(layer="l1", result="miss")
+        if not remote:
+            return None
+        failure = self.backend.get_failure(keys)
+        if failure is not None:
+            # Remaining lifespan is unknown. Keep it for local lifespan
+            self.failures.put(keys[0], failure)
+        return failure
+
+
+class LocalDocumentStorage(DocumentStorage):
+    """In-process L1 tier in front of another document storage"""
+
+    def __init__(
+        self,
+        backend: DocumentStorage,
+        max_entries: int = LOCAL_DOC_CACHE_MAX_ENTRIES,
+        ttl: float = LOCAL_DOC_CACHE_TTL,
+        max_pending: int = 0,
+    ):
+        """
+        :param backend: Document storage to fall back to, such as MongoDB
+        :param max_entries: Maximum number of documents kept locally
+        :param ttl: Lifespan of locally kept documents in seconds
+        :param max_pending: Write documents to `backend` in background, with
+        this many pending at most. 0 writes on caller's thread
+        """
+        super(LocalDocumentStorage, self).__init__(backend.host)
+        self.backend = backend
+        self.local = LRUCache(max_entries, ttl)
+        self.writes = None
+        if max_pending > 0:
+            self.writes = WriteBehind(
+                "document_storage", backend.store_batch, max_pending
+            )
+
+    def _pending(self, uri: str) -> Optional[tuple]:
+        """(counter, validators, indexes) of `uri` not written to backend yet"""
+        if self.writes is None:
+            return None
+        try:
+            return self.writes.pending(uri)
+        except KeyError:
+            return None
+
+    def get(self, uri: str) -> Counter:
+        try:
+            counter = self.local.get(uri)
+        except KeyError:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="l1", result="miss")
+            pending = self._pending(uri)
+            counter = pending[0] if pending else self.backend.get(uri)
+            self.local.put(uri, counter)
+            return counter
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="l1", result="hit")
+        return counter
+
+    def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        try:
+            counter = self.local.get(uri)
+        except KeyError:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="l1", result="miss")
+            pending = self._pending(uri)
+            if pending:
+                counter, fresh = pending[0], True
+            else:
+                counter, fresh = self.backend.get_servable(uri)
+            if fresh:
+                # Stale one is replaced soon. Do not keep it
+                self.local.put(uri, counter)
+            return counter, fresh
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="l1", result="hit")
+        return counter, True
+
+    def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        self.local.put(uri, counter)
+        if self.writes is None:
+            self.backend.store(uri, counter, validators, indexes)
+        else:
+            self.writes.submit(uri, (counter, validators, indexes))
+
+    def get_index(self, uri: str, name: str) -> bytes:
+        pending = self._pending(uri)
+        if pending is None:
+            return self.backend.get_index(uri, name)
+        if pending[2] and name in pending[2]:
+            return pending[2][name]
+
+        raise NotInDocumentStorage
+
+    def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        pending = self._pending(uri)
+        if pending is None:
+            return self.backend.get_stale(uri)
+        return pending[0], pending[1] or dict(), pending[2] or dict()
+
+    def get_counts(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        try:
+            counter = self.local.get(uri)
+        except KeyError:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="l1", result="miss")
+            pending = self._pending(uri)
+            if pending is None:
+                # Do not load whole document into L1 for a few words
+                return self.backend.get_counts(uri, words)
+            return {word: pending[0][word] for word in words}
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="l1", result="hit")
+        return {word: counter[word] for word in words}
+
 
 class RedisQueryCache(QueryCache):
     """Redis as a LRU query cache"""
 
+    # Set hash fields, and lifespan only if the hash did not exist before
+    _STORE_SCRIPT = """
+    local fresh = redis.call("EXISTS", KEYS[1]) == 0
+    redis.call("HSET", KEYS[1], unpack(ARGV, 2))
+    if fresh then
+        redis.call("EXPIRE", KEYS[1], ARGV[1])
+    end
+    """
+    # Lua `unpack` has limited stack. Split large writes into chunks
+    _STORE_CHUNK = 1000
+    # Failures are kept as strings under this prefix. URIs start with scheme,
+    # so they never collide with hashes of query results
+    FAILURE_PREFIX = "failure:"
+
     def __init__(self, host: str, port: int, db: int, **redis_opt):
         """
         Instantiate RedisQueryCache
@@ -116,12 +826,14 @@ class RedisQueryCache(QueryCache):
         self._pool = redis.ConnectionPool(host=host, port=port, db=db)
         self.redis = redis.Redis(connection_pool=self._pool, **redis_opt)
         self.expire = CACHE_EXPIRE
+        self._store_script = self.redis.register_script(self._STORE_SCRIPT)
 
         try:
             self.redis.exists("wc_test_val")
         except ConnectionError:
             raise CannotAccessToRedis
 
+    @metrics.REDIS_SECONDS.timed(op="get")
     def get(self, uri: str, word: str) -> int:
         """
         Get ResultCache from Redis Server
@@ -132,8 +844,10 @@ class RedisQueryCache(QueryCache):
         """
         cache = self.redis.hget(uri, word)
         if cache is not None:
+            metrics.QUERY_CACHE_REQUESTS.inc(layer="redis", result="hit")
             return int(cache)
 
+        metrics.QUERY_CACHE_REQUESTS.inc(layer="redis", result="miss")
         raise NotInResultCacheQuery
 
     def store(self, uri: str, word: str, count: int):
@@ -145,12 +859,95 @@ class RedisQueryCache(QueryCache):
         :param count: Occurrence of `word` in HTML doc at `uri` to save
         :return:
         """
-        if self.redis.exists(uri):
-            self.redis.hset(uri, word, str(count))
+        self.store_many(uri, {word: count})
+
+    @metrics.REDIS_SECONDS.timed(op="get_many")
+    def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        """
+        Get ResultCache of multiple words in a single `HMGET` round trip
+        :param uri: Where HTML document originates
+        :param words: Words to count
+        :return: {word: count} of cached words. Missing words are left out
+        """
+        words = list(words)
+        if not words:
+            return dict()
+        caches = self.redis.hmget(uri, words)
+        found = {
+            word: int(cache)
+            for word, cache in zip(words, caches)
+            if cache is not None
+        }
+        metrics.count_lookups(
+            metrics.QUERY_CACHE_REQUESTS,
+            len(found),
+            len(words) - len(found),
+            layer="redis",
+        )
+        return found
+
+    @metrics.REDIS_SECONDS.timed(op="store_many")
+    def store_many(self, uri: str, counts: Dict[str, int]):
+        """
+        Store ResultCache of multiple words in a single pipelined round trip.
+        Lifespan is set the same way as `store`
+        :param uri: Where HTML document originates
+        :param counts: {word: count} to save
+        :return:
+        """
+        if not counts:
             return
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_store(pipe, uri, counts)
+        pipe.execute()
 
-        self.redis.hset(uri, word, str(count))
-        self.redis.expire(uri, self.expire)
+    @metrics.REDIS_SECONDS.timed(op="store_batch")
+    def store_batch(self, counts: Dict[str, Dict[str, int]]):
+        """
+        Store ResultCache of many documents in a single pipelined round trip
+        :param counts: {URI: {word: count}}
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for uri, counts_of_uri in counts.items():
+            self._queue_store(pipe, uri, counts_of_uri)
+        pipe.execute()
+
+    def _queue_store(self, pipe, uri: str, counts: Dict[str, int]):
+        """Queue `_STORE_SCRIPT` calls storing `counts` into `pipe`"""
+        items = list(counts.items())
+        for i in range(0, len(items), self._STORE_CHUNK):
+            args = [self.expire]
+            for word, count in items[i : i + self._STORE_CHUNK]:
+                args.extend((word, str(count)))
+            self._store_script(keys=[uri], args=args, client=pipe)
+
+    @metrics.REDIS_SECONDS.timed(op="store_failure")
+    def store_failure(self, key: str, failure: str, ttl: float):
+        """Remember a failure with `SET`, expiring in `ttl` seconds"""
+        self.redis.set(
+            self.FAILURE_PREFIX + key, failure, px=max(1, int(ttl * 1000))
+        )
+
+    @metrics.REDIS_SECONDS.timed(op="get_failure")
+    def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        """Get a failure remembered under any of `keys` with `MGET`"""
+        keys = list(keys)
+        if not remote or not keys:
+            return None
+        failures = self.redis.mget([self.FAILURE_PREFIX + k for k in keys])
+        found = next((f for f in failures if f is not None), None)
+        metrics.NEGATIVE_CACHE_REQUESTS.inc(
+            layer="redis", result="miss" if found is None else "hit"
+        )
+        return None if found is None else found.decode("utf-8")
+
+
+# MongoDB projection of document without its indexes
+NO_INDEXES = {"indexes": False}
+# MongoDB error code of an index existing with other options
+INDEX_OPTIONS_CONFLICT = 85
 
 
 class MongoDocumentStorage(DocumentStorage):
@@ -163,6 +960,8 @@ class MongoDocumentStorage(DocumentStorage):
         mongo_db_name: str,
         mongo_collection: str,
         mongo_ttl: int,
+        revalidate_window: int = MONGO_REVALIDATE_WINDOW,
+        stale_ttl: int = MONGO_STALE_TTL,
         **mongo_opt,
     ):
         """
@@ -170,10 +969,16 @@ class MongoDocumentStorage(DocumentStorage):
         :param port: MongoDB port
         :param mongo_db_name: MongoDB database name
         :param mongo_collection: MongoDB collection name for HTML documents
-        :param mongo_ttl: MongoDB document's life span
+        :param mongo_ttl: MongoDB document's life span as a fresh document
+        :param revalidate_window: How long we keep documents after `mongo_ttl`
+        to revalidate them with origin server
+        :param stale_ttl: How long we serve documents after `mongo_ttl` while
+        they are refreshed. Within `revalidate_window`
         :param mongo_opt: Additional option (auth for example) for MongoDB connection
         """
         super(MongoDocumentStorage, self).__init__(host)
+        self.mongo_ttl = mongo_ttl
+        self.stale_ttl = stale_ttl
         self._mongo = MongoClient(host, port, **mongo_opt)
         try:
             self._mongo.server_info()
@@ -182,13 +987,68 @@ class MongoDocumentStorage(DocumentStorage):
         except ConnectionError:
             raise CannotAccessToMongo
 
+        self.ensure_ttl_index(mongo_ttl + revalidate_window)
+        self.ensure_uri_index()
+
+    @classmethod
+    def ttl_index_command(cls, collection: str, expire: int) -> dict:
+        """`collMod` command changing lifespan of TTL index on `added`"""
+        return {
+            "collMod": collection,
+            "index": {"keyPattern": {"added": 1}, "expireAfterSeconds": expire},
+        }
+
+    def ensure_ttl_index(self, expire: int):
+        """
+        Create TTL index on `added`. If it exists with another lifespan, such
+        as created by older versions, change its lifespan
+        :param expire: Seconds documents are kept after they are added
+        """
         try:
-            self.collection.create_index("added", expireAfterSeconds=mongo_ttl)
+            self.collection.create_index("added", expireAfterSeconds=expire)
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            self.collection.database.command(
+                self.ttl_index_command(self.collection.name, expire)
+            )
+
+    def ensure_uri_index(self) -> bool:
+        """
+        Create unique index on `uri`
+        :return: False if we can't, as collection has duplicated documents
+        """
+        try:
+            self.collection.create_index("uri", unique=True)
+            return True
         except OperationFailure:
             print(
-                "Warning: TTL value for MongoDB document set with different value",
+                "Warning: MongoDB document collection has duplicated URIs. "
+                "Run `python -m simplewc --dedupe-mongo`",
                 file=sys.stderr,
             )
+            return False
+
+    def dedupe(self) -> int:
+        """
+        Remove all but the latest document of each URI, then create unique
+        index on `uri`. Migrates collections written by `insert_one`
+        :return: Number of documents removed
+        """
+        duplicates = self.collection.aggregate(
+            [
+                {"$sort": {"added": -1}},
+                {"$group": {"_id": "$uri", "ids": {"$push": "$_id"}}},
+                {"$match": {"ids.1": {"$exists": True}}},
+            ],
+            allowDiskUse=True,
+        )
+        removed = 0
+        for group in duplicates:
+            stale = {"_id": {"$in": group["ids"][1:]}}
+            removed += self.collection.delete_many(stale).deleted_count
+        self.ensure_uri_index()
+        return removed
 
     @classmethod
     def to_mongo_key(cls, key: str) -> str:
@@ -213,56 +1073,499 @@ class MongoDocumentStorage(DocumentStorage):
             c[cls.to_plain_key(key)] = mongo_hash[key]
         return c
 
-    def store(self, uri: str, counter: Counter):
+    @classmethod
+    def to_buckets(cls, counter: Counter) -> dict:
+        """Encode counter into `simplewc.codec` buckets keyed by index"""
+        blobs = encode_counter(counter, MONGO_COMPACT_BUCKETS)
+        return {str(i): blob for i, blob in enumerate(blobs)}
+
+    @classmethod
+    def to_document(
+        cls,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ) -> dict:
+        """Build MongoDB document of (word-counted) HTML document"""
+        return {
+            "added": datetime.utcnow(),
+            "uri": cls.to_mongo_key(uri),
+            "format": COMPACT_FORMAT,
+            "bucket_count": MONGO_COMPACT_BUCKETS,
+            "buckets": cls.to_buckets(counter),
+            "validators": validators or dict(),
+            "indexes": indexes or dict(),
+        }
+
+    @classmethod
+    def from_document(cls, doc: dict) -> Counter:
+        """
+        Read (word-counted) HTML document from MongoDB document, either in
+        compact format or in legacy hash
+        """
+        if doc.get("format") == COMPACT_FORMAT:
+            return decode_counter(doc.get("buckets", dict()).values())
+        return cls.to_counter(doc.get("counter", dict()))
+
+    @classmethod
+    def counts_projection(cls, words: Iterable[str]) -> dict:
+        """
+        MongoDB projection of fields holding given words, in either format.
+        Pass the result document to `from_document`
+        """
+        projection = {"format": True, "bucket_count": True}
+        for word in words:
+            bucket = bucket_of(word, MONGO_COMPACT_BUCKETS)
+            projection["buckets.%d" % bucket] = True
+        if "" in words:
+            # Empty field name can't be projected. Take whole legacy hash
+            projection["counter"] = True
+        else:
+            for word in words:
+                projection["counter." + cls.to_mongo_key(word)] = True
+        return projection
+
+    @classmethod
+    def fresh_filter(cls, uri: str, mongo_ttl: int) -> dict:
+        """MongoDB filter of fresh documents at `uri`"""
+        return {
+            "uri": cls.to_mongo_key(uri),
+            "added": {"$gte": datetime.utcnow() - timedelta(seconds=mongo_ttl)},
+        }
+
+    @metrics.MONGO_SECONDS.timed(op="store")
+    def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
         """
         Save (word-counted) HTML document into MongoDB
         :param uri: Where HTML document originates
         :param counter: HTML document in a form of Counter{Word:str, Occurrence:int}
+        :param validators: HTTP cache validators of HTML document
+        :param indexes: Serialized indexes of HTML document by their name
         :return: None
         """
-        uri = self.to_mongo_key(uri)
-        self.collection.insert_one(
-            {
-                "added": datetime.utcnow(),
-                "uri": uri,
-                "counter": self.to_mongo_hash(counter),
-            }
-        )
+        doc = self.to_document(uri, counter, validators, indexes)
+        try:
+            self.collection.replace_one({"uri": doc["uri"]}, doc, upsert=True)
+        except DuplicateKeyError:
+            # Concurrent upsert inserted it first. Now it is there to replace
+            self.collection.replace_one({"uri": doc["uri"]}, doc, upsert=True)
 
+    @metrics.MONGO_SECONDS.timed(op="store_batch")
+    def store_batch(self, documents: Dict[str, tuple]):
+        """
+        Save many (word-counted) HTML documents in a single `bulk_write`
+        :param documents: {URI: (counter, validators, indexes)}. See `store`
+        """
+        if not documents:
+            return
+        docs = [
+            self.to_document(uri, *document)
+            for uri, document in documents.items()
+        ]
+        writes = [ReplaceOne({"uri": d["uri"]}, d, upsert=True) for d in docs]
+        try:
+            self.collection.bulk_write(writes, ordered=False)
+        except BulkWriteError:
+            # Concurrent upserts inserted some first. Now they are there
+            self.collection.bulk_write(writes, ordered=False)
+
+    @metrics.MONGO_SECONDS.timed(op="get")
     def get(self, uri: str) -> Counter:
         """
-        Get (word-counted) HTML document from MongoDB
+        Get (word-counted) HTML document from MongoDB, if it is fresh
         :param uri: Where HTML document originates
         :return: HTML document in a form of Counter{Word:str, Occurrence:int}
         :raise: NotInDocumentStorage when we can't find it in MongoDB
         """
-        uri = self.to_mongo_key(uri)
-        doc = self.collection.find_one({"uri": uri})
+        doc = self.collection.find_one(
+            self.fresh_filter(uri, self.mongo_ttl), projection=NO_INDEXES
+        )
+        if doc:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="hit")
+            return self.from_document(doc)
+
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="miss")
+        raise NotInDocumentStorage
+
+    @classmethod
+    def is_fresh(cls, doc: dict, mongo_ttl: int) -> bool:
+        """Whether MongoDB document is before its soft expiry"""
+        return doc["added"] >= datetime.utcnow() - timedelta(seconds=mongo_ttl)
+
+    @metrics.MONGO_SECONDS.timed(op="get_servable")
+    def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        """
+        Get (word-counted) HTML document from MongoDB, if it is fresh or
+        within `stale_ttl` after it
+        :param uri: Where HTML document originates
+        :return: (Counter{Word:str, Occurrence:int}, Is fresh)
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        doc = self.collection.find_one(
+            self.fresh_filter(uri, self.mongo_ttl + self.stale_ttl),
+            projection=NO_INDEXES,
+        )
+        if not doc:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="miss")
+            raise NotInDocumentStorage
+
+        fresh = self.is_fresh(doc, self.mongo_ttl)
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(
+            layer="mongo", result="hit" if fresh else "stale"
+        )
+        return self.from_document(doc), fresh
+
+    @metrics.MONGO_SECONDS.timed(op="get_index")
+    def get_index(self, uri: str, name: str) -> bytes:
+        """
+        Get serialized index of fresh (word-counted) HTML document in MongoDB.
+        Only the index is read
+        :param uri: Where HTML document originates
+        :param name: Name of index. See `simplewc.index`
+        :return: Serialized index
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        doc = self.collection.find_one(
+            self.fresh_filter(uri, self.mongo_ttl),
+            projection={"indexes." + name: True},
+        )
+        if doc and name in doc.get("indexes", dict()):
+            return doc["indexes"][name]
+
+        raise NotInDocumentStorage
+
+    @metrics.MONGO_SECONDS.timed(op="get_counts")
+    def get_counts(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        """
+        Get counts of given words from fresh (word-counted) HTML document in
+        MongoDB. Only buckets (or keys of legacy hash) of the words are read
+        :param uri: Where HTML document originates
+        :param words: Words to count
+        :return: {Word:str, Occurrence:int} of every word in `words`
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        words = list(words)
+        doc = self.collection.find_one(
+            self.fresh_filter(uri, self.mongo_ttl),
+            projection=self.counts_projection(words),
+        )
+        if not doc:
+            metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="miss")
+            raise NotInDocumentStorage
+        metrics.DOCUMENT_STORAGE_REQUESTS.inc(layer="mongo", result="hit")
+        if doc.get("format") == COMPACT_FORMAT and (
+            doc.get("bucket_count") != MONGO_COMPACT_BUCKETS
+        ):
+            # Stored with another bucket count. We projected wrong buckets
+            return super(MongoDocumentStorage, self).get_counts(uri, words)
+
+        counter = self.from_document(doc)
+        return {word: counter[word] for word in words}
+
+    @metrics.MONGO_SECONDS.timed(op="get_stale")
+    def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        """
+        Get (word-counted) HTML document from MongoDB, its validators and
+        indexes, even if it is not fresh
+        :param uri: Where HTML document originates
+        :return: (Counter{Word:str, Occurrence:int}, validators, indexes)
+        :raise: NotInDocumentStorage when we can't find it in MongoDB
+        """
+        doc = self.collection.find_one({"uri": self.to_mongo_key(uri)})
         if doc:
-            return self.to_counter(doc["counter"])
+            indexes = doc.pop("indexes", None) or dict()
+            return (
+                self.from_document(doc),
+                doc.get("validators", dict()),
+                indexes,
+            )
 
         raise NotInDocumentStorage
 
 
+class HashRing:
+    """
+    Consistent hashing of keys onto nodes.
+      * Each node has `replicas` points on the ring, and owns keys hashed
+        right before each of them
+      * Adding or removing a node moves only keys of that node, around
+        1 / (number of nodes) of them
+      * Hash is stable across processes and restarts
+    """
+
+    def __init__(
+        self,
+        nodes: Dict[str, object] = None,
+        replicas: int = HASH_RING_REPLICAS,
+    ):
+        """
+        :param nodes: {Name: node}. Name decides where the node is on ring,
+        such as "host:port"
+        :param replicas: Points of each node on ring
+        """
+        self.replicas = replicas
+        self._lock = threading.Lock()
+        # (Sorted points, name owning each point, {name: node}). Replaced as
+        # a whole, so lookups need no lock
+        self._ring: Tuple[List[int], List[str], Dict[str, object]] = (
+            [],
+            [],
+            dict(),
+        )
+        for name, node in (nodes or dict()).items():
+            self.add(name, node)
+
+    @property
+    def nodes(self) -> Dict[str, object]:
+        """{Name: node} on ring"""
+        return self._ring[2]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        """Position of `key` on ring"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, name: str, node: object):
+        """Add a node, or replace node of the same name"""
+        with self._lock:
+            nodes = dict(self.nodes)
+            nodes[name] = node
+            self._build(nodes)
+
+    def remove(self, name: str) -> object:
+        """
+        Remove a node
+        :return: Removed node
+        :raise: KeyError when there is no such node
+        """
+        with self._lock:
+            nodes = dict(self.nodes)
+            node = nodes.pop(name)
+            self._build(nodes)
+        return node
+
+    def _build(self, nodes: Dict[str, object]):
+        points = sorted(
+            (self.hash("%s#%d" % (name, i)), name)
+            for name in nodes
+            for i in range(self.replicas)
+        )
+        self._ring = ([p for p, _ in points], [n for _, n in points], nodes)
+
+    def name_of(self, key: str) -> str:
+        """
+        Name of node owning `key`
+        :raise: LookupError when ring has no node
+        """
+        return self._lookup(key)[0]
+
+    def node_of(self, key: str) -> object:
+        """
+        Node owning `key`
+        :raise: LookupError when ring has no node
+        """
+        return self._lookup(key)[1]
+
+    def _lookup(self, key: str) -> Tuple[str, object]:
+        points, names, nodes = self._ring
+        if not points:
+            raise LookupError("Hash ring has no node")
+        name = names[bisect.bisect(points, self.hash(key)) % len(points)]
+        return name, nodes[name]
+
+    def group(self, keys: Iterable[str]) -> Dict[object, List[str]]:
+        """
+        Group `keys` by node owning them, keeping their order
+        :return: {Node: keys}
+        """
+        groups = dict()
+        for key in keys:
+            groups.setdefault(self.node_of(key), []).append(key)
+        return groups
+
+
+class ShardedQueryCache(QueryCache):
+    """Query caches of URIs spread over nodes by consistent hashing"""
+
+    def __init__(
+        self, nodes: Dict[str, QueryCache], replicas: int = HASH_RING_REPLICAS
+    ):
+        """
+        :param nodes: {Name: query cache}, such as {"host:port":
+        `RedisQueryCache`}. Each has its own connection pool
+        :param replicas: Points of each node on hash ring
+        """
+        super(ShardedQueryCache, self).__init__(",".join(nodes))
+        self.ring = HashRing(nodes, replicas)
+
+    def get(self, uri: str, word: str) -> int:
+        return self.ring.node_of(uri).get(uri, word)
+
+    def store(self, uri: str, word: str, count: int):
+        self.ring.node_of(uri).store(uri, word, count)
+
+    def get_many(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        return self.ring.node_of(uri).get_many(uri, words)
+
+    def store_many(self, uri: str, counts: Dict[str, int]):
+        self.ring.node_of(uri).store_many(uri, counts)
+
+    def prefill(self, uri: str, counts: Dict[str, int]):
+        self.ring.node_of(uri).prefill(uri, counts)
+
+    def store_batch(self, counts: Dict[str, Dict[str, int]]):
+        # A round trip to each node
+        for node, uris in self.ring.group(counts).items():
+            node.store_batch({uri: counts[uri] for uri in uris})
+
+    def store_failure(self, key: str, failure: str, ttl: float):
+        self.ring.node_of(key).store_failure(key, failure, ttl)
+
+    def get_failure(
+        self, keys: Iterable[str], remote: bool = True
+    ) -> Optional[str]:
+        for node, keys_of_node in self.ring.group(keys).items():
+            failure = node.get_failure(keys_of_node, remote)
+            if failure is not None:
+                return failure
+        return None
+
+
+class ShardedDocumentStorage(DocumentStorage):
+    """Document storages of URIs spread over nodes by consistent hashing"""
+
+    def __init__(
+        self,
+        nodes: Dict[str, DocumentStorage],
+        replicas: int = HASH_RING_REPLICAS,
+    ):
+        """
+        :param nodes: {Name: document storage}, such as {"host:port":
+        `MongoDocumentStorage`}. Each has its own connection pool
+        :param replicas: Points of each node on hash ring
+        """
+        super(ShardedDocumentStorage, self).__init__(",".join(nodes))
+        self.ring = HashRing(nodes, replicas)
+
+    def store(
+        self,
+        uri: str,
+        counter: Counter,
+        validators: Dict[str, str] = None,
+        indexes: Dict[str, bytes] = None,
+    ):
+        self.ring.node_of(uri).store(uri, counter, validators, indexes)
+
+    def store_batch(self, documents: Dict[str, tuple]):
+        # A round trip to each node
+        for node, uris in self.ring.group(documents).items():
+            node.store_batch({uri: documents[uri] for uri in uris})
+
+    def get(self, uri: str) -> Counter:
+        return self.ring.node_of(uri).get(uri)
+
+    def get_servable(self, uri: str) -> Tuple[Counter, bool]:
+        return self.ring.node_of(uri).get_servable(uri)
+
+    def get_stale(
+        self, uri: str
+    ) -> Tuple[Counter, Dict[str, str], Dict[str, bytes]]:
+        return self.ring.node_of(uri).get_stale(uri)
+
+    def get_index(self, uri: str, name: str) -> bytes:
+        return self.ring.node_of(uri).get_index(uri, name)
+
+    def get_counts(self, uri: str, words: Iterable[str]) -> Dict[str, int]:
+        return self.ring.node_of(uri).get_counts(uri, words)
+
+    def dedupe(self) -> int:
+        """Dedupe each node. See `MongoDocumentStorage.dedupe`"""
+        return sum(node.dedupe() for node in self.ring.nodes.values())
+
+
 _RQC = None
 _MDS = None
+_LQC = None
+_LDS = None
 
 
 def get_redis_cache():
-    """Get singleton redis cache instance"""
+    """Get singleton redis cache instance, sharded over `REDIS_NODES`"""
     global _RQC
     if _RQC is not None:
         return _RQC
-    _RQC = RedisQueryCache(REDIS_HOST, REDIS_PORT, REDIS_DB)
+    if not REDIS_NODES:
+        _RQC = RedisQueryCache(REDIS_HOST, REDIS_PORT, REDIS_DB)
+        return _RQC
+
+    nodes = dict()
+    for host, port in REDIS_NODES:
+        nodes["%s:%d" % (host, port)] = RedisQueryCache(host, port, REDIS_DB)
+    _RQC = ShardedQueryCache(nodes)
     return _RQC
 
 
 def get_mongo_db():
-    """Get singleton mongodb document storage instance"""
+    """Get singleton mongodb document storage, sharded over `MONGO_NODES`"""
     global _MDS
     if _MDS:
         return _MDS
-    _MDS = MongoDocumentStorage(
-        MONGO_HOST, MONGO_PORT, MONGO_DB, MONGO_COLLECTION, MONGO_TTL
-    )
+    if not MONGO_NODES:
+        _MDS = MongoDocumentStorage(
+            MONGO_HOST, MONGO_PORT, MONGO_DB, MONGO_COLLECTION, MONGO_TTL
+        )
+        return _MDS
+
+    nodes = dict()
+    for host, port in MONGO_NODES:
+        nodes["%s:%d" % (host, port)] = MongoDocumentStorage(
+            host, port, MONGO_DB, MONGO_COLLECTION, MONGO_TTL
+        )
+    _MDS = ShardedDocumentStorage(nodes)
     return _MDS
+
+
+def get_query_cache():
+    """Get singleton query cache: in-process L1 in front of redis cache"""
+    global _LQC
+    if _LQC is not None:
+        return _LQC
+    _LQC = LocalQueryCache(
+        get_redis_cache(), max_pending=WRITE_BEHIND_MAX_PENDING
+    )
+    return _LQC
+
+
+def get_document_storage():
+    """Get singleton document storage: in-process L1 in front of mongodb"""
+    global _LDS
+    if _LDS is not None:
+        return _LDS
+    _LDS = LocalDocumentStorage(
+        get_mongo_db(), max_pending=WRITE_BEHIND_MAX_PENDING
+    )
+    return _LDS
+
+
+def close_writes(timeout: float = None) -> bool:
+    """
+    Write everything pending to Redis and MongoDB, and write on caller's
+    thread from now on. Call it on shutdown
+    :param timeout: Seconds to wait. None for as long as it takes
+    :return: False if writes are still pending
+    """
+    flushed = True
+    for tier in (_LQC, _LDS):
+        if tier is not None and tier.writes is not None:
+            flushed = tier.writes.close(timeout) and flushed
+    return flushed
@@ -0,0 +1,355 @@
+"""
+Streaming HTML tokenizer.
+
+Produces the same tokens as `simplewc.model.tokenize_html_to_words`, which
+splits `BeautifulSoup(content, "html.parser").prettify()` by white spaces,
+without building a document tree nor rendering the whole document again.
+"""
+import codecs
+import re
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+from string import punctuation
+from typing import Iterable, Iterator, List, Optional, Union
+
+# Elements BeautifulSoup renders as `<tag/>`
+VOID_ELEMENTS = frozenset(
+    (
+        "area",
+        "base",
+        "basefont",
+        "bgsound",
+        "br",
+        "col",
+        "command",
+        "embed",
+        "frame",
+        "hr",
+        "image",
+        "img",
+        "input",
+        "isindex",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "nextid",
+        "param",
+        "source",
+        "spacer",
+        "track",
+        "wbr",
+    )
+)
+# Elements whose content is not pretty-printed
+PRESERVE_WHITESPACE_ELEMENTS = frozenset(("pre", "textarea"))
+# Elements whose text is not entity-escaped
+CDATA_CONTAINING_ELEMENTS = frozenset(("script", "style"))
+# Attributes holding white space separated values
+MULTI_VALUED_ATTRIBUTES = {
+    "*": frozenset(("class", "accesskey", "dropzone")),
+    "a": frozenset(("rel", "rev")),
+    "link": frozenset(("rel", "rev")),
+    "td": frozenset(("headers",)),
+    "th": frozenset(("headers",)),
+    "form": frozenset(("accept-charset",)),
+    "object": frozenset(("archive",)),
+    "area": frozenset(("rel",)),
+    "icon": frozenset(("sizes",)),
+    "iframe": frozenset(("sandbox",)),
+    "output": frozenset(("for",)),
+}
+
+_NON_WHITESPACE = re.compile(r"\S+")
+_META_CONTENT_CHARSET = re.compile(r"((^|;)\s*charset=)([^;]*)", re.M)
+_XML_ENCODING = re.compile(
+    rb"^\s*<\?.*encoding=['\"](.*?)['\"].*\?>", re.I | re.S
+)
+_HTML_META_CHARSET = re.compile(
+    rb"<\s*meta[^>]+charset\s*=\s*[\"']?([^>]*?)[ /;'\">]", re.I
+)
+# How many leading bytes we look at to find out encoding of document
+SNIFF_SIZE = 2048
+
+
+def escape_minimal(text: str) -> str:
+    """Escape `&`, `<` and `>` like BeautifulSoup's "minimal" formatter"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def quote_attribute(value: str) -> str:
+    """Quote attribute value like BeautifulSoup does"""
+    if '"' in value:
+        if "'" in value:
+            return '"%s"' % value.replace('"', "&quot;")
+        return "'%s'" % value
+    return '"%s"' % value
+
+
+def sniff_encoding(head: bytes) -> str:
+    """
+    Find out encoding of HTML document from its leading bytes.
+      * Byte order mark first, then declared encoding, otherwise UTF-8
+    :param head: Leading bytes of HTML document
+    :return: Python codec name
+    """
+    for bom, encoding in (
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+    ):
+        if head.startswith(bom):
+            return encoding
+
+    declared = _XML_ENCODING.match(head[:1024]) or _HTML_META_CHARSET.search(
+        head
+    )
+    if declared:
+        try:
+            name = declared.group(1).decode("ascii").strip().lower()
+            return codecs.lookup(name).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return "utf-8"
+
+
+class HTMLTokenizer(HTMLParser):
+    """
+    Incremental HTML tokenizer. Feed document piece by piece and collect
+    tokens as they are found. Only unfinished part of the document is kept.
+
+    It renders each parser event as `BeautifulSoup.prettify()` would, and
+    splits the rendered text by white spaces on the fly.
+      * Open elements are closed by the matching closing tag, along with
+        everything opened after it. Stray closing tags are ignored
+      * Void elements are closed right away
+      * Elements still open at the end of document are closed
+    """
+
+    def __init__(self):
+        super(HTMLTokenizer, self).__init__(convert_charrefs=False)
+        self._head = b""  # Leading bytes, until we know document encoding
+        self._decoder = None
+        self._stack: List[List[str]] = []  # Open elements
+        self._already_closed: List[str] = []  # Void elements we closed
+        self._literal: Optional[List[str]] = None  # Open pre or textarea
+        self._in_text = False  # Are we in the middle of text node?
+        self._tail = ""  # Unfinished token
+        self._tokens: List[str] = []  # Finished tokens
+
+    def feed_chunk(self, chunk: Union[str, bytes]) -> List[str]:
+        """
+        Feed a piece of HTML document
+        :param chunk: Next piece of HTML document
+        :return: Tokens finished by this piece
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._decode(chunk)
+        if chunk:
+            self.feed(chunk)
+        return self._pop_tokens()
+
+    def finish(self) -> List[str]:
+        """
+        Notify end of HTML document
+        :return: Tokens left
+        """
+        if self._decoder is None and self._head:
+            self._decoder = self._new_decoder()
+        if self._decoder is not None:
+            rest = self._decoder.decode(self._head, final=True)
+            self._head = b""
+            if rest:
+                self.feed(rest)
+        self.close()
+        self._end_text()
+        while self._stack:
+            self._render_end(self._stack.pop())
+        self._break()
+        return self._pop_tokens()
+
+    def _new_decoder(self):
+        """Create incremental decoder for leading bytes we have seen"""
+        decoder_cls = codecs.getincrementaldecoder(sniff_encoding(self._head))
+        return decoder_cls(errors="replace")
+
+    def _decode(self, chunk: bytes) -> str:
+        """Decode bytes incrementally, once we know document encoding"""
+        if self._decoder is None:
+            self._head += chunk
+            if len(self._head) < SNIFF_SIZE:
+                return ""
+            self._decoder = self._new_decoder()
+            chunk, self._head = self._head, b""
+        return self._decoder.decode(chunk)
+
+    def _pop_tokens(self) -> List[str]:
+        tokens, self._tokens = self._tokens, []
+        return [tok.strip(punctuation).lower() for tok in tokens]
+
+    def _write(self, text: str):
+        """Write rendered text without white space around it"""
+        if not text:
+            return
+        parts = (self._tail + text).split()
+        if text[-1].isspace() or not parts:
+            self._tail = ""
+        else:
+            self._tail = parts.pop()
+        self._tokens.extend(parts)
+
+    def _break(self):
+        """Finish token being written"""
+        if self._tail:
+            self._tokens.append(self._tail)
+            self._tail = ""
+
+    def _render(self, piece: str):
+        """Write rendered piece, on its own line unless in pre or textarea"""
+        if self._literal is None:
+            self._break()
+        self._write(piece)
+        if self._literal is None:
+            self._break()
+
+    def _end_text(self):
+        """Finish text node being written"""
+        if self._in_text:
+            self._in_text = False
+            if self._literal is None:
+                self._break()
+
+    def _render_start(self, name: str, attrs: dict, empty: bool):
+        rendered = []
+        for key, value in sorted(attrs.items()):
+            rendered.append(key + "=" + quote_attribute(escape_minimal(value)))
+        closing = "/" if empty else ""
+        attribute_string = " " + " ".join(rendered) if rendered else ""
+        return "<" + name + attribute_string + closing + ">"
+
+    def _render_end(self, element: List[str]):
+        if element is self._literal:
+            self._write("</%s>" % element[0])
+            self._break()
+            self._literal = None
+            return
+        self._render("</%s>" % element[0])
+
+    def _pop_to(self, name: str):
+        """Close most recently opened `name` and everything opened after it"""
+        if not any(e[0] == name for e in self._stack):
+            return
+        while self._stack:
+            element = self._stack.pop()
+            self._render_end(element)
+            if element[0] == name:
+                return
+
+    @staticmethod
+    def _attributes(name: str, attrs) -> dict:
+        """Normalize attributes as BeautifulSoup stores them"""
+        attr_dict = dict()
+        multi_valued = MULTI_VALUED_ATTRIBUTES["*"].union(
+            MULTI_VALUED_ATTRIBUTES.get(name, ())
+        )
+        for key, value in attrs:
+            if value is None:
+                value = ""
+            if key in multi_valued:
+                value = " ".join(_NON_WHITESPACE.findall(value))
+            attr_dict[key] = value
+
+        if name == "meta":
+            # BeautifulSoup declares its output encoding instead
+            if "charset" in attr_dict:
+                attr_dict["charset"] = "utf-8"
+            elif (
+                "content" in attr_dict
+                and attr_dict.get("http-equiv", "").lower() == "content-type"
+            ):
+                attr_dict["content"] = _META_CONTENT_CHARSET.sub(
+                    lambda m: m.group(1) + "utf-8", attr_dict["content"]
+                )
+        return attr_dict
+
+    def handle_starttag(self, tag, attrs, startend=False):
+        self._end_text()
+        attrs = self._attributes(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._render(self._render_start(tag, attrs, empty=True))
+            if not startend:
+                self._already_closed.append(tag)
+            return
+
+        element = [tag]
+        piece = self._render_start(tag, attrs, empty=False)
+        if self._literal is None and tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self._break()
+            self._write(piece)
+            self._literal = element
+        else:
+            self._render(piece)
+        self._stack.append(element)
+        if startend:
+            self._pop_to(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, startend=True)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        self._end_text()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        if not self._in_text:
+            self._in_text = True
+            if self._literal is None:
+                self._break()
+        if not (
+            self._stack and self._stack[-1][0] in CDATA_CONTAINING_ELEMENTS
+        ):
+            data = escape_minimal(data)
+        self._write(data)
+
+    def handle_charref(self, name):
+        self.handle_data(unescape("&#%s;" % name))
+
+    def handle_entityref(self, name):
+        self.handle_data(html5.get(name + ";", "&" + name))
+
+    def handle_comment(self, data):
+        self._end_text()
+        self._render("<!--%s-->" % data)
+
+    def handle_decl(self, decl):
+        self._end_text()
+        self._render("<!DOCTYPE %s>\n" % decl[len("DOCTYPE ") :])
+
+    def unknown_decl(self, data):
+        self._end_text()
+        if data.upper().startswith("CDATA["):
+            self._render("<![CDATA[%s]]>" % data[len("CDATA[") :])
+        else:
+            self._render("<?%s?>" % data)
+
+    def handle_pi(self, data):
+        self._end_text()
+        self._render("<?%s>" % data)
+
+
+def tokenize_html_stream(chunks: Iterable[Union[str, bytes]]) -> Iterator[str]:
+    """
+    Tokenize HTML document given piece by piece, with bounded memory.
+    Tokens are the same as `simplewc.model.tokenize_html_to_words`
+      * Undeclared encoding is treated as UTF-8
+    :param chunks: Pieces of HTML document, such as `Response.iter_content()`
+    :return: Each token we find in html document
+    """
+    tokenizer = HTMLTokenizer()
+    for chunk in chunks:
+        yield from tokenizer.feed_chunk(chunk)
+    yield from tokenizer.finish()
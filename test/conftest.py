@@ -1,3 +1,6 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 
 from simplewc.storage import MockDocumentStorage, MockQueryCache
@@ -21,3 +24,56 @@ def mds():
 def mqc():
     """Get mock query cache"""
     return MockQueryCache("")
+
+
+class _RouteHandler(BaseHTTPRequestHandler):
+    """
+    Serve responses registered in `server.routes[path]` as
+    (status, headers, body), or a callable returning it from request headers.
+    Body is sent in chunked transfer encoding unless headers has
+    Content-Length
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        route = self.server.routes.get(self.path, (404, {}, b""))
+        if callable(route):
+            route = route(self.headers)
+        status, headers, body = route
+        if callable(body):
+            body = body(self.headers)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if status == 304:
+            self.end_headers()
+            return
+        if "Content-Length" in headers:
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(body), 4096):
+            piece = body[i : i + 4096]
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="function")
+def http_server():
+    """Local HTTP server. Register responses in `http_server.routes`"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RouteHandler)
+    server.routes, server.requests = dict(), []
+    server.url = "http://127.0.0.1:%d" % server.server_port
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,314 @@
+import asyncio
+from collections import Counter
+
+import aiohttp
+import pytest
+from pymongo.errors import OperationFailure
+
+from simplewc import config
+from simplewc.aio import (
+    _REFRESHES,
+    AsyncDocumentStorageAdapter,
+    AsyncHTMLDocumentModel,
+    AsyncMongoDocumentStorage,
+    AsyncQueryCacheAdapter,
+    AsyncShardedDocumentStorage,
+    AsyncShardedQueryCache,
+    AsyncSingleFlight,
+    PinnedResolver,
+    async_retrieve_html,
+    get_async_redis_cache,
+)
+from simplewc.exceptions import AccessLocalURI, NotReacheableLocation
+from simplewc.storage import (
+    LRUCache,
+    MockDocumentStorage,
+    MockQueryCache,
+    ShardedDocumentStorage,
+    ShardedQueryCache,
+)
+
+PUBLIC_URI = "http://93.184.216.34"
+
+
+def test_async_single_flight():
+    calls = []
+
+    async def slow_work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return Counter(["fit"])
+
+    async def run():
+        flight = AsyncSingleFlight()
+        return await asyncio.gather(
+            *(flight.do("key", slow_work) for _ in range(8))
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_async_single_flight_cancel():
+    async def slow_work():
+        await asyncio.sleep(0.1)
+        return 1
+
+    async def run():
+        flight = AsyncSingleFlight()
+        leader = asyncio.ensure_future(flight.do("key", slow_work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", slow_work))
+        await asyncio.sleep(0)
+        # Client of the leader went away
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == 1
+
+
+def test_async_count_words(mock_doc_storage, mock_query_cache):
+    downloads = []
+
+    async def get_html(uri):
+        downloads.append(uri)
+        await asyncio.sleep(0.1)
+        return b"<p>Fit fit size</p>"
+
+    async def count(words):
+        model = await AsyncHTMLDocumentModel.create(
+            PUBLIC_URI,
+            AsyncDocumentStorageAdapter(mock_doc_storage),
+            AsyncQueryCacheAdapter(mock_query_cache),
+            session=None,
+        )
+        model.get_html = get_html
+        return await model.count_words(words)
+
+    async def run():
+        return await asyncio.gather(
+            count(["fit", "size"]), count(["FIT", "none"])
+        )
+
+    assert asyncio.run(run()) == [[2, 1], [2, 0]]
+    assert downloads == [PUBLIC_URI]
+    assert mock_doc_storage.get(PUBLIC_URI)["fit"] == 2
+    assert mock_query_cache.get(PUBLIC_URI, "none") == 0
+
+
+def test_async_stale_while_revalidate(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0.05, stale_ttl=60)
+    doc_store.store(PUBLIC_URI, Counter({"fit": 1}))
+
+    async def get_html(uri):
+        await asyncio.sleep(0.1)
+        return b"<p>Fit fit</p>"
+
+    async def run():
+        await asyncio.sleep(0.06)
+        model = await AsyncHTMLDocumentModel.create(
+            PUBLIC_URI,
+            AsyncDocumentStorageAdapter(doc_store),
+            AsyncQueryCacheAdapter(mock_query_cache),
+            session=None,
+        )
+        model.get_html = get_html
+        # Stale counter is served, and refreshed in background
+        counts = await model.count_words(["fit"])
+        await asyncio.gather(*_REFRESHES.values())
+        return counts
+
+    assert asyncio.run(run()) == [1]
+    assert doc_store.get(PUBLIC_URI)["fit"] == 2
+
+
+def test_async_retrieve_html_revalidation(http_server):
+    def page(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"ETag": '"v1"'}, b"<p>fit</p>"
+
+    http_server.routes["/page"] = page
+    uri = http_server.url + "/page"
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            first = await async_retrieve_html(uri, session)
+            again = await async_retrieve_html(uri, session, first.validators)
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert not first.not_modified
+    assert first.validators == {"etag": '"v1"'}
+    assert b"".join(first) == b"<p>fit</p>"
+    assert again.not_modified
+    assert b"".join(again) == b""
+    assert http_server.requests[-1][1]["If-None-Match"] == '"v1"'
+
+
+def test_async_count_phrases_apart_from_words(mock_query_cache):
+    async def get_html(uri, validators=None):
+        return b"<p>Runs true to size. True to size!</p>"
+
+    async def count(uri, rpc):
+        model = await AsyncHTMLDocumentModel.create(
+            uri,
+            AsyncDocumentStorageAdapter(MockDocumentStorage("")),
+            AsyncQueryCacheAdapter(mock_query_cache),
+            session=None,
+        )
+        model.get_html = get_html
+        return await getattr(model, "count_" + rpc)(["true to size"])
+
+    for first, second in (("words", "phrases"), ("phrases", "words")):
+        uri = "%s/%s" % (PUBLIC_URI, first)
+        counts = {rpc: asyncio.run(count(uri, rpc)) for rpc in (first, second)}
+        # Either one cached first does not answer the other
+        assert counts == {"words": [0], "phrases": [2]}
+
+
+class _FakeResponse(list):
+    def __init__(self, chunks, not_modified=False, validators=None):
+        super(_FakeResponse, self).__init__(chunks)
+        self.not_modified = not_modified
+        self.validators = validators or dict()
+
+
+def test_async_document_revalidation(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0)
+    first = {"etag": "v1", "last_modified": "Mon, 05 Oct 2026 00:00:00 GMT"}
+    fetches = []
+
+    async def get_html(uri, validators=None):
+        fetches.append(validators)
+        if validators:
+            # 304 repeats ETag but omits Last-Modified
+            return _FakeResponse(
+                [], not_modified=True, validators={"etag": "v1"}
+            )
+        return _FakeResponse([b"<p>fit fit</p>"], validators=first)
+
+    async def count():
+        model = await AsyncHTMLDocumentModel.create(
+            PUBLIC_URI,
+            AsyncDocumentStorageAdapter(doc_store),
+            AsyncQueryCacheAdapter(mock_query_cache),
+            session=None,
+        )
+        model.get_html = get_html
+        return await model.fetch_counter()
+
+    for _ in range(3):
+        assert asyncio.run(count())["fit"] == 2
+
+    # Expired copy is revalidated with every validator it was stored with
+    assert fetches == [None, first, first]
+    # Its indexes are kept along with it
+    assert "positions" in doc_store.mock_indexes[PUBLIC_URI]
+
+
+def test_async_failed_refresh_keeps_serving(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0.05, stale_ttl=60)
+    doc_store.store(PUBLIC_URI, Counter({"fit": 1}))
+
+    async def dead_get_html(uri, validators=None):
+        raise NotReacheableLocation("Could not connect to 93.184.216.34")
+
+    async def count():
+        model = await AsyncHTMLDocumentModel.create(
+            PUBLIC_URI,
+            AsyncDocumentStorageAdapter(doc_store),
+            AsyncQueryCacheAdapter(mock_query_cache),
+            session=None,
+        )
+        model.get_html = dead_get_html
+        counts = await model.count_words(["fit"])
+        await asyncio.gather(*_REFRESHES.values())
+        return counts
+
+    async def run():
+        await asyncio.sleep(0.06)
+        return [await count() for _ in range(2)]
+
+    assert asyncio.run(run()) == [[1], [1]]
+    # Failure of background refresh is not remembered
+    assert mock_query_cache.mock_failures == dict()
+
+
+def test_async_sharded_storage(monkeypatch):
+    caches = {"redis-%d" % i: MockQueryCache("") for i in range(3)}
+    stores = {"mongo-%d" % i: MockDocumentStorage("") for i in range(3)}
+    query_cache = AsyncShardedQueryCache(
+        {name: AsyncQueryCacheAdapter(c) for name, c in caches.items()}
+    )
+    doc_store = AsyncShardedDocumentStorage(
+        {name: AsyncDocumentStorageAdapter(s) for name, s in stores.items()}
+    )
+    uris = ["http://example.com/%d" % i for i in range(30)]
+
+    async def run():
+        for uri in uris:
+            await query_cache.store_many(uri, {"fit": 1})
+            await doc_store.store(uri, Counter(["fit"]))
+        await query_cache.store_failure("host:dead.test", "AccessLocalURI:", 9)
+        return await query_cache.get_failure(["uri:x", "host:dead.test"])
+
+    assert asyncio.run(run()) == "AccessLocalURI:"
+    # On the same nodes as of the threaded server
+    threaded_cache = ShardedQueryCache(caches)
+    threaded_store = ShardedDocumentStorage(stores)
+    for uri in uris:
+        assert threaded_cache.get_many(uri, ["fit"]) == {"fit": 1}
+        assert threaded_store.get_counts(uri, ["fit"]) == {"fit": 1}
+    assert sum(len(store.mock_db) for store in stores.values()) == len(uris)
+
+    monkeypatch.setattr(
+        "simplewc.config.REDIS_NODES", (("redis-0", 6379), ("redis-1", 6379))
+    )
+    assert get_async_redis_cache().host == "redis-0:6379,redis-1:6379"
+
+
+def test_pinned_resolver(monkeypatch):
+    answers = {"public.test": "93.184.216.34", "local.test": "10.0.0.1"}
+    monkeypatch.setattr("simplewc.model.socket.gethostbyname", answers.get)
+    monkeypatch.setattr("simplewc.model._DNS_CACHE", LRUCache(16, 60))
+
+    resolver = PinnedResolver()
+    (answer,) = asyncio.run(resolver.resolve("public.test", 443))
+    assert (answer["host"], answer["port"]) == ("93.184.216.34", 443)
+    with pytest.raises(AccessLocalURI):
+        asyncio.run(resolver.resolve("local.test", 443))
+
+
+def test_async_mongo_ttl_index():
+    commands = []
+
+    class FakeDatabase:
+        async def command(self, command: dict):
+            commands.append(command)
+
+    class FakeCollection:
+        name = "documents"
+        database = FakeDatabase()
+
+        async def create_index(self, key: str, **options):
+            if key == "added":
+                # Created by older version with another lifespan
+                raise OperationFailure("Index already exists", code=85)
+
+    storage = AsyncMongoDocumentStorage.__new__(AsyncMongoDocumentStorage)
+    storage.mongo_ttl = 60
+    storage.collection = FakeCollection()
+    asyncio.run(storage.ensure_indexes())
+    assert commands == [
+        {
+            "collMod": "documents",
+            "index": {
+                "keyPattern": {"added": 1},
+                "expireAfterSeconds": 60 + config.MONGO_REVALIDATE_WINDOW,
+            },
+        }
+    ]
@@ -0,0 +1,43 @@
+from urllib.request import urlopen
+
+from bench.corpus import make_html, parse_path, serve_corpus
+from bench.suite import PATHS, compare, percentile, run
+from simplewc import model
+
+
+def test_corpus():
+    assert make_html(2000, 50) == make_html(2000, 50)
+    assert len(make_html(2000, 50)) >= 2000
+    assert parse_path("/2000/50/cold/3?i=1") == (2000, 50)
+
+    server = serve_corpus()
+    try:
+        with urlopen(server.url + "/2000/50/1") as response:
+            assert response.read() == make_html(2000, 50)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_percentile():
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile(range(1, 101), 99) == 99
+    assert percentile([5], 99) == 5
+
+
+def test_run(monkeypatch):
+    # Restore what benchmark replaces
+    monkeypatch.setattr("simplewc.storage._LQC", None)
+    monkeypatch.setattr("simplewc.storage._LDS", None)
+
+    check = model.raise_if_not_public
+    report = run(((2000, 50),), requests=2, concurrency=2, repeat=1, rtt=0)
+    assert model.raise_if_not_public is check
+    names = [r["name"] for r in report["results"]]
+    assert names[: len(PATHS)] == ["e2e/%s/2000x50" % p for p in PATHS]
+    assert "micro/to_mongo_hash/2000x50" in names
+
+    e2e = [r for r in report["results"] if r["kind"] == "e2e"]
+    slower = {"results": [dict(r, p50_ms=r["p50_ms"] * 2) for r in e2e]}
+    regressions = [row[0] for row in compare(report, slower) if row[3]]
+    assert regressions == names[: len(PATHS)]
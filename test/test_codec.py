@@ -0,0 +1,42 @@
+from collections import Counter
+
+from simplewc.codec import (
+    bucket_of,
+    decode_bucket,
+    decode_counter,
+    decode_tokens,
+    encode_bucket,
+    encode_counter,
+    encode_tokens,
+)
+
+
+def test_bucket_roundtrip():
+    counter = Counter({"fit": 2, "": 3, "size": 1, "日本": 4, "a.b$c": 5})
+    assert decode_bucket(encode_bucket(counter)) == counter
+    assert decode_bucket(encode_bucket(Counter())) == Counter()
+    assert decode_bucket(encode_bucket(Counter({"": 1}))) == Counter({"": 1})
+
+
+def test_counter_roundtrip():
+    counter = Counter("word%d" % (i % 500) for i in range(2000))
+    blobs = encode_counter(counter, 16)
+    assert len(blobs) == 16
+    assert decode_counter(blobs) == counter
+
+    # Each word is found in its own bucket
+    assert decode_bucket(blobs[bucket_of("word7", 16)])["word7"] == 4
+
+
+def test_tokens_roundtrip():
+    words, ids = ["true", "", "size"], [0, 1, 0, 2, 2]
+    decoded_words, decoded_ids = decode_tokens(encode_tokens(words, ids))
+    assert decoded_words == words and list(decoded_ids) == ids
+    decoded_words, decoded_ids = decode_tokens(encode_tokens([], []))
+    assert decoded_words == [] and len(decoded_ids) == 0
+
+    # Ids are widened once vocabulary does not fit in uint16
+    words = ["word%d" % i for i in range(70000)]
+    ids = list(range(69990, 70000))
+    decoded_words, decoded_ids = decode_tokens(encode_tokens(words, ids))
+    assert decoded_words == words and list(decoded_ids) == ids
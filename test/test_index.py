@@ -0,0 +1,102 @@
+from array import array
+from collections import Counter
+
+from simplewc.index import (
+    FrequencyIndex,
+    PositionIndex,
+    VocabularyIndex,
+    build_indexes,
+)
+
+
+def test_frequency_index():
+    counter = Counter({"fit": 3, "size": 1, "a": 3, "the": 5})
+    index = FrequencyIndex.from_counter(counter)
+    assert index.page(limit=3) == [("the", 5), ("a", 3), ("fit", 3)]
+    assert index.page(offset=3) == [("size", 1)]
+    assert index.page(offset=10) == []
+
+    # Not stored. Same view of stored vocabulary
+    assert index.NAME not in build_indexes(counter)
+    vocabulary = VocabularyIndex.from_bytes(
+        build_indexes(counter)["vocabulary"]
+    )
+    index = FrequencyIndex.from_vocabulary(vocabulary)
+    assert index.page() == [("the", 5), ("a", 3), ("fit", 3), ("size", 1)]
+    assert len(FrequencyIndex.from_counter(Counter())) == 0
+
+
+def test_vocabulary_index():
+    counter = Counter({"fit": 3, "fits": 1, "fist": 2, "size": 1, "sit": 4})
+    index = VocabularyIndex.from_bytes(build_indexes(counter)["vocabulary"])
+    assert index.prefix("fi") == [("fist", 2), ("fit", 3), ("fits", 1)]
+    assert index.prefix("x") == []
+
+    assert index.wildcard("fi?") == [("fit", 3)]
+    assert index.wildcard("*it") == [("fit", 3), ("sit", 4)]
+    assert index.wildcard("f*s*") == [("fist", 2), ("fits", 1)]
+    assert index.wildcard("fit") == [("fit", 3)]
+
+    assert index.fuzzy("fit", 0) == [("fit", 3)]
+    assert index.fuzzy("fit", 1) == [
+        ("fist", 2),
+        ("fit", 3),
+        ("fits", 1),
+        ("sit", 4),
+    ]
+    assert index.fuzzy("zzzz", 1) == []
+
+    assert index.match("fi", limit=2) == [("fist", 2), ("fit", 3)]
+    assert index.match("?it", "wildcard") == [("fit", 3), ("sit", 4)]
+    assert index.match("sits", "fuzzy", 1) == [("fits", 1), ("sit", 4)]
+
+
+def test_position_index():
+    tokens = "it runs true to size , true to size and true".split()
+    index = PositionIndex.from_tokens(tokens)
+    assert index.counter() == Counter(tokens)
+    assert index.count_phrase(["true", "to", "size"]) == 2
+    assert index.count_phrase(["true"]) == 3
+    assert index.count_phrase(["size", "true"]) == 0
+    assert index.count_phrase(["small"]) == 0
+    assert index.count_phrase([]) == 0
+    # Overlapping occurrences, of ids spanning several bytes
+    many = PositionIndex.from_tokens(
+        ["w%d" % i for i in range(300)] + ["a"] * 3
+    )
+    assert many.count_phrase(["a", "a"]) == 2
+    assert many.count_phrase(["w1", "w2"]) == 1
+
+    index = PositionIndex.from_bytes(
+        build_indexes(index.counter(), index)[index.NAME]
+    )
+    assert len(index) == len(tokens)
+    assert index.top_ngrams(2, 2) == [("true to", 2), ("to size", 2)]
+    assert index.top_ngrams(11) == [(" ".join(tokens), 1)]
+    assert index.top_ngrams(12) == []
+
+
+def test_build_indexes_max_bytes():
+    tokens = ["w%d" % (i % 500) for i in range(20000)]
+    positions = PositionIndex.from_tokens(tokens)
+    indexes = build_indexes(positions.counter(), positions)
+    assert set(indexes) == {"vocabulary", "positions"}
+
+    # Indexes past the limit are skipped, and the rest are kept
+    vocabulary = len(indexes["vocabulary"])
+    capped = build_indexes(positions.counter(), positions, vocabulary)
+    assert capped == {"vocabulary": indexes["vocabulary"]}
+    assert build_indexes(positions.counter(), positions, 0) == {}
+
+
+class _Py39Array(array):
+    """`array` without start argument of `index`, as before Python 3.10"""
+
+    def index(self, x):
+        return super(_Py39Array, self).index(x)
+
+
+def test_position_index_before_python310():
+    index = PositionIndex.from_tokens("true to size , true to size".split())
+    index.ids = _Py39Array(index.ids.typecode, index.ids)
+    assert index.count_phrase(["true", "to", "size"]) == 2
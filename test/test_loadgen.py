@@ -0,0 +1,74 @@
+import io
+from concurrent import futures
+
+import grpc
+import pytest
+
+from simplewc.loadgen import Pacer, read_mix, run_load
+from simplewc.protos import wc_pb2_grpc
+from simplewc.servicer import WordCountServicer
+from simplewc.storage import LocalQueryCache
+
+
+def test_read_mix():
+    mix = read_mix(
+        io.StringIO(
+            "# comment\n\n"
+            "http://93.184.216.34 fit size\n"
+            "http://93.184.216.34\ttrue to size\tfit\n"
+        )
+    )
+    assert [(r.uri, list(r.words)) for r in mix] == [
+        ("http://93.184.216.34", ["fit", "size"]),
+        ("http://93.184.216.34", ["true to size", "fit"]),
+    ]
+    with pytest.raises(ValueError):
+        read_mix(["# nothing"])
+
+
+def test_pacer():
+    pacer = Pacer(rate=100, duration=0.05)
+    dues = []
+    while True:
+        due = pacer.wait()
+        if due is None:
+            break
+        dues.append(due)
+    assert len(dues) == 5
+    assert dues[1] - dues[0] == pytest.approx(0.01)
+
+
+def test_run_load(monkeypatch, mock_doc_storage, mock_query_cache):
+    monkeypatch.setattr(
+        "simplewc.model.fetch_html", lambda uri: b"<p>fit fit size</p>"
+    )
+    monkeypatch.setattr(
+        "simplewc.servicer.get_document_storage", lambda: mock_doc_storage
+    )
+    query_cache = LocalQueryCache(mock_query_cache)
+    monkeypatch.setattr(
+        "simplewc.servicer.get_query_cache", lambda: query_cache
+    )
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    wc_pb2_grpc.add_WordCountServiceServicer_to_server(
+        WordCountServicer(), server
+    )
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        mix = read_mix(
+            ["http://93.184.216.34 fit size", "http://127.0.0.1 fit"]
+        )
+        report = run_load(
+            "127.0.0.1:%d" % port, mix, streams=2, rate=40, duration=0.5
+        )
+    finally:
+        server.stop(0)
+
+    # Every other request is to a local host
+    assert report["requests"] == 20
+    assert report["codes"] == {"OK": 10, "PERMISSION_DENIED": 10}
+    assert report["throughput"] == pytest.approx(40, rel=0.5)
+    first, full = report["first_message_ms"], report["full_stream_ms"]
+    assert 0 < first["p50"] <= full["p50"] <= full["p99"] <= full["max"]
@@ -0,0 +1,128 @@
+from concurrent import futures
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import grpc
+import pytest
+
+from simplewc import metrics
+from simplewc.protos import wc_pb2_grpc
+from simplewc.protos.wc_pb2 import WordCountRequest
+from simplewc.servicer import WordCountServicer, start_metrics
+from simplewc.storage import LocalQueryCache
+
+
+def test_render():
+    registry = metrics.Registry()
+    requests = metrics.Counter(
+        "requests_total", "Requests", ("layer",), registry=registry
+    )
+    streams = metrics.Gauge("streams", "Streams", registry=registry)
+    latency = metrics.Histogram(
+        "latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry
+    )
+
+    requests.inc(layer="l1")
+    requests.inc(2, layer='say "hi"\n')
+    streams.inc()
+    streams.inc()
+    streams.dec()
+    latency.observe(0.1)
+    latency.observe(5)
+    with pytest.raises(ValueError):
+        requests.inc()
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{layer="l1"} 1.0',
+        'requests_total{layer="say \\"hi\\"\\n"} 2.0',
+        "# HELP streams Streams",
+        "# TYPE streams gauge",
+        "streams 1.0",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1.0"} 1',
+        'latency_seconds_bucket{le="+Inf"} 2',
+        "latency_seconds_sum 5.1",
+        "latency_seconds_count 2",
+    ]
+
+
+def test_serve_metrics():
+    registry = metrics.Registry()
+    metrics.Counter("up", "Up", registry=registry).inc()
+    server = metrics.serve_metrics("127.0.0.1:0", registry)
+    try:
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        with urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            assert b"up 1.0" in response.read()
+        with pytest.raises(HTTPError):
+            urlopen(url + "/")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_start_metrics_port_taken(capsys):
+    server = metrics.serve_metrics("127.0.0.1:0", metrics.Registry())
+    try:
+        taken = "127.0.0.1:%d" % server.server_address[1]
+        # Another server on the host has the port. We serve anyway
+        start_metrics(taken)
+        assert "Could not serve metrics at " + taken in capsys.readouterr().err
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stream_metrics(monkeypatch, mock_doc_storage, mock_query_cache):
+    monkeypatch.setattr(
+        "simplewc.model.fetch_html", lambda uri: b"<p>fit fit size</p>"
+    )
+    monkeypatch.setattr(
+        "simplewc.servicer.get_document_storage", lambda: mock_doc_storage
+    )
+    query_cache = LocalQueryCache(mock_query_cache)
+    monkeypatch.setattr(
+        "simplewc.servicer.get_query_cache", lambda: query_cache
+    )
+
+    def l1(result):
+        return metrics.QUERY_CACHE_REQUESTS.value(layer="l1", result=result)
+
+    calls = metrics.RPC_SECONDS.count(method="CountWords")
+    errors = metrics.RPC_ERRORS.value(code="PERMISSION_DENIED")
+    hits, misses = l1("hit"), l1("miss")
+
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=2),
+        interceptors=(metrics.MetricsInterceptor(),),
+    )
+    wc_pb2_grpc.add_WordCountServiceServicer_to_server(
+        WordCountServicer(), server
+    )
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        with grpc.insecure_channel("127.0.0.1:%d" % port) as channel:
+            stub = wc_pb2_grpc.WordCountServiceStub(channel)
+            request = WordCountRequest(
+                uri="http://93.184.216.34", words=["fit", "size"]
+            )
+            assert [r.count for r in stub.CountWords(request)] == [2, 1]
+            # Served from query cache this time
+            assert [r.count for r in stub.CountWords(request)] == [2, 1]
+
+            with pytest.raises(grpc.RpcError):
+                list(stub.CountWords(WordCountRequest(uri="http://127.0.0.1")))
+    finally:
+        server.stop(0)
+
+    assert metrics.ACTIVE_STREAMS.value(method="CountWords") == 0
+    assert metrics.RPC_SECONDS.count(method="CountWords") == calls + 3
+    assert metrics.RPC_ERRORS.value(code="PERMISSION_DENIED") == errors + 1
+    # Missed both words first, then hit both of them in L1
+    assert (l1("hit") - hits, l1("miss") - misses) == (2, 2)
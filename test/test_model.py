@@ -1,14 +1,30 @@
+import threading
+import time
 from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
+from simplewc import metrics
+from simplewc.exceptions import NotReacheableLocation
 from simplewc.model import (
     HTMLDocumentModel,
+    Refresher,
+    SingleFlight,
+    count_html_words_in_pool,
+    fetch_html,
+    get_tokenizer_pool,
+    phrase_cache_key,
     retrieve_html,
     tokenize_html_to_words,
 )
+from simplewc.storage import LRUCache, MockDocumentStorage, TinyLFU
 
 here = Path(__file__).absolute().parent
 
+# Public IP literal, so creating a model does not need DNS
+PUBLIC_URI = "http://93.184.216.34"
+
 
 def test_tokenize_html_to_words():
     """Test tokenizing"""
@@ -80,3 +96,368 @@ def test_query(mock_doc_storage, mock_query_cache):
             model.count_word("DOES_NOT_EXIST_STRING")
             == gtc["DOES_NOT_EXIST_STRING"]
         )
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    calls = []
+
+    def slow_work():
+        calls.append(1)
+        time.sleep(0.2)
+        return Counter(["fit"])
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(flight.do("key", slow_work))
+        )
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(r is results[0] for r in results)
+
+    # Finished key is forgotten
+    flight.do("key", slow_work)
+    assert len(calls) == 2
+
+
+def test_coalesced_document_load(mock_doc_storage, mock_query_cache):
+    downloads = []
+
+    def slow_get_html(uri):
+        downloads.append(uri)
+        time.sleep(0.2)
+        return b"<p>fit fit size</p>"
+
+    counts = []
+
+    def count():
+        model = HTMLDocumentModel(
+            PUBLIC_URI, mock_doc_storage, mock_query_cache
+        )
+        model.get_html = slow_get_html
+        counts.append(model.local_counter_cache["fit"])
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert downloads == [PUBLIC_URI]
+    assert counts == [2] * 8
+
+
+def test_count_words(mock_doc_storage, mock_query_cache):
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    model.get_html = lambda x: b"<p>Fit fit size</p>"
+
+    assert model.count_words(["FIT", "size", "none", "fit"]) == [2, 1, 0, 2]
+    assert mock_query_cache.get_many(PUBLIC_URI, ["fit", "size", "none"]) == {
+        "fit": 2,
+        "size": 1,
+        "none": 0,
+    }
+    assert model.count_word("size") == 1
+
+
+def test_count_html_words_in_pool(monkeypatch):
+    with open(here / "virtusize.html.bytes", "rb") as f:
+        content = f.read()
+    inline = count_html_words_in_pool(content)
+
+    monkeypatch.setattr("simplewc.model.TOKENIZER_PROCESSES", 1)
+    monkeypatch.setattr("simplewc.model._TOKENIZER_POOL", None)
+    try:
+        assert count_html_words_in_pool(content) == inline
+        assert count_html_words_in_pool(iter([content[:99], content[99:]])) == (
+            inline
+        )
+    finally:
+        get_tokenizer_pool().shutdown()
+
+    class BrokenPool:
+        shut_down = False
+
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("A worker died"))
+            return future
+
+        def shutdown(self, wait=True):
+            self.shut_down = True
+
+    # Broken pool falls back to inline, and is replaced by a new one
+    broken = BrokenPool()
+    monkeypatch.setattr("simplewc.model._TOKENIZER_POOL", broken)
+    assert count_html_words_in_pool(content) == inline
+    assert broken.shut_down
+    try:
+        assert get_tokenizer_pool() is not broken
+    finally:
+        get_tokenizer_pool().shutdown()
+
+
+def test_fetch_html_revalidation(http_server):
+    def page(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"ETag": '"v1"'}, b"<p>fit</p>"
+
+    http_server.routes["/page"] = page
+    uri = http_server.url + "/page"
+
+    response = fetch_html(uri)
+    assert not response.not_modified
+    assert response.validators == {"etag": '"v1"'}
+    assert b"".join(response) == b"<p>fit</p>"
+
+    response = fetch_html(uri, response.validators)
+    assert response.not_modified
+    assert b"".join(response) == b""
+    assert http_server.requests[-1][1]["If-None-Match"] == '"v1"'
+
+
+class _FakeResponse(list):
+    def __init__(self, chunks, not_modified=False, validators=None):
+        super(_FakeResponse, self).__init__(chunks)
+        self.not_modified = not_modified
+        self.validators = validators or dict()
+
+
+def test_document_revalidation(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0)
+    fetches = []
+
+    def get_html(uri, validators=None):
+        fetches.append(validators)
+        if validators:
+            return _FakeResponse([], not_modified=True, validators=validators)
+        return _FakeResponse([b"<p>fit fit</p>"], validators={"etag": "v1"})
+
+    for _ in range(2):
+        model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+        model.get_html = get_html
+        assert model.local_counter_cache["fit"] == 2
+
+    # Expired copy is revalidated, and reused as it is not modified
+    assert fetches == [None, {"etag": "v1"}]
+    # Along with its indexes. Phrases are counted without downloading it
+    assert "positions" in doc_store.mock_indexes[PUBLIC_URI]
+
+
+def test_document_revalidation_partial_validators(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0)
+    first = {"etag": "v1", "last_modified": "Mon, 05 Oct 2026 00:00:00 GMT"}
+    fetches = []
+
+    def get_html(uri, validators=None):
+        fetches.append(validators)
+        if validators:
+            # 304 repeats ETag but omits Last-Modified
+            return _FakeResponse(
+                [], not_modified=True, validators={"etag": "v1"}
+            )
+        return _FakeResponse([b"<p>fit fit</p>"], validators=first)
+
+    for _ in range(3):
+        model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+        model.get_html = get_html
+        assert model.local_counter_cache["fit"] == 2
+
+    # Validators omitted by 304 are still sent on later revalidations
+    assert fetches == [None, first, first]
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stale_while_revalidate(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0.05, stale_ttl=60)
+    doc_store.store(PUBLIC_URI, Counter({"fit": 1}))
+    time.sleep(0.06)
+
+    release = threading.Event()
+
+    def slow_get_html(uri, validators=None):
+        release.wait(5)
+        return _FakeResponse([b"<p>fit fit</p>"])
+
+    model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+    model.get_html = slow_get_html
+    # Stale counter is served without waiting for the refresh
+    assert model.local_counter_cache["fit"] == 1
+
+    release.set()
+    _wait_for(lambda: doc_store.mock_db[PUBLIC_URI]["fit"] == 2)
+    model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+    assert model.local_counter_cache["fit"] == 2
+
+
+def test_failed_refresh_keeps_serving(mock_query_cache):
+    doc_store = MockDocumentStorage("", ttl=0.05, stale_ttl=60)
+    doc_store.store(PUBLIC_URI, Counter({"fit": 1}))
+    time.sleep(0.06)
+    errors = metrics.DOCUMENT_REFRESHES.value(trigger="stale", result="error")
+
+    def dead_get_html(uri, validators=None):
+        raise NotReacheableLocation("Could not connect to 93.184.216.34")
+
+    model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+    model.get_html = dead_get_html
+    assert model.count_words(["fit"]) == [1]
+    _wait_for(
+        lambda: metrics.DOCUMENT_REFRESHES.value(
+            trigger="stale", result="error"
+        )
+        == errors + 1
+    )
+
+    # Failure of background refresh is not remembered
+    assert mock_query_cache.mock_failures == dict()
+    model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+    model.get_html = dead_get_html
+    assert model.count_words(["fit"]) == [1]
+    assert model.local_counter_cache["fit"] == 1
+
+    # Failure of the URI is checked only when we would fetch it
+    mock_query_cache.store_failure(
+        "uri:" + PUBLIC_URI, "NotReacheableLocation:", 60
+    )
+    model = HTMLDocumentModel(PUBLIC_URI, doc_store, mock_query_cache)
+    assert model.count_words(["fit"]) == [1]
+
+
+def test_refresh_ahead(mock_doc_storage, mock_query_cache):
+    refresher = Refresher(ttl=10, ahead_at=0.5, min_hits=2, interval=3600)
+    fetched = []
+
+    def get_html(uri, validators=None):
+        fetched.append(uri)
+        return _FakeResponse([b"<p>fit</p>"])
+
+    hot, cold = PUBLIC_URI + "/hot", PUBLIC_URI + "/cold"
+    for uri in (hot, cold):
+        model = HTMLDocumentModel(uri, mock_doc_storage, mock_query_cache)
+        model.get_html = get_html
+        refresher.stored(model)
+    refresher.touch(hot)
+    refresher.touch(hot)
+    refresher.touch(cold)
+
+    # Nothing is due before half of ttl
+    assert refresher.run_due() == 0
+    # Only the hot one is refreshed, before it expires
+    assert refresher.run_due(time.monotonic() + 5) == 1
+    _wait_for(lambda: fetched == [hot])
+    # Both are forgotten until stored again
+    assert refresher.run_due(time.monotonic() + 5) == 0
+
+
+def test_count_words_from_document_storage(mock_doc_storage, mock_query_cache):
+    mock_doc_storage.store(PUBLIC_URI, Counter({"fit": 2, "size": 1}))
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+
+    assert model.count_words(["fit", "none"]) == [2, 0]
+    # Counts are read from document storage without loading whole counter
+    assert model._local_counter_cache is None
+
+
+def test_prefill_query_cache(monkeypatch, mock_doc_storage, mock_query_cache):
+    monkeypatch.setattr("simplewc.model._POPULARITY", TinyLFU(1024))
+    monkeypatch.setattr("simplewc.model._PREFILLED", LRUCache(8, 60))
+    monkeypatch.setattr("simplewc.model.PREFILL_TOP_K", 2)
+    mock_doc_storage.store(PUBLIC_URI, Counter({"fit": 3, "size": 2, "a": 1}))
+    prefills = metrics.QUERY_CACHE_PREFILLS.value(kind="top")
+
+    def count_words(words):
+        model = HTMLDocumentModel(
+            PUBLIC_URI, mock_doc_storage, mock_query_cache
+        )
+        return model.count_words(words)
+
+    # Not popular yet. Only asked words are cached
+    assert count_words(["fit"]) == [3]
+    assert count_words(["a"]) == [1]
+    assert {word for _, word in mock_query_cache.mock_cache} == {"fit", "a"}
+
+    # Accessed 3 times. The most frequent words are cached at once
+    assert count_words(["none"]) == [0]
+    assert mock_query_cache.get(PUBLIC_URI, "size") == 2
+    assert metrics.QUERY_CACHE_PREFILLS.value(kind="top") == prefills + 1
+
+    # Not again until it expires
+    assert count_words(["another"]) == [0]
+    assert metrics.QUERY_CACHE_PREFILLS.value(kind="top") == prefills + 1
+
+
+def test_top_words(mock_doc_storage, mock_query_cache):
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    model.get_html = lambda x: b"fit size fit the the the"
+    assert model.top_words(2) == [("the", 3), ("fit", 2)]
+
+    # Index is stored with the document, and used without counter
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    assert model.top_words(offset=2) == [("size", 1)]
+    assert model._local_counter_cache is None
+
+
+def test_match_words(mock_doc_storage, mock_query_cache):
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    model.get_html = lambda x: b"fit fits fist size fit sit"
+    assert model.match_words("FI") == [("fist", 1), ("fit", 2), ("fits", 1)]
+
+    # Vocabulary is stored with the document, and used without counter
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    assert model.match_words("s?t", "wildcard") == [("sit", 1)]
+    # Edit distance is capped by `FUZZY_MAX_DISTANCE`
+    assert model.match_words("fitzz", "fuzzy", 10) == [("fit", 2), ("fits", 1)]
+    assert model._local_counter_cache is None
+
+
+def test_count_phrases(mock_doc_storage, mock_query_cache):
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    model.get_html = lambda x: b"<p>Runs true to size. True to size!</p>"
+    assert model.count_phrases(["true to size", "True To", "to true"]) == [
+        2,
+        2,
+        0,
+    ]
+    # Phrases are cached apart from words
+    assert (
+        mock_query_cache.get(phrase_cache_key(PUBLIC_URI), "true to size") == 2
+    )
+
+    # Positions are stored with the document, and used without download
+    model = HTMLDocumentModel(PUBLIC_URI, mock_doc_storage, mock_query_cache)
+    model.get_html = None
+    assert model.count_phrases(["runs true"]) == [1]
+    assert model.top_ngrams(3, 1) == [("true to size", 2)]
+    assert model.count_words(["true"]) == [2]
+
+
+def test_count_phrases_apart_from_words(mock_query_cache):
+    html = b"<p>Runs true to size. True to size!</p>"
+    for first, second in (("words", "phrases"), ("phrases", "words")):
+        uri = "%s/%s" % (PUBLIC_URI, first)
+        counts = dict()
+        for rpc in (first, second):
+            model = HTMLDocumentModel(
+                uri, MockDocumentStorage(""), mock_query_cache
+            )
+            model.get_html = lambda x: html
+            count = getattr(model, "count_" + rpc)
+            counts[rpc] = count(["true to size"])
+        # Either one cached first does not answer the other
+        assert counts == {"words": [0], "phrases": [2]}
@@ -1,8 +1,29 @@
+import gzip
+import socket
+
 import pytest
+import requests
 
-from simplewc.exceptions import AccessLocalURI, NotAllowedScheme
-from simplewc.model import HTMLDocumentModel, raise_if_not_safe
-from simplewc.storage import MockDocumentStorage, MockQueryCache
+from simplewc.exceptions import (
+    AccessLocalURI,
+    NotAllowedScheme,
+    NotReacheableLocation,
+    TooBigResource,
+    UnresolvableHost,
+)
+from simplewc.model import (
+    HTMLDocumentModel,
+    failure_key,
+    fetch_html,
+    raise_if_not_safe,
+    retrieve_html,
+)
+from simplewc.storage import (
+    LocalQueryCache,
+    LRUCache,
+    MockDocumentStorage,
+    MockQueryCache,
+)
 
 LINK_TO_VERY_BIG_RESOURCE = (
     "http://ftp.riken.jp/Linux/ubuntu-releases/18.04"
@@ -39,3 +60,130 @@ def test_raise_if_local():
         HTMLDocumentModel(
             "https://127.0.0.1/index.html", mock_doc_storage, mock_query_cache
         )
+
+
+def test_too_big_resource(http_server, monkeypatch):
+    monkeypatch.setattr("simplewc.model.MAX_CONTENT_SIZE", 10000)
+    small, big = b"<p>fit</p>" * 10, b"<p>fit</p>" * 2000
+    http_server.routes["/small"] = (200, {}, small)
+    http_server.routes["/big"] = (200, {}, big)
+    http_server.routes["/declared"] = (
+        200,
+        {"Content-Length": str(len(big))},
+        big,
+    )
+    http_server.routes["/gzip"] = (
+        200,
+        {"Content-Encoding": "gzip"},
+        gzip.compress(big),
+    )
+
+    # Chunked transfer without Content-Length header
+    assert retrieve_html(http_server.url + "/small") == small
+    with pytest.raises(TooBigResource):
+        retrieve_html(http_server.url + "/big")
+
+    with pytest.raises(TooBigResource):
+        retrieve_html(http_server.url + "/declared")
+
+    # Size limit applies to decompressed content
+    assert len(gzip.compress(big)) < 10000
+    with pytest.raises(TooBigResource):
+        retrieve_html(http_server.url + "/gzip")
+
+
+def test_dns_pinning(http_server, monkeypatch):
+    answers = {"public.test": "93.184.216.34", "rebind.test": "93.184.216.35"}
+    lookups = []
+
+    def gethostbyname(host):
+        lookups.append(host)
+        return answers[host]
+
+    monkeypatch.setattr("simplewc.model.socket.gethostbyname", gethostbyname)
+    monkeypatch.setattr("simplewc.model._DNS_CACHE", LRUCache(16, 60))
+
+    # Answers are cached. Hot requests do not resolve again
+    assert raise_if_not_safe("http://public.test/a") == "93.184.216.34"
+    assert raise_if_not_safe("http://public.test:8080/b") == "93.184.216.34"
+    assert lookups == ["public.test"]
+
+    # Even if DNS answer changes to local address after the check,
+    # download never connects to an address we did not validate
+    monkeypatch.setattr("simplewc.model._DNS_CACHE", LRUCache(16, 0))
+    assert raise_if_not_safe("http://rebind.test/") == "93.184.216.35"
+    answers["rebind.test"] = "127.0.0.1"
+    with pytest.raises(AccessLocalURI):
+        fetch_html("http://rebind.test:%d/" % http_server.server_port)
+    assert http_server.requests == []
+
+
+def test_negative_cache(monkeypatch):
+    lookups, downloads = [], []
+
+    def gethostbyname(host):
+        lookups.append(host)
+        if host == "dead.test":
+            raise socket.gaierror
+        return "93.184.216.34"
+
+    def get_html(uri, validators=None):
+        downloads.append(uri)
+        raise TooBigResource("%s is too big file to parse" % uri)
+
+    monkeypatch.setattr("simplewc.model.socket.gethostbyname", gethostbyname)
+    monkeypatch.setattr("simplewc.model._DNS_CACHE", LRUCache(16, 0))
+    shared = MockQueryCache("")
+
+    def model(uri):
+        # Each model on its own process, sharing query cache backend
+        return HTMLDocumentModel(
+            uri, MockDocumentStorage(""), LocalQueryCache(shared)
+        )
+
+    # Unresolvable host fails every URI on it, without resolving again
+    for uri in ("http://dead.test/a", "http://dead.test/b"):
+        with pytest.raises(NotReacheableLocation):
+            model(uri)
+    assert lookups == ["dead.test"]
+
+    # Too big document fails only its URI, without downloading again
+    for _ in range(2):
+        with pytest.raises(TooBigResource):
+            big = model("http://alive.test/big")
+            big.get_html = get_html
+            big.count_words(["fit"])
+    assert downloads == ["http://alive.test/big"]
+    small = model("http://alive.test/small")
+    small.get_html = lambda uri, validators=None: b"<p>fit</p>"
+    assert small.count_words(["fit"]) == [1]
+
+    # Failures are forgotten after their lifespan
+    shared.mock_failures.clear()
+    with pytest.raises(NotReacheableLocation):
+        model("http://dead.test/a")
+    assert lookups.count("dead.test") == 2
+
+
+def test_failure_key(monkeypatch):
+    uri = "http://alive.test/a"
+    assert failure_key(uri, UnresolvableHost()) == "host:alive.test"
+    assert failure_key(uri, AccessLocalURI()) == "host:alive.test"
+    assert failure_key(uri, TooBigResource()) == "uri:" + uri
+    assert failure_key(uri, NotAllowedScheme()) is None
+
+    class Session:
+        def get(self, uri, **kwargs):
+            raise requests.ConnectionError(cause)
+
+    monkeypatch.setattr("simplewc.model.get_http_session", Session)
+    # Reset connection fails only the URI. Other URIs on the host may work
+    cause = ConnectionResetError()
+    with pytest.raises(NotReacheableLocation) as e:
+        fetch_html(uri)
+    assert failure_key(uri, e.value) == "uri:" + uri
+
+    cause = UnresolvableHost("Could not resolve alive.test")
+    with pytest.raises(UnresolvableHost) as e:
+        fetch_html(uri)
+    assert failure_key(uri, e.value) == "host:alive.test"
@@ -0,0 +1,129 @@
+import os
+import signal
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+from simplewc.protos import wc_pb2_grpc
+from simplewc.protos.wc_pb2 import BatchWordCountRequest, WordCountRequest
+from simplewc.servicer import (
+    WordCountServicer,
+    grpc_compression,
+    serve_insecure,
+)
+
+PAGES = {
+    "http://93.184.216.34/slow": b"<p>fit fit</p>",
+    "http://93.184.216.34/fast": b"<p>size</p>",
+}
+
+
+def test_count_words_batch(monkeypatch, mock_doc_storage, mock_query_cache):
+    running, peak = [], []
+    lock = threading.Lock()
+
+    def get_html(uri):
+        with lock:
+            running.append(uri)
+            peak.append(len(running))
+        time.sleep(0.3 if uri.endswith("slow") else 0.1)
+        with lock:
+            running.remove(uri)
+        return PAGES[uri]
+
+    monkeypatch.setattr("simplewc.model.fetch_html", get_html)
+    monkeypatch.setattr(
+        "simplewc.servicer.get_document_storage", lambda: mock_doc_storage
+    )
+    monkeypatch.setattr(
+        "simplewc.servicer.get_query_cache", lambda: mock_query_cache
+    )
+    monkeypatch.setattr("simplewc.config.BATCH_MAX_CONCURRENCY", 2)
+
+    request = BatchWordCountRequest(
+        requests=[
+            WordCountRequest(uri=uri, words=["fit", "size"]) for uri in PAGES
+        ]
+        + [WordCountRequest(uri="http://127.0.0.1", words=["fit"])]
+    )
+    results = list(WordCountServicer().CountWordsBatch(request, None))
+
+    # In completion order. Local URI waits for a free slot, then fails on its
+    # own without cutting the stream
+    assert [(r.uri, r.word, r.count, r.status) for r in results] == [
+        ("http://93.184.216.34/fast", "fit", 0, 0),
+        ("http://93.184.216.34/fast", "size", 1, 0),
+        ("http://127.0.0.1", "", 0, grpc.StatusCode.PERMISSION_DENIED.value[0]),
+        ("http://93.184.216.34/slow", "fit", 2, 0),
+        ("http://93.184.216.34/slow", "size", 0, 0),
+    ]
+    assert results[2].details == "You cannot access Local URI"
+    assert max(peak) == 2
+
+
+def test_count_words_packed(monkeypatch, mock_doc_storage, mock_query_cache):
+    monkeypatch.setattr(
+        "simplewc.model.fetch_html", lambda uri: b"<p>fit fit size</p>"
+    )
+    monkeypatch.setattr(
+        "simplewc.servicer.get_document_storage", lambda: mock_doc_storage
+    )
+    monkeypatch.setattr(
+        "simplewc.servicer.get_query_cache", lambda: mock_query_cache
+    )
+    monkeypatch.setattr("simplewc.config.PACKED_CHUNK_SIZE", 2)
+
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=2),
+        compression=grpc_compression("gzip"),
+    )
+    wc_pb2_grpc.add_WordCountServiceServicer_to_server(
+        WordCountServicer(), server
+    )
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        with grpc.insecure_channel("127.0.0.1:%d" % port) as channel:
+            stub = wc_pb2_grpc.WordCountServiceStub(channel)
+            uri = "http://93.184.216.34"
+            packed = list(
+                stub.CountWordsPacked(
+                    WordCountRequest(uri=uri, words=["fit", "size", "none"])
+                )
+            )
+            assert [(p.uri, list(p.words), list(p.counts)) for p in packed] == [
+                (uri, ["fit", "size"], [2, 1]),
+                (uri, ["none"], [0]),
+            ]
+
+            with pytest.raises(grpc.RpcError) as e:
+                list(
+                    stub.CountWordsPacked(
+                        WordCountRequest(uri="http://127.0.0.1", words=["a"])
+                    )
+                )
+            assert e.value.code() == grpc.StatusCode.PERMISSION_DENIED
+    finally:
+        server.stop(0)
+
+
+def test_serve_insecure_sigterm(monkeypatch):
+    closed = []
+    monkeypatch.setattr("simplewc.config.METRICS_HOST_PORT", None)
+    monkeypatch.setattr(
+        "simplewc.servicer.close_writes", lambda: closed.append(1)
+    )
+
+    # Process manager stops us while serving
+    stop = threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGTERM))
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        stop.start()
+        serve_insecure("127.0.0.1:0")
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    # Pending writes are flushed, as on Ctrl-C
+    assert closed == [1]
@@ -0,0 +1,445 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from simplewc.exceptions import NotInDocumentStorage, NotInResultCacheQuery
+from simplewc.storage import (
+    HashRing,
+    LocalDocumentStorage,
+    LocalQueryCache,
+    LRUCache,
+    MockDocumentStorage,
+    MockQueryCache,
+    MongoDocumentStorage,
+    ShardedDocumentStorage,
+    ShardedQueryCache,
+    TinyLFU,
+    WriteBehind,
+    merge_counts,
+)
+
+
+def test_lru_cache():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is the least recently used one
+    cache.put("c", 3)
+    assert len(cache) == 2
+    with pytest.raises(KeyError):
+        cache.get("b")
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_expire():
+    cache = LRUCache(max_entries=2, ttl=0.05)
+    cache.put("a", 1)
+    time.sleep(0.1)
+    with pytest.raises(KeyError):
+        cache.get("a")
+
+
+def test_tiny_lfu():
+    sketch = TinyLFU(width=1024, sample_size=100)
+    assert sketch.frequency("a") == 0
+    # First access is taken by doorkeeper
+    sketch.increment("a")
+    assert sketch.frequency("a") == 1
+    for _ in range(20):
+        sketch.increment("a")
+    assert sketch.frequency("a") == 1 + TinyLFU.MAX_COUNT
+    sketch.increment("b")
+    assert sketch.frequency("b") == 1
+
+    # Counters are halved, and doorkeeper is cleared, every 100 accesses
+    for _ in range(100 - 22):
+        sketch.increment("c")
+    assert sketch.frequency("a") == TinyLFU.MAX_COUNT // 2
+    assert sketch.frequency("b") == 0
+
+
+def test_local_query_cache(mock_query_cache):
+    l1 = LocalQueryCache(mock_query_cache)
+    with pytest.raises(NotInResultCacheQuery):
+        l1.get("uri", "fit")
+
+    mock_query_cache.store("uri", "fit", 3)
+    assert l1.get("uri", "fit") == 3
+
+    # Served by L1 without touching backend
+    mock_query_cache.mock_cache.clear()
+    assert l1.get("uri", "fit") == 3
+
+    l1.store("uri", "size", 1)
+    assert mock_query_cache.get("uri", "size") == 1
+
+
+def test_local_query_cache_failures(mock_query_cache):
+    l1 = LocalQueryCache(mock_query_cache, failure_ttl=60)
+    l1.store_failure("host:dead.test", "NotReacheableLocation:", 60)
+    assert (
+        l1.get_failure(["uri:x", "host:dead.test"]) == "NotReacheableLocation:"
+    )
+
+    # Another process finds it in backend only when it asks for it
+    other = LocalQueryCache(mock_query_cache, failure_ttl=60)
+    assert other.get_failure(["host:dead.test"], remote=False) is None
+    assert other.get_failure(["host:dead.test"]) == "NotReacheableLocation:"
+    mock_query_cache.mock_failures.clear()
+    assert other.get_failure(["host:dead.test"], remote=False) is not None
+
+    # Lifespan of each failure is kept, up to local lifespan
+    l1.store_failure("uri:big", "TooBigResource:", 0)
+    assert l1.get_failure(["uri:big"], remote=False) is None
+
+
+def test_local_document_storage(mock_doc_storage):
+    l1 = LocalDocumentStorage(mock_doc_storage)
+    with pytest.raises(NotInDocumentStorage):
+        l1.get("uri")
+
+    l1.store("uri", Counter(["fit"]))
+    assert mock_doc_storage.get("uri")["fit"] == 1
+
+    mock_doc_storage.mock_db.clear()
+    assert l1.get("uri")["fit"] == 1
+
+
+def test_write_behind():
+    written, started, release = [], threading.Event(), threading.Event()
+
+    def write_batch(batch):
+        started.set()
+        release.wait(5)
+        written.append(batch)
+
+    writes = WriteBehind(
+        "test", write_batch, max_pending=2, batch_size=2, merge=merge_counts
+    )
+    writes.submit("a", {"fit": 1})
+    assert started.wait(5)
+    # Coalesced while "a" is being written, and readable before written
+    writes.submit("b", {"fit": 1})
+    writes.submit("b", {"size": 2})
+    writes.submit("c", {})
+    assert writes.pending("a") == {"fit": 1}
+    assert writes.pending("b") == {"fit": 1, "size": 2}
+
+    # Queue is full. New key waits until worker takes a batch
+    blocked = threading.Thread(target=writes.submit, args=("d", {"fit": 3}))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(5)
+    assert writes.flush(5)
+    assert written == [
+        {"a": {"fit": 1}},
+        {"b": {"fit": 1, "size": 2}, "c": {}},
+        {"d": {"fit": 3}},
+    ]
+    with pytest.raises(KeyError):
+        writes.pending("a")
+
+    # Written on caller's thread once closed
+    assert writes.close(5)
+    writes.submit("e", {"fit": 1})
+    assert written[-1] == {"e": {"fit": 1}}
+
+
+def test_local_document_storage_write_behind(mock_doc_storage):
+    release = threading.Event()
+    store_batch = mock_doc_storage.store_batch
+
+    def slow_store_batch(documents):
+        release.wait(5)
+        store_batch(documents)
+
+    mock_doc_storage.store_batch = slow_store_batch
+    l1 = LocalDocumentStorage(mock_doc_storage, max_pending=8)
+    l1.store("uri", Counter(["fit"]), {"etag": '"1"'}, {"frequency": b"idx"})
+    assert "uri" not in mock_doc_storage.mock_db
+
+    # Pending document is served even after L1 lost it
+    l1.local = LRUCache(8, 60)
+    assert l1.get_counts("uri", ["fit", "none"]) == {"fit": 1, "none": 0}
+    assert l1.get_index("uri", "frequency") == b"idx"
+    with pytest.raises(NotInDocumentStorage):
+        l1.get_index("uri", "positions")
+    assert l1.get_stale("uri")[1:] == ({"etag": '"1"'}, {"frequency": b"idx"})
+
+    release.set()
+    assert l1.writes.flush(5)
+    assert mock_doc_storage.get("uri")["fit"] == 1
+
+
+def test_hash_ring():
+    ring = HashRing({"a": 1, "b": 2, "c": 3})
+    keys = ["http://example.com/%d" % i for i in range(3000)]
+    before = {key: ring.name_of(key) for key in keys}
+    # Spread evenly, and the same in every process
+    assert all(800 < n < 1200 for n in Counter(before.values()).values())
+    assert HashRing.hash("http://example.com") == 0x691A637F16203C38
+
+    # Only keys of the new node move, about a quarter of them
+    ring.add("d", 4)
+    moved = [key for key in keys if ring.name_of(key) != before[key]]
+    assert all(ring.name_of(key) == "d" for key in moved)
+    assert 600 < len(moved) < 900
+
+    # And back where they were once it is removed
+    assert ring.remove("d") == 4
+    assert {key: ring.name_of(key) for key in keys} == before
+    groups = ring.group(keys)
+    assert sum(len(group) for group in groups.values()) == len(keys)
+    assert all(
+        ring.node_of(key) == node
+        for node, group in groups.items()
+        for key in group
+    )
+
+    with pytest.raises(LookupError):
+        HashRing().node_of("http://example.com")
+
+
+def test_sharded_storage():
+    caches = {"redis-%d" % i: MockQueryCache("") for i in range(3)}
+    stores = {"mongo-%d" % i: MockDocumentStorage("") for i in range(3)}
+    query_cache = ShardedQueryCache(caches)
+    doc_storage = ShardedDocumentStorage(stores)
+    uris = ["http://example.com/%d" % i for i in range(30)]
+
+    for uri in uris:
+        query_cache.store_many(uri, {"fit": 1})
+        doc_storage.store(uri, Counter(["fit"]))
+    query_cache.store_batch({uri: {"size": 2} for uri in uris})
+    for uri in uris:
+        # Each URI is on its own node only
+        assert query_cache.get_many(uri, ["fit", "size"]) == {
+            "fit": 1,
+            "size": 2,
+        }
+        assert query_cache.ring.node_of(uri).get(uri, "fit") == 1
+        assert doc_storage.get_counts(uri, ["fit"]) == {"fit": 1}
+    assert all(cache.mock_cache for cache in caches.values())
+    assert sum(len(store.mock_db) for store in stores.values()) == len(uris)
+
+    # Failures keyed by host and by URI may be on different nodes
+    query_cache.store_failure("host:dead.test", "NotReacheableLocation:", 60)
+    failure = query_cache.get_failure(
+        ["uri:http://dead.test", "host:dead.test"]
+    )
+    assert failure == "NotReacheableLocation:"
+
+
+def test_query_cache_many(mock_query_cache):
+    mock_query_cache.store_many("uri", {"fit": 1, "size": 2})
+    assert mock_query_cache.get_many("uri", ["fit", "size", "none"]) == {
+        "fit": 1,
+        "size": 2,
+    }
+
+    l1 = LocalQueryCache(mock_query_cache)
+    assert l1.get_many("uri", ["fit", "none"]) == {"fit": 1}
+    l1.store_many("uri", {"none": 0})
+    assert mock_query_cache.get("uri", "none") == 0
+
+
+def test_mongo_document_format():
+    counter = Counter({"fit": 2, "a.b": 1, "$size": 3})
+    doc = MongoDocumentStorage.to_document("http://a.b", counter)
+    assert "counter" not in doc
+    assert MongoDocumentStorage.from_document(doc) == counter
+
+    # Legacy documents are still readable
+    legacy = {
+        "uri": "http://a．b",
+        "counter": {"fit": 2, "a．b": 1, "＄size": 3},
+    }
+    assert MongoDocumentStorage.from_document(legacy) == counter
+
+
+def _project(doc: dict, projection: dict) -> dict:
+    """Apply MongoDB inclusion projection of up to two levels"""
+    projected = dict()
+    for path in projection:
+        key, _, sub = path.partition(".")
+        if key not in doc:
+            continue
+        if not sub:
+            projected[key] = doc[key]
+        elif sub in doc[key]:
+            projected.setdefault(key, dict())[sub] = doc[key][sub]
+    return projected
+
+
+def test_mongo_counts_projection():
+    counter = Counter({"word%d" % i: i for i in range(1, 1000)})
+    counter.update({"a.b": 7, "": 3})
+    words = ["word5", "a.b", "none"]
+    expected = {"word5": 5, "a.b": 7, "none": 0}
+
+    doc = MongoDocumentStorage.to_document("http://a.b", counter)
+    projection = MongoDocumentStorage.counts_projection(words)
+    projected = _project(doc, projection)
+    assert len(projected["buckets"]) <= len(words)
+    found = MongoDocumentStorage.from_document(projected)
+    assert {w: found[w] for w in words} == expected
+
+    legacy = {"counter": MongoDocumentStorage.to_mongo_hash(counter)}
+    found = MongoDocumentStorage.from_document(_project(legacy, projection))
+    assert found == Counter({"word5": 5, "a.b": 7})
+
+    projection = MongoDocumentStorage.counts_projection(["", "word5"])
+    found = MongoDocumentStorage.from_document(_project(legacy, projection))
+    assert (found[""], found["word5"]) == (3, 5)
+
+
+class _FakeDatabase:
+    def __init__(self):
+        self.commands = []
+
+    def command(self, command: dict):
+        self.commands.append(command)
+
+
+class _FakeCollection:
+    """
+    In-memory stand-in of `pymongo.collection.Collection`, with only what
+    `MongoDocumentStorage` uses
+    """
+
+    name = "documents"
+
+    def __init__(self, indexes: dict = None):
+        self.database = _FakeDatabase()
+        self.indexes = indexes or dict()
+        self.docs = []
+        # Documents other servers insert right before our next upsert
+        self.racing = []
+
+    def create_index(self, key: str, **options):
+        if self.indexes.get(key, options) != options:
+            raise OperationFailure("Index already exists", code=85)
+        values = [doc[key] for doc in self.docs]
+        if options.get("unique") and len(set(values)) < len(values):
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.indexes[key] = options
+
+    def insert_one(self, doc: dict):
+        self.docs.append(dict(doc, _id=len(self.docs)))
+
+    def replace_one(self, query: dict, doc: dict, upsert: bool = False):
+        found = self.find_one(query)
+        if self.racing:
+            # Both of us saw no document, and the other one inserted first
+            self.insert_one(self.racing.pop())
+            if found is None and upsert:
+                raise DuplicateKeyError("E11000 duplicate key error")
+        if found is not None:
+            self.docs[self.docs.index(found)] = dict(doc, _id=found["_id"])
+        elif upsert:
+            self.insert_one(doc)
+
+    def find_one(self, query: dict, projection: dict = None):
+        for doc in self.docs:
+            if all(doc.get(key) == value for key, value in query.items()):
+                return doc
+        return None
+
+    def aggregate(self, pipeline: list, allowDiskUse: bool = False):
+        # Pipeline of `MongoDocumentStorage.dedupe`: sorted by `added`, `_id`s
+        # grouped by `uri`, groups of two or more
+        newest_first = pipeline[0]["$sort"]["added"] < 0
+        ids = dict()
+        docs = sorted(self.docs, key=lambda d: d["added"], reverse=newest_first)
+        for doc in docs:
+            ids.setdefault(doc["uri"], []).append(doc["_id"])
+        return [
+            {"_id": uri, "ids": group}
+            for uri, group in ids.items()
+            if len(group) > 1
+        ]
+
+    def delete_many(self, query: dict):
+        stale = set(query["_id"]["$in"])
+        kept = [doc for doc in self.docs if doc["_id"] not in stale]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+
+def test_mongo_ttl_index():
+    storage = MongoDocumentStorage.__new__(MongoDocumentStorage)
+    storage.collection = _FakeCollection()
+    storage.ensure_ttl_index(60)
+    assert storage.collection.indexes["added"] == {"expireAfterSeconds": 60}
+    assert storage.collection.database.commands == []
+
+    # Index of older lifespan is changed in place
+    storage.ensure_ttl_index(120)
+    assert storage.collection.database.commands == [
+        {
+            "collMod": "documents",
+            "index": {"keyPattern": {"added": 1}, "expireAfterSeconds": 120},
+        }
+    ]
+
+    def deny(key: str, **options):
+        raise OperationFailure("not authorized", code=13)
+
+    storage.collection.create_index = deny
+    with pytest.raises(OperationFailure):
+        storage.ensure_ttl_index(60)
+
+
+def _mongo_storage(collection: _FakeCollection) -> MongoDocumentStorage:
+    storage = MongoDocumentStorage.__new__(MongoDocumentStorage)
+    storage.collection = collection
+    return storage
+
+
+def test_mongo_store_upsert():
+    storage = _mongo_storage(_FakeCollection())
+    storage.store("http://a.b", Counter({"fit": 1}))
+    storage.store("http://a.b", Counter({"fit": 2}), {"etag": "v2"})
+    # Replaced, not duplicated
+    assert len(storage.collection.docs) == 1
+    counter, validators, indexes = storage.get_stale("http://a.b")
+    assert (counter["fit"], validators, indexes) == (2, {"etag": "v2"}, {})
+
+    # Another server inserted it between our lookup and insert
+    racing = MongoDocumentStorage.to_document("http://c.d", Counter({"x": 1}))
+    storage.collection.racing.append(racing)
+    storage.store("http://c.d", Counter({"fit": 3}))
+    assert len(storage.collection.docs) == 2
+    assert storage.get_stale("http://c.d")[0] == Counter({"fit": 3})
+
+
+def test_mongo_dedupe():
+    collection = _FakeCollection()
+    storage = _mongo_storage(collection)
+    # Collection written by `insert_one`, before the unique index
+    for i in range(3):
+        doc = MongoDocumentStorage.to_document("http://a.b", Counter(fit=i))
+        doc["added"] = datetime(2020, 1, 1 + i)
+        collection.insert_one(doc)
+    collection.insert_one(
+        MongoDocumentStorage.to_document("http://c.d", Counter(fit=9))
+    )
+    assert not storage.ensure_uri_index()
+
+    assert storage.dedupe() == 2
+    assert len(collection.docs) == 2
+    # The newest one of each URI is kept
+    assert storage.get_stale("http://a.b")[0] == Counter(fit=2)
+    assert storage.get_stale("http://c.d")[0] == Counter(fit=9)
+    assert collection.indexes["uri"] == {"unique": True}
+    assert storage.dedupe() == 0
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+
+from simplewc.model import count_html_words, tokenize_html_to_words
+from simplewc.tokenizer import sniff_encoding, tokenize_html_stream
+
+here = Path(__file__).absolute().parent
+
+
+def chunked(content, size):
+    return [content[i : i + size] for i in range(0, len(content), size)]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "some str",
+        b"some \xed\x95\x9c\xea\xb5\xad\xec\x96\xb4",
+        "FIT!</p>",
+        "<a href='x.html' class='  a  b '>link&amp;co</a>",
+        "<br><br/></br><img src=a.png>",
+        "a<pre>x y<b>z</b> w</pre>b",
+        "<div><p>unclosed<span>x</div>y",
+        "<meta charset='shift_jis'><title>T</title>",
+        "<script>if (a < b && c > d) { x = '<p>'; }</script>",
+        "<!-- comment here --> <![CDATA[ data ]]> <!DOCTYPE html> text",
+        "&nbsp;x&copy;y&foo;z&#65;&#x42;",
+        "<input disabled value='a\"b'>",
+    ],
+)
+def test_same_tokens_as_beautifulsoup(content):
+    expected = list(tokenize_html_to_words(content))
+    assert list(tokenize_html_stream([content])) == expected
+    assert list(tokenize_html_stream(chunked(content, 3))) == expected
+
+
+def test_tokenize_document_stream():
+    with open(here / "virtusize.html.bytes", "rb") as f:
+        content = f.read()
+
+    expected = list(tokenize_html_to_words(content))
+    for size in (1, 7, 1024):
+        assert list(tokenize_html_stream(chunked(content, size))) == expected
+    assert sum(count_html_words(content).values()) == 993
+
+
+def test_sniff_encoding():
+    assert sniff_encoding(b"<html>") == "utf-8"
+    assert sniff_encoding(b"\xef\xbb\xbf<html>") == "utf-8-sig"
+    assert sniff_encoding(b'<meta charset="Shift_JIS">') == "shift_jis"
+    assert sniff_encoding(b'<meta charset="no-such">') == "utf-8"